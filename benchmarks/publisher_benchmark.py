@@ -0,0 +1,241 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, RedHat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmark ReportPortalPublisher against the local Reportportal stub.
+
+    python benchmarks/xunit_generator.py --out /tmp/xunit --files 8
+    python benchmarks/publisher_benchmark.py --tests-paths '/tmp/xunit/*.xml' \\
+        --engine thread async --threads 8 32 --concurrency 50 200 \\
+        --latency 20 --error-rate 0.01
+
+Starts benchmarks/rp_stub.py with the given latency and error rate, then
+imports the files once per engine and amount of threads (or concurrency of
+the async engine), each in a fresh process so its peak RSS only accounts
+for that import. Reports the items published per second, measured over
+publishing and finishing the launch, and the peak RSS.
+"""
+
+import argparse
+import functools
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+import urllib.request
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+REPO_DIR = os.path.dirname(BENCHMARKS_DIR)
+
+
+def import_module():
+    """Import reportportal_api with the module_utils of this checkout."""
+    import ansible.module_utils
+    ansible.module_utils.__path__.insert(
+        0, os.path.join(REPO_DIR, 'module_utils'))
+    sys.path.insert(0, os.path.join(REPO_DIR, 'library'))
+    import reportportal_api
+    return reportportal_api
+
+
+def run_import(url, config):
+    """
+    Publish the files as the reportportal_api module would, in this process.
+
+    Returns:
+        dict: Elapsed time, peak RSS, concurrency and publish stats.
+    """
+    rp = import_module()
+    stats = rp.PublishStats()
+    engine = config['engine']
+    workers = config['workers']
+    min_workers = config['min_concurrency'] if config['adaptive'] \
+        else workers
+    if engine == 'async':
+        limiter = rp.AsyncAdaptiveLimiter(min_workers, workers)
+        service = rp.AsyncReportPortalService(
+            endpoint=url, project='benchmark', token='benchmark',
+            concurrency=workers, limiter=limiter,
+            retries=config['retries'], stats=stats)
+        publisher_class = functools.partial(rp.AsyncReportPortalPublisher,
+                                            concurrency=workers)
+    else:
+        limiter = rp.AdaptiveLimiter(min_workers, workers)
+        service = rp.ReportPortalService(endpoint=url, project='benchmark',
+                                         token='benchmark')
+        session = rp.ThrottledSession(limiter, retries=config['retries'],
+                                      pool_size=workers, stats=stats)
+        session.headers.update(service.session.headers)
+        service.session = session
+        publisher_class = rp.ReportPortalPublisher
+
+    publisher = publisher_class(
+        service=service,
+        launch_name='benchmark',
+        launch_attrs={},
+        launch_description='',
+        ignore_skipped_tests=False,
+        log_last_traceback_only=config['log_last_traceback_only'],
+        full_log_attachment=config['full_log_attachment'],
+        threads=workers if engine == 'thread' else 1,
+        class_in_name=False,
+        stream_parse=config['stream_parse'],
+        parse_workers=config['parse_workers'],
+        log_message_max_size=config['log_message_max_size'],
+        stats=stats,
+        expanded_paths=[expanded_file.path for expanded_file in
+                        rp.walk_paths(config['tests_paths'])[0]])
+
+    start = time.perf_counter()
+    status = 'PASSED' if publisher.publish_tests() else 'FAILED'
+    publisher.finish_launch(end_time=str(int(time.time() * 1000)),
+                            status=status)
+    elapsed = time.perf_counter() - start
+
+    # ru_maxrss is in KiB on Linux, parser processes are reported apart
+    return dict(elapsed=elapsed,
+                rss=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                children_rss=resource.getrusage(
+                    resource.RUSAGE_CHILDREN).ru_maxrss,
+                concurrency=limiter.get_stats(),
+                stats=stats.as_dict())
+
+
+def start_stub(args):
+    """Start the stub server, returning its process and URL."""
+    command = [sys.executable, os.path.join(BENCHMARKS_DIR, 'rp_stub.py'),
+               '--port', str(args.port), '--latency', str(args.latency),
+               '--jitter', str(args.jitter),
+               '--error-rate', str(args.error_rate),
+               '--error-status', str(args.error_status)]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, text=True)
+    line = process.stdout.readline()
+    if not line.startswith('Listening on '):
+        process.kill()
+        raise RuntimeError('The stub server failed to start')
+    return process, line.split()[-1]
+
+
+def stub_request(url, path, method='GET'):
+    request = urllib.request.Request(url + path, method=method,
+                                     data=b'' if method == 'POST' else None)
+    with urllib.request.urlopen(request) as response:
+        return json.load(response)
+
+
+def run_config(url, config):
+    """Run an import in a new process, returning its results."""
+    stub_request(url, '/reset', 'POST')
+    output = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--url', url,
+         '--run', json.dumps(config)],
+        stdout=subprocess.PIPE, text=True, check=True).stdout
+    result = json.loads(output.splitlines()[-1])
+    result['server'] = stub_request(url, '/stats')
+    return result
+
+
+def get_configs(args):
+    common = dict(tests_paths=args.tests_paths, retries=args.retries,
+                  adaptive=args.adaptive,
+                  min_concurrency=args.min_concurrency,
+                  stream_parse=args.stream_parse,
+                  parse_workers=args.parse_workers,
+                  log_last_traceback_only=args.log_last_traceback_only,
+                  full_log_attachment=args.full_log_attachment,
+                  log_message_max_size=args.log_message_max_size)
+    for engine in args.engine:
+        workers = args.threads if engine == 'thread' else args.concurrency
+        for amount in workers:
+            yield dict(common, engine=engine, workers=amount)
+
+
+def main():
+    argparser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    argparser.add_argument('--tests-paths', nargs='+',
+                           help='Paths of the XUnit files, globs allowed')
+    argparser.add_argument('--engine', nargs='+', default=['thread'],
+                           choices=['thread', 'async'])
+    argparser.add_argument('--threads', nargs='+', type=int, default=[8],
+                           help='Threads of the thread engine')
+    argparser.add_argument('--concurrency', nargs='+', type=int,
+                           default=[200],
+                           help='Requests in flight of the async engine')
+    argparser.add_argument('--adaptive', action='store_true',
+                           help='Adapt the concurrency to the server load')
+    argparser.add_argument('--min-concurrency', type=int, default=2)
+    argparser.add_argument('--retries', type=int, default=3)
+    argparser.add_argument('--stream-parse', action='store_true')
+    argparser.add_argument('--parse-workers', type=int, default=0)
+    argparser.add_argument('--log-last-traceback-only', action='store_true')
+    argparser.add_argument('--full-log-attachment', action='store_true')
+    argparser.add_argument('--log-message-max-size', type=int, default=0)
+    argparser.add_argument('--port', type=int, default=0,
+                           help='Port of the stub server, any free one by '
+                                'default')
+    argparser.add_argument('--latency', type=float, default=0,
+                           help='Latency of the stub server in ms')
+    argparser.add_argument('--jitter', type=float, default=0,
+                           help='Maximum deviation of the latency in ms')
+    argparser.add_argument('--error-rate', type=float, default=0,
+                           help='Ratio of item and log requests rejected by '
+                                'the stub server')
+    argparser.add_argument('--error-status', type=int, default=503)
+    argparser.add_argument('--json', action='store_true',
+                           help='Print the full results as JSON lines')
+    argparser.add_argument('--url', help=argparse.SUPPRESS)
+    argparser.add_argument('--run', help=argparse.SUPPRESS)
+    args = argparser.parse_args()
+
+    if args.run:
+        # single import in a child process
+        print(json.dumps(run_import(args.url, json.loads(args.run))))
+        return
+    if not args.tests_paths:
+        argparser.error('--tests-paths is required')
+
+    stub, url = start_stub(args)
+    try:
+        if not args.json:
+            print(f'{"engine":8} {"workers":>7} {"items":>7} {"errors":>6} '
+                  f'{"seconds":>8} {"items/s":>9} {"RSS MiB":>8} '
+                  f'{"limit":>5}')
+        for config in get_configs(args):
+            result = run_config(url, config)
+            server = result['server']
+            items_per_second = server['items'] / result['elapsed']
+            if args.json:
+                print(json.dumps(dict(config=config,
+                                      items_per_second=items_per_second,
+                                      **result)))
+                continue
+            print(f'{config["engine"]:8} {config["workers"]:7} '
+                  f'{server["items"]:7} {server["errors"]:6} '
+                  f'{result["elapsed"]:8.2f} {items_per_second:9.1f} '
+                  f'{max(result["rss"], result["children_rss"]) / 1024:8.1f} '
+                  f'{result["concurrency"]["limit"]:5}')
+    finally:
+        stub.terminate()
+        stub.wait()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,213 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, RedHat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Local stand-in of the Reportportal v5 API used by reportportal_api.
+
+    python benchmarks/rp_stub.py --port 8080 --latency 20 --error-rate 0.01
+
+Implements starting and finishing launches and test items, and JSON or
+multipart log requests, for any project under /api/v1 and /api/v2. The
+latency (with its jitter) is added to every request and the given ratio
+of item and log requests is rejected with --error-status, 503 by default
+so the publisher retries them. Counters are returned by GET /stats and
+reset by POST /reset.
+"""
+
+import argparse
+import json
+import random
+import re
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+API_PATH = re.compile(r'^/api/v[12]/[^/]+/(?P<resource>launch|item|log)'
+                      r'(?:/(?P<id>[^/]+))?(?:/(?P<action>finish))?/?$')
+
+
+class StubState:
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0,
+                 error_status=503, seed=0):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.counters = dict(requests=0, errors=0, launches=0,
+                             finished_launches=0, items=0,
+                             finished_items=0, logs=0, log_requests=0,
+                             attachments=0, bytes=0)
+        self.statuses = {}
+        self.inflight = 0
+        self.max_inflight = 0
+
+    def count(self, **counters):
+        with self.lock:
+            for name, value in counters.items():
+                self.counters[name] += value
+
+    def get_delay(self):
+        with self.lock:
+            delay = self.latency + self.rng.uniform(-self.jitter,
+                                                    self.jitter)
+        return max(delay, 0) / 1000
+
+    def should_fail(self):
+        with self.lock:
+            return self.rng.random() < self.error_rate
+
+    def as_dict(self):
+        with self.lock:
+            return dict(self.counters, statuses=dict(self.statuses),
+                        max_inflight=self.max_inflight)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    # the headers and the body are separate sends, Nagle's algorithm would
+    # hold the body until the delayed ACK of the client on every request
+    disable_nagle_algorithm = True
+
+    def log_message(self, *args):
+        pass
+
+    @property
+    def state(self):
+        return self.server.state
+
+    def read_body(self):
+        if self.headers.get('Transfer-Encoding') == 'chunked':
+            chunks = []
+            while True:
+                size = int(self.rfile.readline().strip(), 16)
+                if not size:
+                    self.rfile.readline()
+                    return b''.join(chunks)
+                chunks.append(self.rfile.read(size))
+                self.rfile.readline()
+        return self.rfile.read(int(self.headers.get('Content-Length', 0)))
+
+    def send_json(self, data, status=200):
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path == '/stats':
+            return self.send_json(self.state.as_dict())
+        self.send_json({'message': 'Not found'}, 404)
+
+    def do_POST(self):
+        self.handle_api('POST')
+
+    def do_PUT(self):
+        self.handle_api('PUT')
+
+    def handle_api(self, method):
+        body = self.read_body()
+        if self.path == '/reset':
+            self.state.reset()
+            return self.send_json({})
+        match = API_PATH.match(self.path.split('?')[0])
+        if not match:
+            return self.send_json({'message': 'Not found'}, 404)
+
+        state = self.state
+        with state.lock:
+            state.inflight += 1
+            state.max_inflight = max(state.max_inflight, state.inflight)
+        try:
+            time.sleep(state.get_delay())
+            state.count(requests=1, bytes=len(body))
+            if match['resource'] != 'launch' and state.should_fail():
+                state.count(errors=1)
+                return self.send_json({'message': 'Injected error'},
+                                      state.error_status)
+            self.send_json(*self.handle_resource(method, match, body))
+        finally:
+            with state.lock:
+                state.inflight -= 1
+
+    def handle_resource(self, method, match, body):
+        resource = match['resource']
+        if resource == 'launch' and method == 'POST':
+            self.state.count(launches=1)
+            return {'id': str(uuid.uuid4())}, 201
+        if resource == 'launch':
+            self.state.count(finished_launches=1)
+            return {'message': f'Launch {match["id"]} finished'}, 200
+        if resource == 'item' and method == 'POST':
+            self.state.count(items=1)
+            return {'id': str(uuid.uuid4())}, 201
+        if resource == 'item':
+            status = json.loads(body).get('status')
+            with self.state.lock:
+                self.state.statuses[status] = \
+                    self.state.statuses.get(status, 0) + 1
+            self.state.count(finished_items=1)
+            return {'message': f'Item {match["id"]} finished'}, 200
+
+        # a JSON log entry or a multipart batch of them
+        if self.headers.get('Content-Type', '').startswith('multipart/'):
+            entries = body.count(b'"launchUuid"')
+            self.state.count(attachments=body.count(b'filename="'))
+        else:
+            entries = 1
+        self.state.count(logs=entries, log_requests=1)
+        return {'responses': [{'id': str(uuid.uuid4())}
+                              for _ in range(entries)]}, 201
+
+
+def main():
+    argparser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    argparser.add_argument('--port', type=int, default=8080)
+    argparser.add_argument('--latency', type=float, default=0,
+                           help='Latency added to every request in ms')
+    argparser.add_argument('--jitter', type=float, default=0,
+                           help='Maximum deviation of the latency in ms')
+    argparser.add_argument('--error-rate', type=float, default=0,
+                           help='Ratio of rejected item and log requests')
+    argparser.add_argument('--error-status', type=int, default=503,
+                           help='HTTP status of the rejected requests')
+    argparser.add_argument('--seed', type=int, default=0)
+    args = argparser.parse_args()
+
+    server = ThreadingHTTPServer(('127.0.0.1', args.port), StubHandler)
+    server.daemon_threads = True
+    server.state = StubState(args.latency, args.jitter, args.error_rate,
+                             args.error_status, args.seed)
+    print(f'Listening on http://127.0.0.1:{server.server_port}', flush=True)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
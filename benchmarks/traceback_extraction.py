@@ -0,0 +1,107 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, RedHat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Compare the last traceback extraction used with log_last_traceback_only
+against the regular expression it replaced, on synthetic failure logs.
+
+    python benchmarks/traceback_extraction.py --sizes 1 10 50
+"""
+
+import argparse
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from module_utils.tracebacks import get_last_traceback  # noqa: E402
+
+TRACEBACK_RE = r'^(Traceback[\s\S]*?)(?:^\s*$|\Z)'
+
+
+def regex_last_traceback(text):
+    matches = re.findall(TRACEBACK_RE, text, re.M)
+    return matches[-1] if matches else None
+
+
+def make_traceback(depth, exception):
+    lines = ['Traceback (most recent call last):']
+    for frame in range(depth):
+        lines.append(f'  File "/usr/lib/python3/module_{frame}.py", '
+                     f'line {frame * 7 + 1}, in function_{frame}')
+        lines.append(f'    result = function_{frame + 1}(arguments)')
+    lines.append(exception)
+    return '\n'.join(lines) + '\n'
+
+
+def make_log(size, tracebacks_ratio=0.05, seed=0):
+    """
+    Build a log of about 'size' bytes of timestamped lines, sprinkled with
+    tracebacks and ending with a chained exception
+    """
+    rng = random.Random(seed)
+    chunks = []
+    length = 0
+    while length < size:
+        if rng.random() < tracebacks_ratio:
+            chunk = make_traceback(rng.randint(3, 30),
+                                   'RuntimeError: intermittent failure') + '\n'
+        else:
+            chunk = (f'2023-05-04 10:{rng.randint(0, 59):02d}:00.000 DEBUG '
+                     f'worker-{rng.randint(0, 16)} processed request '
+                     f'{rng.getrandbits(64):x}\n')
+        chunks.append(chunk)
+        length += len(chunk)
+    chunks.append(make_traceback(10, 'ValueError: bad value'))
+    chunks.append('\nDuring handling of the above exception, '
+                  'another exception occurred:\n\n')
+    chunks.append(make_traceback(10, 'KeyError: missing key'))
+    chunks.append('\nteardown done\n')
+    return ''.join(chunks)
+
+
+def main():
+    argparser = argparse.ArgumentParser(description=__doc__)
+    argparser.add_argument('--sizes', type=float, nargs='+',
+                           default=[0.1, 1, 10, 50],
+                           help='Log sizes in MiB')
+    argparser.add_argument('--repeat', type=int, default=5,
+                           help='Runs per measurement, the best is kept')
+    args = argparser.parse_args()
+
+    print(f'{"size (MiB)":>10} {"regex (ms)":>12} {"backward (ms)":>14} '
+          f'{"speedup":>8}')
+    for size in args.sizes:
+        text = make_log(int(size * 1024 * 1024))
+        # same result as the regex, apart from the chained exceptions
+        assert get_last_traceback(text, chained=False) == \
+            regex_last_traceback(text)
+        regex_time = min(timeit.repeat(lambda: regex_last_traceback(text),
+                                       number=1, repeat=args.repeat))
+        backward_time = min(timeit.repeat(lambda: get_last_traceback(text),
+                                          number=1, repeat=args.repeat))
+        print(f'{size:>10} {regex_time * 1000:>12.2f} '
+              f'{backward_time * 1000:>14.3f} '
+              f'{regex_time / backward_time:>7.0f}x')
+
+
+if __name__ == '__main__':
+    main()
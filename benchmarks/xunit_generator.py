@@ -0,0 +1,135 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, RedHat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Generate synthetic XUnit result files for the benchmarks.
+
+    python benchmarks/xunit_generator.py --out /tmp/xunit --files 4 \\
+        --suites 10 --cases 500 --failure-ratio 0.1 --log-size 2048
+
+The content only depends on the options and the seed, so the same command
+always produces the same files.
+"""
+
+import argparse
+import os
+import random
+from xml.sax.saxutils import escape, quoteattr
+
+
+def get_log(rng, size):
+    """Lines of pseudo random log, about 'size' characters long"""
+    lines = []
+    length = 0
+    while length < size:
+        line = (f'2023-05-04 10:{rng.randint(0, 59):02d}:{rng.randint(0, 59):02d}'
+                f' DEBUG worker-{rng.randint(0, 15)} request '
+                f'{rng.getrandbits(64):016x} done')
+        lines.append(line)
+        length += len(line) + 1
+    return '\n'.join(lines)
+
+
+def get_traceback(rng, depth=8):
+    frames = ''.join(f'  File "/usr/lib/python3/site-packages/module_{frame}.py",'
+                     f' line {rng.randint(1, 999)}, in function_{frame}\n'
+                     f'    function_{frame + 1}(arguments)\n'
+                     for frame in range(depth))
+    return ('Traceback (most recent call last):\n' + frames +
+            'AssertionError: unexpected value\n')
+
+
+def write_case(fd, rng, suite, index, roll, args):
+    attrs = (f'classname={quoteattr(f"tests.{suite}.TestClass{index % 10}")} '
+             f'name={quoteattr(f"test_{suite}_{index}")} '
+             f'time="{rng.uniform(0, 5):.3f}"')
+    body = ''
+    if roll < args.failure_ratio:
+        failure = get_log(rng, args.failure_size) + '\n\n' + \
+            get_traceback(rng)
+        # without a message attribute, the publisher logs the element text
+        body += f'<failure type="AssertionError">{escape(failure)}</failure>'
+    elif roll < args.failure_ratio + args.skip_ratio:
+        body += '<skipped message="not supported"/>'
+    if args.log_size:
+        body += f'<system-out>{escape(get_log(rng, args.log_size))}</system-out>'
+    fd.write(f'    <testcase {attrs}>{body}</testcase>\n' if body
+             else f'    <testcase {attrs}/>\n')
+
+
+def write_suite(fd, rng, name, args):
+    # the counters are written ahead of the cases, so roll them first
+    rolls = [rng.random() for _ in range(args.cases)]
+    failures = sum(roll < args.failure_ratio for roll in rolls)
+    fd.write(f'  <testsuite name={quoteattr(name)} tests="{args.cases}" '
+             f'failures="{failures}" errors="0" '
+             f'timestamp="2023-05-04T10:00:00" time="{args.cases}">\n')
+    for index, roll in enumerate(rolls):
+        write_case(fd, rng, name, index, roll, args)
+    fd.write('  </testsuite>\n')
+
+
+def write_file(path, rng, file_index, args):
+    with open(path, 'w') as fd:
+        fd.write('<?xml version="1.0" encoding="UTF-8"?>\n')
+        if args.layout == 'testsuites':
+            fd.write('<testsuites>\n')
+            for suite in range(args.suites):
+                write_suite(fd, rng, f'suite_{file_index}_{suite}', args)
+            fd.write('</testsuites>\n')
+        else:
+            write_suite(fd, rng, f'suite_{file_index}', args)
+
+
+def main():
+    argparser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    argparser.add_argument('--out', required=True,
+                           help='Directory the files are written to')
+    argparser.add_argument('--files', type=int, default=1,
+                           help='Amount of files')
+    argparser.add_argument('--layout', choices=['testsuites', 'testsuite'],
+                           default='testsuites',
+                           help="A 'testsuites' root with --suites suites, "
+                                "or a single 'testsuite' root per file")
+    argparser.add_argument('--suites', type=int, default=10,
+                           help='Suites per file with the testsuites layout')
+    argparser.add_argument('--cases', type=int, default=100,
+                           help='Test cases per suite')
+    argparser.add_argument('--failure-ratio', type=float, default=0.1,
+                           help='Ratio of failed test cases')
+    argparser.add_argument('--skip-ratio', type=float, default=0.05,
+                           help='Ratio of skipped test cases')
+    argparser.add_argument('--log-size', type=int, default=0,
+                           help='Characters of system-out per test case')
+    argparser.add_argument('--failure-size', type=int, default=1024,
+                           help='Characters of log before the traceback of '
+                                'a failure')
+    argparser.add_argument('--seed', type=int, default=0)
+    args = argparser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    rng = random.Random(args.seed)
+    for file_index in range(args.files):
+        path = os.path.join(args.out, f'results_{file_index}.xml')
+        write_file(path, rng, file_index, args)
+        print(path)
+
+
+if __name__ == '__main__':
+    main()
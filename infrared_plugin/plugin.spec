@@ -29,12 +29,52 @@ subparsers:
                       type: Value
                       help: Amount of API workers to upload results
                       default: '8'
+                  engine:
+                      type: Value
+                      help: |
+                        Engine used to upload results, 'thread' for a pool
+                        of 'threads' workers or 'async' for a single asyncio
+                        event loop with up to 'concurrency' test cases in
+                        flight (requires aiohttp)
+                      choices: ['thread', 'async']
+                      default: thread
+                  concurrency:
+                      type: Value
+                      help: Amount of test cases uploaded at once by the async engine
+                      default: '200'
+                  adaptive-concurrency:
+                      type: Bool
+                      help: |
+                        Adjust the amount of requests in flight to the latency
+                        and throttling of the server, up to 'threads' or
+                        'concurrency' depending on the engine
+                      default: false
+                  parse-workers:
+                      type: Value
+                      help: |
+                        Amount of processes parsing the XUnit files while
+                        the previous ones are uploaded (0 parses them in the
+                        module process)
+                      default: '0'
+                  log-message-max-size:
+                      type: Value
+                      help: |
+                        Maximum amount of characters of a log message, longer
+                        messages are cut to their beginning and end and sent
+                        whole as an attachment (0 keeps them whole)
+                      default: '0'
                   class-in-name:
                       type: Bool
                       help: |
                         For test case name in Reportportal use combination of
                         classname+name. If not set (false) only name is used.
                       default: false
+                  stream-parse:
+                      type: Bool
+                      help: |
+                        Parse XUnit files incrementally instead of loading
+                        them into memory as a whole (for very large files)
+                      default: false
 
             - title: ReportPortal launch options
               options:
@@ -17,10 +17,18 @@
 # along with this software.  If not, see <http://www.gnu.org/licenses/>.
 
 
+import collections
+import copy
+import os
 import requests
+import time
 
 from ansible.module_utils.basic import AnsibleModule
-from ansible.module_utils.utils import get_json, save_to_file
+from ansible.module_utils.http_cache import HttpCache
+from ansible.module_utils.http_pool import HttpPool
+from ansible.module_utils.utils import save_to_file
+from concurrent.futures import as_completed
+from datetime import datetime
 from lxml import etree
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
 
@@ -31,8 +39,10 @@ short_description: Collect Jenkins job stages details
 description:
     - This module generates XUnit file based on the Jenkins job
       information. Job details are collected from the Jenkins server
-      using pipeline REST API (more details on github [1])
+      using pipeline REST API (more details on github [1]) or the Blue
+      Ocean REST API [2]
       [1] https://github.com/jenkinsci/pipeline-stage-view-plugin/
+      [2] https://github.com/jenkinsci/blueocean-plugin/tree/master/blueocean-rest
 options:
     jenkins_domain:
         description: URL of the Jenkins server
@@ -54,6 +64,97 @@ options:
         description: Path to save the XML file
         required: True
         type: str
+    workers:
+        description:
+            - Maximum amount of requests to Jenkins in flight. The stages
+              and the logs of their flow nodes are fetched concurrently,
+              the testcases are still written in the order of the stages.
+        default: 4
+        type: int
+    max_per_host:
+        description:
+            - Maximum amount of requests in flight to the same host, to
+              keep the load of the Jenkins controller bounded whatever the
+              amount of workers.
+        default: 4
+        type: int
+    retrieval:
+        description:
+            - How the stages are retrieved. C(nodes) describes every stage
+              and fetches the log of each of its flow nodes, i.e. hundreds
+              of requests for a large pipeline.
+            - C(summary) takes the stages from the build description and
+              describes and fetches the node logs only of the failed,
+              unstable or aborted stages, the other ones get a one line
+              summary instead of their logs.
+            - C(blueocean) takes the build and its stages from the Blue
+              Ocean REST API, in two requests, and fetches the whole log of
+              the failed, unstable or aborted stages, a request each. The
+              other stages are summarized, the parallel branches are part
+              of their stage. Requires the Blue Ocean plugin.
+        default: nodes
+        choices: [nodes, summary, blueocean]
+        type: str
+    log_max_size:
+        description:
+            - Maximum amount of characters of the log kept for a stage.
+              Longer logs are cut to their beginning and end while they
+              are read, so the memory used doesn't depend on the size of
+              the logs. 0 keeps the whole logs.
+        default: 1048576
+        type: int
+    cache_dir:
+        description:
+            - Directory of a local cache of the Jenkins responses, shared
+              with the zuul modules. The responses are cached only once the
+              build is finished, so importing a finished build again
+              doesn't make any request.
+        required: False
+        type: str
+    cache_max_size:
+        description:
+            - Maximum size in bytes of the cached responses, the least
+              recently used ones are evicted first.
+        default: 1073741824
+        type: int
+    watch:
+        description:
+            - Follow a build in progress until it's finished. The build is
+              polled and every poll fetches only the stages which completed
+              or whose status changed since the previous one, the stages
+              already fetched are kept. The XML file is rewritten after
+              every poll which fetched stages, so it always has all the
+              complete stages so far.
+            - The interval between two polls starts at C(watch_interval),
+              is doubled after every poll which fetched nothing, up to
+              C(watch_max_interval), and is reset once a stage completes.
+        default: False
+        type: bool
+    watch_interval:
+        description:
+            - Seconds between two polls while stages keep completing.
+        default: 10
+        type: float
+    watch_max_interval:
+        description:
+            - Maximum seconds between two polls.
+        default: 300
+        type: float
+    watch_timeout:
+        description:
+            - Seconds after which the watch ends even if the build isn't
+              finished, 0 to wait for the end of the build.
+        default: 0
+        type: float
+    watch_parts_path:
+        description:
+            - Directory where every poll writes the stages it fetched as
+              a XUnit file of its own, so they can be pushed to
+              Reportportal while the build runs, e.g. by the
+              reportportal_api module in watch mode following this
+              directory. A stage whose status changes is written again.
+        required: False
+        type: str
 
 requirements:
     - "lxml"
@@ -65,28 +166,131 @@ file_path:
     description: Path of the saved XML file
     type: string
     returned: always
+cache:
+    description:
+        The amount of responses read from the cache ('hits') and of the
+        ones requested to Jenkins ('misses').
+    type: dict
+    returned: when cache_dir is set
+watch:
+    description:
+        The amount of polls, of stages fetched, whether the build finished
+        and the paths of the XUnit files written to watch_parts_path.
+    type: dict
+    returned: in watch mode
 '''
 
 requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 
 ssl_verify = True
 
+# statuses of the stages which are summarized instead of fetching their logs
+SUMMARIZED_STATUSES = ('SUCCESS', 'NOT_EXECUTED')
+
+# statuses of the finished builds, whose responses never change
+FINAL_STATUSES = ('SUCCESS', 'FAILED', 'UNSTABLE', 'ABORTED', 'NOT_BUILT')
 
-def clear_log(string):
-    allowed_chars = [9, 10, 13]
-    allowed_chars += list(range(32, 128))
-    new_str = ''.join([c for c in string if ord(c) in allowed_chars])
-    return new_str
 
+def is_build_finished(response):
+    return response.get('status') in FINAL_STATUSES
 
-def get_stage_logs(base_url, steps, status):
-    logs = []
-    for step_id in steps:
-        response = get_json(f'{base_url}/execution/node/{step_id}/wfapi/log', ssl_verify)
-        log_entry = clear_log(response.get('text', '')).strip()
-        if log_entry:
-            logs.append(log_entry)
-    log = '\n'.join(logs).strip()
+
+def is_blue_run_finished(response):
+    return response.get('state') == 'FINISHED'
+
+
+# control characters dropped from the logs, besides all the non-ASCII ones
+_CONTROL_CHARS = bytes(c for c in range(32) if c not in (9, 10, 13))
+
+
+def clear_log(string):
+    """
+    Keep only the printable ASCII characters, tabs and line breaks of a
+    log, in linear time
+    """
+    return string.encode('ascii', 'ignore').translate(
+        None, _CONTROL_CHARS).decode('ascii')
+
+
+class LogWindow:
+    """
+    Beginning and end of a log read in chunks
+
+    At most 'max_size' characters are kept, half of them from the
+    beginning of the log and the rest from its end, whatever the length of
+    the log. The whole log is kept when 'max_size' is 0.
+    """
+
+    def __init__(self, max_size=0):
+        self.max_size = max_size
+        self.head = []
+        self.head_size = 0
+        self.tail = collections.deque()
+        self.tail_size = 0
+        self.cut = 0
+
+    def is_empty(self):
+        return not (self.head_size or self.tail_size or self.cut)
+
+    def add(self, chunk):
+        if not self.max_size:
+            self.head.append(chunk)
+            self.head_size += len(chunk)
+            return
+        room = self.max_size // 2 - self.head_size
+        if room > 0:
+            self.head.append(chunk[:room])
+            self.head_size += len(self.head[-1])
+            chunk = chunk[room:]
+        if not chunk:
+            return
+        self.tail.append(chunk)
+        self.tail_size += len(chunk)
+        tail_max_size = self.max_size - self.max_size // 2
+        while self.tail_size - len(self.tail[0]) >= tail_max_size:
+            dropped = self.tail.popleft()
+            self.tail_size -= len(dropped)
+            self.cut += len(dropped)
+        excess = self.tail_size - tail_max_size
+        if excess > 0:
+            self.tail[0] = self.tail[0][excess:]
+            self.tail_size -= excess
+            self.cut += excess
+
+    def skip(self, size):
+        """
+        Count characters left out in the middle of the log, the next ones
+        are part of its end
+        """
+        self.cut += size
+        self.head_size = max(self.head_size, self.max_size // 2)
+
+    def extend(self, window):
+        """
+        Add the log kept by another window, counting the characters it cut
+        """
+        for chunk in window.head:
+            self.add(chunk)
+        if window.cut:
+            self.skip(window.cut)
+        for chunk in window.tail:
+            self.add(chunk)
+
+    def get_text(self):
+        text = ''.join(self.head)
+        if self.cut:
+            text += f'\n\n[... {self.cut} characters cut ...]\n\n'
+        return text + ''.join(self.tail)
+
+
+def get_stage_logs(windows, status, max_size=0):
+    window = LogWindow(max_size)
+    for log_window in windows:
+        if not log_window.is_empty():
+            if not window.is_empty():
+                window.add('\n')
+            window.extend(log_window)
+    log = window.get_text().strip()
 
     if not log:
         log = 'No logs found'
@@ -96,21 +300,166 @@ def get_stage_logs(base_url, steps, status):
     return log_obj
 
 
-def create_test_suite(base_url):
-    response = get_json(f'{base_url}/wfapi/describe', ssl_verify)
+def create_test_suite(pool, base_url):
+    response = pool.get_json(f'{base_url}/wfapi/describe',
+                             cacheable=is_build_finished)
+    # the stages and logs of a finished build are cached
+    pool.final = is_build_finished(response)
 
     suite = etree.Element('testsuite')
     suite.set('name', 'deployment')
     suite.set('time', str(response.get('durationMillis', 0) // 1000))
     suite.set('timestamp', str(response.get('startTimeMillis', 0) // 1000))
 
-    stages = list(stage['id'] for stage in response['stages'])
+    return suite, response['stages']
+
+
+def get_node_log(pool, url, max_size=0):
+    """
+    Fetch the log of a flow node, cleared and cut to 'max_size' characters
+    :returns: LogWindow of the log
+    """
+    window = LogWindow(max_size)
+    window.add(clear_log(pool.get_json(url).get('text', '')).strip())
+    return window
+
+
+def get_stage_log(pool, url, max_size=0):
+    """
+    Fetch the whole log of a stage in chunks, cleared and cut to
+    'max_size' characters while it's read
+    :returns: LogWindow of the log
+    """
+    window = LogWindow(max_size)
+    for chunk in pool.iter_text(url):
+        window.add(clear_log(chunk))
+    return window
+
+
+def fetch_stages(pool, base_url, stages, summarize=False, log_max_size=0):
+    """
+    Fetch the stage descriptions and the logs of their flow nodes
+    concurrently, the logs of a stage being requested as soon as its
+    description is there
+    :param pool: HttpPool making the requests
+    :param base_url: URL of the build
+    :param stages: Stages of the build description
+    :param summarize: Whether the successful and not executed stages are
+                      summarized instead of being fetched
+    :param log_max_size: Maximum amount of characters of a node log
+    :returns: List of (stage description, list of futures of the
+              LogWindow of every flow node) tuples in the order of the
+              stages, without logs for the stages in progress and None
+              instead of the logs of the summarized stages
+    """
+    results = [(stage, None) for stage in stages]
+    describes = dict(
+        (pool.fetch_json(f'{base_url}/execution/node/{stage["id"]}/wfapi/describe'),
+         index) for index, stage in enumerate(stages)
+        if not summarize or stage.get('status') not in SUMMARIZED_STATUSES)
+    for describe in as_completed(describes):
+        response = describe.result()
+        logs = []
+        if response.get('status') != 'IN_PROGRESS':
+            logs = [pool.submit(get_node_log, pool,
+                                f'{base_url}/execution/node/{step["id"]}/wfapi/log',
+                                log_max_size)
+                    for step in response['stageFlowNodes']]
+        results[describes[describe]] = (response, logs)
+    return results
+
+
+def get_blue_url(jenkins_url, job_name, build_id):
+    """
+    Get the Blue Ocean REST API URL of a build
+    :param jenkins_url: URL of the Jenkins server
+    :param job_name: Name of the job, 'folder/job/name' for a job in a
+                     folder
+    :param build_id: ID of the build
+    :returns: URL of the run
+    """
+    pipeline = '/pipelines/'.join(job_name.split('/job/'))
+    return (f'{jenkins_url}/blue/rest/organizations/jenkins/pipelines/'
+            f'{pipeline}/runs/{build_id}')
+
+
+def get_blue_time(timestamp):
+    """
+    Convert a Blue Ocean timestamp, e.g. 2023-08-06T13:20:14.123+0000, to
+    milliseconds since the epoch, 0 when it's not set
+    """
+    if not timestamp:
+        return 0
+    return int(datetime.strptime(timestamp, '%Y-%m-%dT%H:%M:%S.%f%z')
+               .timestamp() * 1000)
+
+
+def get_blue_stage(node):
+    """
+    Convert a Blue Ocean node to a stage of the pipeline REST API
+    :param node: Node of the Blue Ocean run
+    :returns: Dict of the id, name, status, durationMillis and
+              startTimeMillis of the stage
+    """
+    state = node.get('state')
+    result = node.get('result')
+    if state in ('RUNNING', 'QUEUED', 'PAUSED'):
+        status = 'IN_PROGRESS'
+    elif state == 'SKIPPED' or result == 'NOT_BUILT':
+        status = 'NOT_EXECUTED'
+    elif result in ('SUCCESS', 'UNSTABLE', 'ABORTED'):
+        status = result
+    else:
+        status = 'FAILED'
+    return dict(id=node['id'], name=node['displayName'], status=status,
+                durationMillis=node.get('durationInMillis') or 0,
+                startTimeMillis=get_blue_time(node.get('startTime')))
+
+
+def create_blue_test_suite(pool, blue_url):
+    response = pool.get_json(f'{blue_url}/', cacheable=is_blue_run_finished)
+    pool.final = is_blue_run_finished(response)
+    nodes = pool.get_json(f'{blue_url}/nodes/')
+
+    suite = etree.Element('testsuite')
+    suite.set('name', 'deployment')
+    suite.set('time', str((response.get('durationInMillis') or 0) // 1000))
+    suite.set('timestamp',
+              str(get_blue_time(response.get('startTime')) // 1000))
+
+    # parallel branches are nodes of their own, left to their stage
+    stages = [get_blue_stage(node) for node in nodes
+              if node.get('type', 'STAGE') == 'STAGE']
 
     return suite, stages
 
 
-def create_test_case(base_url, stage_id):
-    response = get_json(f'{base_url}/execution/node/{stage_id}/wfapi/describe', ssl_verify)
+def fetch_blue_stages(pool, blue_url, stages, log_max_size=0):
+    """
+    Fetch the whole logs of the stages which aren't summarized
+    concurrently
+    :param pool: HttpPool making the requests
+    :param blue_url: Blue Ocean REST API URL of the run
+    :param stages: Stages of the run, see get_blue_stage
+    :param log_max_size: Maximum amount of characters of a stage log
+    :returns: List of (stage, list of the future of its LogWindow) tuples
+              in the order of the stages, None instead of the log of the
+              summarized stages
+    """
+    return [(stage, None) if stage['status'] in SUMMARIZED_STATUSES else
+            (stage, [pool.submit(get_stage_log, pool,
+                                 f'{blue_url}/nodes/{stage["id"]}/log/',
+                                 log_max_size)])
+            for stage in stages]
+
+
+def get_stage_summary(response):
+    return (f"Stage {response['name']}: {response.get('status')} in "
+            f"{response.get('durationMillis', 0) // 1000}s, its logs were "
+            f"not fetched")
+
+
+def create_test_case(response, logs, log_max_size=0):
     if response.get('status') == 'IN_PROGRESS':
         return None, 'progress'
     elif response.get('status') in ['SUCCESS', 'UNSTABLE']:
@@ -126,19 +475,156 @@ def create_test_case(base_url, stage_id):
     case.set('timestamp', str(response.get('startTimeMillis', 0) // 1000))
     case.set('item_type', 'BEFORE_TEST')
 
-    steps = list(step['id'] for step in response['stageFlowNodes'])
-    case.append(get_stage_logs(base_url, steps, status))
+    if logs is None:
+        summary = LogWindow()
+        summary.add(get_stage_summary(response))
+        windows = [summary]
+    else:
+        windows = [log.result() for log in logs]
+    case.append(get_stage_logs(windows, status, log_max_size))
 
     return case, status
 
 
+class BuildWatcher:
+    """
+    Stages of a build, polled until the build is finished
+
+    Every poll gets the build and its stages, and fetches only the stages
+    which completed or whose status changed since the previous poll, the
+    test cases of the other ones are kept from the previous polls. The
+    stages in progress are left out until they complete.
+    """
+
+    def __init__(self, pool, retrieval, base_url, blue_url, log_max_size=0):
+        """
+        :param pool: HttpPool making the requests
+        :param retrieval: How the stages are retrieved, see the module
+                          options
+        :param base_url: URL of the build
+        :param blue_url: Blue Ocean REST API URL of the run
+        :param log_max_size: Maximum amount of characters of a stage log
+        """
+        self.pool = pool
+        self.retrieval = retrieval
+        self.base_url = base_url
+        self.blue_url = blue_url
+        self.log_max_size = log_max_size
+        self.suite = None
+        self.stages = []
+        # stage ID: (stage status, testcase, testcase status)
+        self.cases = {}
+        self.polls = 0
+        self.fetched = 0
+
+    @property
+    def finished(self):
+        # the responses of a finished build are cached
+        return self.pool.final
+
+    def poll(self):
+        """
+        Get the build and fetch its stages which completed or changed
+        :returns: List of the IDs of the stages fetched, in their order
+        """
+        self.polls += 1
+        if self.retrieval == 'blueocean':
+            self.suite, self.stages = create_blue_test_suite(self.pool,
+                                                             self.blue_url)
+        else:
+            self.suite, self.stages = create_test_suite(self.pool,
+                                                        self.base_url)
+        changed = [stage for stage in self.stages
+                   if stage.get('status') != 'IN_PROGRESS' and
+                   stage.get('status') != self.cases.get(stage['id'],
+                                                         (None,))[0]]
+        if self.retrieval == 'blueocean':
+            fetched = fetch_blue_stages(self.pool, self.blue_url, changed,
+                                        self.log_max_size)
+        else:
+            fetched = fetch_stages(self.pool, self.base_url, changed,
+                                   summarize=self.retrieval == 'summary',
+                                   log_max_size=self.log_max_size)
+
+        stage_ids = []
+        for stage, (response, logs) in zip(changed, fetched):
+            case, status = create_test_case(response, logs,
+                                            self.log_max_size)
+            if status == 'progress':
+                # started over since the build was described
+                continue
+            self.cases[stage['id']] = (stage.get('status'), case, status)
+            stage_ids.append(stage['id'])
+        self.fetched += len(stage_ids)
+        return stage_ids
+
+    def watch(self, interval=10, max_interval=300, timeout=0):
+        """
+        Poll the build until it's finished, or until the next poll would
+        start more than 'timeout' seconds after the first one. The interval
+        between two polls is doubled whenever a poll fetched nothing, up to
+        'max_interval', and reset to 'interval' once stages are fetched.
+        :returns: Iterator over the lists of the IDs of the stages fetched
+                  by every poll
+        """
+        deadline = time.monotonic() + timeout if timeout else None
+        delay = interval
+        while True:
+            stage_ids = self.poll()
+            yield stage_ids
+            if self.finished:
+                return
+            delay = interval if stage_ids else min(delay * 2, max_interval)
+            if deadline is not None and time.monotonic() + delay > deadline:
+                return
+            time.sleep(delay)
+
+    def get_suite(self, stage_ids=None):
+        """
+        Get the test suite of the build as of the last poll
+        :param stage_ids: IDs of the stages to keep, copying their test
+                          cases, all the complete stages when None
+        :returns: The testsuite element
+        """
+        suite = copy.deepcopy(self.suite)
+        test_count = 0
+        failure_count = 0
+        for stage in self.stages:
+            if stage['id'] not in self.cases or \
+                    (stage_ids is not None and stage['id'] not in stage_ids):
+                continue
+            _, case, status = self.cases[stage['id']]
+            suite.append(case if stage_ids is None else copy.deepcopy(case))
+            test_count += 1
+            if status == 'failure':
+                failure_count += 1
+        suite.set('failures', str(failure_count))
+        suite.set('errors', '0')
+        suite.set('tests', str(test_count))
+        return suite
+
+
 def main():
     result = {}
     module_args = dict(jenkins_domain=dict(type='str', required=True),
                        jenkins_job_name=dict(type='str', required=True),
                        jenkins_job_build_id=dict(type='str', required=True),
                        ssl_verify=dict(type='bool', default=True),
-                       xml_path=dict(type='str', required=True))
+                       xml_path=dict(type='str', required=True),
+                       workers=dict(type='int', default=4),
+                       max_per_host=dict(type='int', default=4),
+                       retrieval=dict(type='str', default='nodes',
+                                      choices=['nodes', 'summary',
+                                               'blueocean']),
+                       log_max_size=dict(type='int', default=1024 * 1024),
+                       cache_dir=dict(type='str', required=False),
+                       cache_max_size=dict(type='int',
+                                           default=1024 * 1024 * 1024),
+                       watch=dict(type='bool', default=False),
+                       watch_interval=dict(type='float', default=10),
+                       watch_max_interval=dict(type='float', default=300),
+                       watch_timeout=dict(type='float', default=0),
+                       watch_parts_path=dict(type='str', required=False))
     module = AnsibleModule(argument_spec=module_args,
                            supports_check_mode=False)
     try:
@@ -150,24 +636,50 @@ def main():
         ssl_verify = module.params.pop('ssl_verify')
 
         base_url = f'{jenkins_url}/job/{job_name}/{build_id}'
-
-        suite, stage_ids = create_test_suite(base_url)
-
-        test_count = 0
-        failure_count = 0
-        for stage_id in stage_ids:
-            stage, status = create_test_case(base_url, stage_id)
-            if status == 'progress':
-                continue
-            suite.append(stage)
-            test_count += 1
-            if status == 'failure':
-                failure_count += 1
-        suite.set('failures', str(failure_count))
-        suite.set('errors', '0')
-        suite.set('tests', str(test_count))
-
-        result['file_path'] = save_to_file(suite, xml_path)
+        retrieval = module.params.pop('retrieval')
+        log_max_size = module.params.pop('log_max_size')
+        cache_dir = module.params.pop('cache_dir')
+        cache = HttpCache(cache_dir, module.params.pop('cache_max_size')) \
+            if cache_dir else None
+
+        blue_url = get_blue_url(jenkins_url, job_name, build_id)
+        watch = module.params.pop('watch')
+        parts_path = module.params.pop('watch_parts_path')
+
+        with HttpPool(module.params.pop('workers'),
+                      module.params.pop('max_per_host'),
+                      verify=ssl_verify, cache=cache) as pool:
+            watcher = BuildWatcher(pool, retrieval, base_url, blue_url,
+                                   log_max_size)
+            if not watch:
+                watcher.poll()
+                result['file_path'] = save_to_file(watcher.get_suite(),
+                                                   xml_path)
+            else:
+                parts = []
+                for stage_ids in watcher.watch(
+                        module.params.pop('watch_interval'),
+                        module.params.pop('watch_max_interval'),
+                        module.params.pop('watch_timeout')):
+                    if watcher.polls > 1 and not stage_ids:
+                        continue
+                    # replaced at once, for the readers of the file
+                    result['file_path'] = save_to_file(
+                        watcher.get_suite(), xml_path, atomic=True)
+                    if parts_path is not None and stage_ids:
+                        parts.append(save_to_file(
+                            watcher.get_suite(stage_ids),
+                            os.path.join(parts_path,
+                                         f'deployment-{len(parts) + 1:04d}.xml'),
+                            atomic=True))
+                result['watch'] = dict(polls=watcher.polls,
+                                       fetched=watcher.fetched,
+                                       finished=watcher.finished,
+                                       parts=parts)
+
+        if cache is not None:
+            cache.evict()
+            result['cache'] = cache.get_stats()
         module.exit_json(**result)
     except Exception as ex:
         result['msg'] = ex
@@ -16,16 +16,41 @@
 # You should have received a copy of the GNU General Public License
 # along with this software.  If not, see <http://www.gnu.org/licenses/>.
 
-from dateutil import parser
-import time
+import asyncio
+import collections
+import functools
+import multiprocessing
 import os
-import re
-import glob
+import time
 import xmltodict
 import queue
+import signal
 import threading
 from reportportal_client import ReportPortalService
-from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.basic import AnsibleModule, missing_required_lib
+from ansible.module_utils.journal import PublishJournal
+from ansible.module_utils.path_walker import walk_paths
+from ansible.module_utils.path_watcher import PathWatcher
+from ansible.module_utils.publish_cache import PublishCache
+from ansible.module_utils.rp_async import (AsyncReportPortalService,
+                                           HAS_AIOHTTP)
+from ansible.module_utils.rp_fanout import AsyncFanoutService, FanoutService
+from ansible.module_utils.rp_limiter import (AdaptiveLimiter,
+                                             AsyncAdaptiveLimiter,
+                                             ThrottledSession)
+from ansible.module_utils.rp_memory import (AsyncMemoryBudget,
+                                            ThreadMemoryBudget,
+                                            get_item_size, get_peak_rss)
+from ansible.module_utils.rp_items import (CaseItem, Status, SuiteItem,
+                                           get_start_end_time)
+from ansible.module_utils.rp_schedule import CostModel, largest_first
+from ansible.module_utils.rp_stats import PublishStats
+from ansible.module_utils.rp_logs import (LogBatcher, LogSpool,
+                                          get_excerpt, send_log_batch)
+from ansible.module_utils.rp_spool import SpoolReplayer, SpoolService
+from ansible.module_utils.subunit_v2 import iter_subunit_suites
+from ansible.module_utils.tracebacks import get_last_traceback
+from ansible.module_utils.xunit import iter_xunit_suites
 
 
 DOCUMENTATION = '''
@@ -41,13 +66,13 @@ description:
 options:
     url:
       description:
-          - The URL of the Report Portal server.
-      required: True
+          - The URL of the Report Portal server, not needed in spool mode.
+      required: False
       type: str
     token:
       description:
-          - Reportportal API token.
-      required: True
+          - Reportportal API token, not needed in spool mode.
+      required: False
       type: str
     ssl_verify:
       description:
@@ -66,13 +91,15 @@ options:
       type: bool
     project_name:
       description:
-          - Reportportal project name to push results to.
-      required: True
+          - Reportportal project name to push results to, not needed in spool
+            mode.
+      required: False
       type: str
     launch_name:
       description:
-          - Reportportal launch name to push results to.
-      required: True
+          - Reportportal launch name to push results to, not needed in replay
+            mode.
+      required: False
       type: str
     launch_tags:
       description:
@@ -95,8 +122,10 @@ options:
       required: False
     tests_paths:
       description:
-          - Pattern for the path location of test xml results.
-      required: True
+          - Pattern for the path location of test xml results, not needed in
+            replay mode. Files with the '.subunit' extension are read as
+            subunit v2 streams, each one as a single test suite.
+      required: False
       type: list
     tests_exclude_paths:
       description:
@@ -118,6 +147,265 @@ options:
         - For test case name use combination of classname+name.
       default: False
       type: bool
+    stream_parse:
+      description:
+        - Parse the XUnit files incrementally instead of loading them into
+          memory as a whole. Only a single test case is kept in memory at a
+          time, which is recommended for very large result files.
+      default: False
+      type: bool
+    engine:
+      description:
+        - Engine used to talk to Reportportal. 'thread' publishes test cases
+          from a pool of C(threads) workers, 'async' drives all the API calls
+          from a single asyncio event loop with up to C(concurrency) test
+          cases in flight and requires the 'aiohttp' package.
+      default: thread
+      choices: [thread, async]
+      type: str
+    concurrency:
+      description:
+        - Maximum amount of test cases published at once by the async engine.
+      default: 200
+      type: int
+    adaptive_concurrency:
+      description:
+        - Adjust the amount of requests in flight to the observed latency
+          and errors of the server, AIMD-style. The amount starts at the
+          maximum, C(threads) or C(concurrency) depending on the engine, is
+          cut when requests are throttled or fail, or when the latency of
+          an API call keeps rising well above its usual one, and grows back
+          while they complete in time, never below C(min_concurrency).
+      default: False
+      type: bool
+    min_concurrency:
+      description:
+        - Lower bound of the amount of requests in flight with
+          C(adaptive_concurrency).
+      default: 2
+      type: int
+    retries:
+      description:
+        - Amount of retries of the requests rejected by a throttling or
+          overloaded server (HTTP 429 and 503), with an exponential backoff
+          or the delay asked by the server. The calls finishing items and
+          launches are retried after a gateway error (HTTP 502 and 504) as
+          well, the ones creating items or logs aren't since the server may
+          have processed them.
+      default: 3
+      type: int
+    trace_path:
+      description:
+        - Path of a JSON file the C(stats) of the import are written to,
+          together with the spans of its phases in the trace event format
+          (viewable with chrome://tracing or Perfetto).
+      required: False
+      type: str
+    log_batch_size:
+      description:
+        - Maximum amount of log entries, across test cases, sent to
+          Reportportal in a single request.
+      default: 20
+      type: int
+    log_batch_max_size:
+      description:
+        - Maximum size in bytes of the log messages and attachments sent to
+          Reportportal in a single request.
+      default: 10485760
+      type: int
+    log_message_max_size:
+      description:
+        - Maximum amount of characters of a log message. Longer messages
+          (e.g. huge system-out or failure texts) are cut to their beginning
+          and end, and the whole text is sent as an attachment instead.
+          0 keeps the messages whole.
+      default: 0
+      type: int
+    journal_path:
+      description:
+        - Path of a journal file recording the launch and every suite and
+          test case published so far. When set, a failed import leaves the
+          launch open (instead of finishing it as FAILED) so it can be
+          resumed, and the journal is removed once the launch is finished.
+      required: False
+      type: str
+    resume:
+      description:
+        - Resume the import recorded in C(journal_path), publishing only
+          what is missing to the same launch. The journal records every
+          log entry sent, so the ones of a resumed test case aren't sent
+          again, except for the batches in flight when the import was
+          interrupted.
+      default: False
+      type: bool
+    cache_dir:
+      description:
+        - Directory of a local cache remembering the result files (by content
+          digest) already published to the same URL, project and launch name.
+          When all the files were published to the same launch, the import is
+          skipped and the ID of that launch is returned.
+      required: False
+      type: str
+    cache_skip_files:
+      description:
+        - When some of the files changed, publish only the new or changed
+          ones instead of all of them. When none of them changed since
+          they were published, to several launches, no launch is created.
+      default: False
+      type: bool
+    cache_max_age:
+      description:
+        - Days after which a cache entry expires.
+      default: 30
+      type: int
+    cache_max_entries:
+      description:
+        - Maximum amount of cache entries, the least recently used ones are
+          evicted first.
+      default: 10000
+      type: int
+    parse_workers:
+      description:
+        - Amount of processes parsing the XUnit files into Reportportal items,
+          including the timestamps and the traceback extraction, while the
+          results of the previous files are being published. With 0 the files
+          are parsed by the module process itself. Every file is handed over
+          as a whole, so C(stream_parse) is still recommended within the
+          parsing processes for very large files.
+      default: 0
+      type: int
+    memory_budget:
+      description:
+        - Bytes of parsed test cases held in memory until they are
+          published. The parsing waits while the test cases in flight fill
+          the budget, the parser processes get only as many files ahead as
+          their size fits in it, and files larger than it are parsed
+          incrementally, as with C(stream_parse).
+        - Log messages larger than a 16th of the budget are spilled to
+          temporary files, read back only while their batch is sent. The
+          log batch being filled (see C(log_batch_max_size)) comes on top.
+        - 0 doesn't bound the memory usage.
+      default: 0
+      type: int
+    cost_model:
+      description:
+        - Rates of the estimates the XUnit files and suites are scheduled
+          with, largest first. Files are handed to the parser processes by
+          decreasing size, C(parse_rate) bytes per second, and the suites of
+          a file parsed by them by decreasing C(suite_time) plus
+          C(case_time) per test case plus C(log_rate) bytes of logs per
+          second. The predicted and actual costs are reported in C(stats).
+      required: False
+      type: dict
+      suboptions:
+        parse_rate:
+          description: Bytes of XUnit parsed per second, 40e6 by default.
+          type: float
+        case_time:
+          description: Seconds to publish a test case, 0.002 by default.
+          type: float
+        log_rate:
+          description:
+            - Bytes of log messages and attachments sent per second, 10e6
+              by default.
+          type: float
+        suite_time:
+          description: Seconds to start and finish a suite, 0.01 by default.
+          type: float
+    mode:
+      description:
+        - C(publish) sends the results to Reportportal. C(spool) converts
+          them to the launch, item and log calls to make, written to the
+          gzip compressed C(spool_path) without contacting the server, and
+          C(replay) publishes such a spool file, from another host or later
+          on. The replay uses the thread engine with up to C(threads) calls
+          in flight, each one sent as soon as the items it depends on exist.
+        - The cache is ignored in spool mode. A spool is replayed only if its
+          launch was finished, a failed import in spool mode leaves it
+          unfinished. With C(journal_path), a resumed import appends to the
+          same spool.
+      default: publish
+      choices: [publish, spool, replay]
+      type: str
+    spool_path:
+      description:
+        - Path of the spool file written in spool mode and read in replay
+          mode.
+      required: False
+      type: str
+    destinations:
+      description:
+        - Other Reportportal servers or projects the same launch is
+          published to, in publish mode. Every XUnit file is parsed once and
+          each call is made to all the destinations concurrently, each one
+          with its own C(concurrency) limit. The options a destination
+          doesn't set are the ones of the module.
+        - The launch is finished as FAILED on all the destinations if any of
+          them fails. The cache is ignored with destinations.
+      required: False
+      type: list
+      elements: dict
+      suboptions:
+        url:
+          description: The URL of the Report Portal server.
+          type: str
+        token:
+          description: Reportportal API token.
+          type: str
+        ssl_verify:
+          description: Ignore ssl verifications.
+          type: bool
+        project_name:
+          description: Reportportal project name to push results to.
+          type: str
+        launch_name:
+          description: Reportportal launch name to push results to.
+          type: str
+        launch_tags:
+          description: Tags to be applied to the launch.
+          type: list
+        launch_description:
+          description: Description to be added to the launch.
+          type: str
+    watch:
+      description:
+        - Start the launch right away and follow C(tests_paths) while the
+          tests are running, publishing every XUnit file once it's complete,
+          i.e. its size and modification time didn't change for
+          C(watch_stable_time) seconds. Changes are noticed with inotify
+          when available, by walking the paths every C(watch_interval)
+          seconds otherwise.
+        - The launch is finished once the module gets a SIGTERM or SIGINT,
+          once C(watch_stop_path) exists, or after C(watch_idle_timeout)
+          seconds without any file added or changed. The files still
+          pending are then published whether they are stable or not. A file
+          is published a single time, even if it changes later on.
+        - The cache is ignored in watch mode.
+      default: False
+      type: bool
+    watch_stable_time:
+      description:
+        - Seconds a watched file must stay unchanged to be published.
+      default: 10
+      type: float
+    watch_interval:
+      description:
+        - Minimum seconds between two walks of the watched paths, and
+          between two checks of C(watch_stop_path).
+      default: 2
+      type: float
+    watch_idle_timeout:
+      description:
+        - Seconds without any watched file added or changed after which the
+          launch is finished, 0 to wait for a signal or C(watch_stop_path).
+      default: 900
+      type: float
+    watch_stop_path:
+      description:
+        - Path of a file whose existence ends the watch, e.g. created once
+          the test run is over.
+      required: False
+      type: str
 
 requirements:
     - "python-dateutl"
@@ -126,22 +414,87 @@ requirements:
     - "PyYAML"
     - "lxml"
     - "xmltodict"
+    - "aiohttp (for the async engine)"
 '''
 
 RETURN = '''
 launch_id:
     description: The created launch ID from Reportportal.
     type: string
-    returned: always
+    returned: unless mode is spool
+replayed:
+    description:
+        The amount of items ('items') and log entries ('logs') published from
+        the spool.
+    type: dict
+    returned: when mode is replay
+destinations:
+    description:
+        The URL, project_name, launch_name and launch_id of the launch
+        published to every destination, the module options first.
+    type: list
+    returned: when destinations are set
 expanded_paths:
-    description: The list of matching paths from paths argument.
+    description:
+        The list of matching paths from paths argument, in watch mode the
+        ones published as they were complete.
     type: list
     returned: always
 expanded_exclude_paths:
     description:
-        The list of matching exclude paths from the exclude_path argument.
+        The list of paths matching the exclude_path argument met while
+        looking for the test results, the excluded directories aren't
+        looked into.
     type: list
     returned: always
+cached_paths:
+    description:
+        The list of paths which weren't published because they were already
+        published according to the cache.
+    type: list
+    returned: when cache_dir is set
+cached_launch_ids:
+    description:
+        The IDs of the launches the files were published to according to
+        the cache, when none of them changed but they were published to
+        several launches, so no launch was created.
+    type: list
+    returned: when cache_skip_files is set and all the files are cached
+concurrency:
+    description:
+        The amount of requests in flight the import settled on ('limit') and
+        the lowest one, its bounds, and the amount of throttled and retried
+        requests.
+    type: dict
+    returned: when the launch was published
+memory:
+    description:
+        The peak resident set size in bytes of the module process added to
+        the largest one of the parser processes ('peak_rss'). With a
+        memory_budget, also the budget, the peak of the bytes of test cases
+        in flight ('peak'), the amount of times the parsing waited for the
+        budget ('waits') and the amount and size of the spilled log
+        messages ('spilled', 'spilled_bytes').
+    type: dict
+    returned: unless mode is replay
+stats:
+    description:
+        - Wall time in seconds of the import ('time') and of its phases
+          ('phases'), i.e. scan, cache, parse (reading the XUnit files),
+          parse_wait (waiting for the parser processes), memory_wait
+          (waiting for the memory budget), publish and finish_launch, with
+          the amount of times each was entered.
+        - For the XUnit files and the suites parsed as a whole ('costs'),
+          the amount of scheduled items, their total predicted and actual
+          cost in seconds (parsing time of the files, publishing time of the
+          suites), the ratio of the two, the mean relative error of the
+          estimates and the costliest items.
+        - For every Reportportal API call ('endpoints', e.g.
+          start_test_item or log), the amount of requests, failed requests
+          and bytes sent, and the mean, p50, p95, p99 and max latency in
+          milliseconds. Retried requests count once per attempt.
+    type: dict
+    returned: always
 '''
 
 
@@ -149,79 +502,238 @@ class NoLaunchIdException(Exception):
     pass
 
 
-def get_expanded_paths(paths):
+def add_stats(result, stats, trace_path=None):
     """
-    Translate patterns of paths to real path
-    :param paths: Pattern for the path location of xml files
-    :return: expanded_paths: The list of matching paths from paths argument
+    Add the stats of the import to the module result
+    :param result: Module result
+    :param stats: PublishStats of the import
+    :param trace_path: Path of the trace file the stats are written to
     """
-    expanded_paths = []
+    result['stats'] = stats.as_dict()
+    if trace_path:
+        stats.write_trace(trace_path)
 
-    for path in paths:
-        path = os.path.expanduser(os.path.expandvars(path))
 
-        # Expand any glob characters. If found, add the expanded glob to
-        # the list of expanded_paths, which might be empty.
-        if ('*' in path or '?' in path):
-            recursive = True if '**' in path else False
-            expanded_paths = expanded_paths + \
-                glob.glob(path, recursive=recursive)
+def get_thread_service(url, project, token, ssl_verify, limiter, retries,
+                       stats):
+    """
+    Get a Reportportal service whose requests go through a limiter
+    :param url: The URL of the Reportportal server
+    :param project: Reportportal project name
+    :param token: Reportportal API token
+    :param ssl_verify: Whether the certificates are validated
+    :param limiter: AdaptiveLimiter of the requests in flight
+    :param retries: Amount of retries of the throttled requests
+    :param stats: PublishStats where the requests are recorded
+    :returns: ReportPortalService
+    """
+    service = ReportPortalService(
+        endpoint=url,
+        project=project,
+        token=token,
+        verify_ssl=ssl_verify
+    )
+    session = ThrottledSession(limiter, retries=retries,
+                               pool_size=limiter.max_limit, stats=stats)
+    session.headers.update(service.session.headers)
+    service.session = session
+    return service
 
-        # If there are no glob characters the path is added
-        # to the expanded paths whether the path exists or not
-        else:
-            expanded_paths.append(path)
-    return expanded_paths
 
+def get_watcher(params, tests_paths, tests_exclude_paths):
+    """
+    Get the watcher of the XUnit files in watch mode, stopped by SIGTERM,
+    SIGINT or the stop file
+    :param params: Module parameters, the watch ones are removed
+    :param tests_paths: Patterns of the XUnit files
+    :param tests_exclude_paths: Patterns of the excluded paths
+    :returns: PathWatcher
+    """
+    stopped = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *args: stopped.set())
+    stop_path = params.pop('watch_stop_path')
+
+    def stop():
+        return stopped.is_set() or \
+            (stop_path is not None and os.path.exists(stop_path))
 
-def format_timestamp(timestamp):
-    """Translate different formatted time objects into milliseconds timestamp
+    return PathWatcher(tests_paths, tests_exclude_paths,
+                       stable_time=params.pop('watch_stable_time'),
+                       interval=params.pop('watch_interval'),
+                       idle_timeout=params.pop('watch_idle_timeout') or None,
+                       stop=stop)
 
-    Time objects can be strings with ISO formatted time or float/integer
-    timestamps in seconds or milliseconds.
 
-    :param timestamp: Time objects in one of the supported formats
-    :return: Timestamp in milliseconds
+def get_launch_attrs(launch_tags):
+    """
+    Get the launch attributes from 'key:value' tags
+    :param launch_tags: List of tags, the ones without a colon are ignored
+    :returns: Dict of the attributes, keys and values cut to 127 characters
     """
+    launch_attrs = {}
+    for tag in launch_tags or []:
+        tag_attr = tag.split(':', 1)
+        if len(tag_attr) == 2:
+            if len(tag_attr[0]) > 127:
+                key = tag_attr[0][:127]
+            else:
+                key = tag_attr[0]
+            if not tag_attr[1]:
+                val = 'N/A'
+            elif len(tag_attr[1]) > 127:
+                val = tag_attr[1][:127]
+            else:
+                val = tag_attr[1]
+            launch_attrs[key] = val
+    return launch_attrs
 
-    if not timestamp:
-        return None
-    str_time = str(timestamp)
-    if str_time.isdigit():
-        if int(str_time) > 9999999999:
-            return int(str_time)
-        else:
-            return int(str_time) * 1000
-    else:
-        return int(parser.parse(str_time).timestamp() * 1000)
+
+def get_destinations(params):
+    """
+    Get the destinations of the launch, the module options first
+    :param params: Module parameters, the destination ones are removed
+    :returns: List of dicts of the url, token, project_name, ssl_verify,
+              launch_name, launch_tags and launch_description
+    """
+    keys = ('url', 'token', 'project_name', 'ssl_verify', 'launch_name',
+            'launch_tags', 'launch_description')
+    primary = dict((key, params.pop(key)) for key in keys)
+    destinations = [primary]
+    for destination in params.pop('destinations') or []:
+        destinations.append(dict(
+            (key, primary[key] if destination.get(key) is None
+             else destination[key]) for key in keys))
+    return destinations
+
+
+def add_destinations(result, service, destinations):
+    """
+    Add the launch ID of every destination to the module result
+    :param result: Module result
+    :param service: FanoutService or AsyncFanoutService of the launch
+    :param destinations: List of destinations, see get_destinations
+    """
+    result['launch_id'] = service.launch_ids[0]
+    result['destinations'] = [
+        dict(url=destination['url'],
+             project_name=destination['project_name'],
+             launch_name=destination['launch_name'], launch_id=launch_id)
+        for destination, launch_id in zip(destinations, service.launch_ids)]
+
+
+def replay_spool(module, stats, trace_path):
+    """
+    Publish the launch of a spool file, written in spool mode
+    :param module: AnsibleModule in replay mode
+    :param stats: PublishStats of the import
+    :param trace_path: Path of the trace file the stats are written to
+    """
+    result = {}
+    params = module.params
+    threads = max(params['threads'], 1)
+    min_concurrency = params['min_concurrency'] \
+        if params['adaptive_concurrency'] else threads
+    limiter = AdaptiveLimiter(min_concurrency, threads)
+    service = get_thread_service(params['url'], params['project_name'],
+                                 params['token'], params['ssl_verify'],
+                                 limiter, params['retries'], stats)
+    replayer = SpoolReplayer(service, threads)
+    try:
+        with stats.phase('publish'):
+            result['replayed'] = replayer.replay(params['spool_path'])
+        result['launch_id'] = service.launch_id
+        result['concurrency'] = limiter.get_stats()
+        add_stats(result, stats, trace_path)
+        module.exit_json(changed=True, **result)
+    except Exception as ex:
+        if service.launch_id and not replayer.finished:
+            result['launch_id'] = service.launch_id
+            service.finish_launch(end_time=str(int(time.time() * 1000)),
+                                  status="FAILED")
+        result['concurrency'] = limiter.get_stats()
+        add_stats(result, stats, trace_path)
+        result['msg'] = ex
+        module.fail_json(**result)
+    finally:
+        service.terminate()
 
 
-def get_start_end_time(test_obj):
-    """Calculate test case or test suite start and end time from the XML report
+def logs_sent(batch):
+    """
+    Notify the owners of the log entries of a batch it was sent
+    :param batch: List of log entries
+    """
+    for entry in batch:
+        if entry.get('on_sent'):
+            entry['on_sent']()
 
-    There is mandatory 'time' and optional 'timestamps' parameters available
-    in XML report for each testing objects such as testsuite or test case.
-    Time represents the test duration and timestamp stands for the beginning
-    of the test execution. If there is no timestamp available, the end time
-    is the actual time of current function execution and the start time is
-    calculated based on the test duration.
 
-    :param test_obj: Test object dictionary that is taken from XML report
-    :return: Start time and end time as milliseconds timestamps
+# publisher inherited by the parser processes, see ReportPortalPublisher
+_parser = None
+
+
+def init_parser(publisher):
+    """
+    Initialize a parser process
+    :param publisher: Publisher whose options are used to parse the files
     """
+    global _parser
+    _parser = publisher
 
-    if not test_obj.get('@time'):
-        duration = 0
-    else:
-        duration = int(float(test_obj.get('@time')) * 1000)
-    timestamp = format_timestamp(test_obj.get('@timestamp'))
-    if not timestamp:
-        end_time = int(time.time() * 1000)
-        start_time = end_time - duration
-    else:
-        start_time = timestamp
-        end_time = start_time + duration
-    return str(start_time), str(end_time)
+
+def parse_file_items(test_path):
+    """
+    Parse a XUnit file in a parser process
+    :param test_path: Path of the XUnit file
+    :returns: List of (suite item, list of (index, case item)) tuples and
+              the parsing time
+    """
+    start = time.perf_counter()
+    suite_items = _parser.parse_file(test_path)
+    return suite_items, time.perf_counter() - start
+
+
+def get_test_cases(test_suite):
+    """
+    Get the test cases of a test suite parsed by xmltodict
+    :param test_suite: Test suite dictionary
+    :return: List of the test cases
+    """
+    # get test cases from xml
+    test_cases = test_suite.get("testcase", [])
+
+    # safety incase of single test case which is not a list
+    if not isinstance(test_cases, list):
+        test_cases = [test_cases]
+    return test_cases
+
+
+class PendingItem:
+    """Item which is completed once all the work depending on it is done
+
+    The item is held open by the producer until all of its children were
+    scheduled (see release) and by every scheduled child until it's done,
+    so whoever releases the last reference completes the item by calling
+    on_done, e.g. a suite is finished by the worker publishing its last
+    test case.
+    """
+
+    def __init__(self, on_done):
+        self.on_done = on_done
+        self.pending = 1
+        self.lock = threading.Lock()
+
+    def add(self):
+        with self.lock:
+            self.pending += 1
+
+    def release(self):
+        with self.lock:
+            self.pending -= 1
+            done = self.pending == 0
+        if done:
+            self.on_done()
 
 
 class PublisherThread(threading.Thread):
@@ -233,22 +745,40 @@ class PublisherThread(threading.Thread):
 
     def run(self):
         while True:
+            task = self.queue.get()
             try:
-                test_case, parent_id = self.queue.get(timeout=3)
-                self.publisher.publish_test_cases(test_case, parent_id)
-            except queue.Empty:
-                return
+                # None is the signal to stop the worker
+                if task is None:
+                    return
+                case_item, case_key, parent_id, suite, size = task
+                try:
+                    self.publisher.publish_test_cases(case_item, parent_id,
+                                                      case_key)
+                finally:
+                    self.publisher.release_memory(size)
+                # a suite with a failed test case is left unfinished
+                suite.release()
+            except Exception as ex:
+                # keep consuming so the producer never blocks on a full
+                # queue, the error is raised once the launch is published
+                self.publisher.errors.append(ex)
             finally:
                 self.queue.task_done()
 
 
 class ReportPortalPublisher:
 
+    memory_budget_class = ThreadMemoryBudget
+
     def __init__(self, service, launch_name, launch_attrs,
                  launch_description, ignore_skipped_tests,
                  log_last_traceback_only, full_log_attachment,
                  expanded_paths, threads,
-                 class_in_name,
+                 class_in_name, stream_parse=False,
+                 log_batch_size=20, log_batch_max_size=10 * 1024 * 1024,
+                 journal=None, parse_workers=0, log_message_max_size=0,
+                 stats=None, file_sizes=None, cost_model=None,
+                 watcher=None, memory_budget=0,
                  launch_start_time=str(int(time.time() * 1000))):
         self.service = service
         self.launch_name = launch_name
@@ -261,13 +791,160 @@ class ReportPortalPublisher:
         self.threads = threads
         self.launch_start_time = launch_start_time
         self.class_in_name = class_in_name
+        self.stream_parse = stream_parse
+        self.logs = LogBatcher(log_batch_size, log_batch_max_size)
+        self.log_message_max_size = log_message_max_size
+        self.memory = self.memory_budget_class(memory_budget) \
+            if memory_budget else None
+        # texts sent as attachments or spilled are spooled to disk, created
+        # before the parser processes are forked to be shared with them
+        self.spool = LogSpool() if log_message_max_size or memory_budget or \
+            (log_last_traceback_only and full_log_attachment) else None
+        self.journal = journal
+        self.parse_workers = parse_workers
+        self.stats = stats if stats is not None else PublishStats()
+        self.file_sizes = file_sizes or {}
+        self.cost_model = cost_model or CostModel()
+        self.watcher = watcher
+        self.parsers = None
+        self.queue = None
+        self.workers = []
+        self.errors = []
+
+    def start_parsers(self):
+        """
+        Start the pool of processes parsing the XUnit files
+        """
+        # forked before any worker thread is started, the processes get a
+        # copy of the publisher to parse the files with the same options
+        self.parsers = multiprocessing.get_context('fork').Pool(
+            self.parse_workers, initializer=init_parser, initargs=(self,))
 
-    def publish_tests(self):
+    def stop_parsers(self):
         """
-        Publish results of test xml file
-        Returns the overall status (True/False)
+        Stop the parser processes, whatever is still being parsed is dropped
         """
-        # Start Reportportal launch
+        self.parsers.terminate()
+        self.parsers.join()
+        self.parsers = None
+
+    def start_workers(self):
+        """
+        Start the pool of workers publishing test cases for the whole launch
+        """
+        # bound the queue so streamed test cases are parsed only as
+        # fast as the workers upload them
+        self.queue = queue.Queue(maxsize=self.threads * 2)
+        self.workers = []
+        for _ in range(self.threads):
+            worker = PublisherThread(self.queue, self)
+            worker.daemon = True
+            worker.start()
+            self.workers.append(worker)
+
+    def stop_workers(self):
+        """
+        Wait for the queued test cases to be published and stop the workers
+        """
+        for _ in self.workers:
+            self.queue.put(None)
+        for worker in self.workers:
+            worker.join()
+        self.workers = []
+        if self.errors:
+            raise self.errors[0]
+
+    def add_log(self, entry):
+        """
+        Buffer a log entry, sending the batches which are full
+        :param entry: Log entry (time, message, level, attachment, item_id)
+        """
+        for batch in self.logs.add(entry):
+            self.send_logs(batch)
+
+    def send_logs(self, batch):
+        """
+        Send a batch of log entries in a single multipart request
+        :param batch: List of log entries
+        """
+        send_log_batch(self.service, batch)
+        logs_sent(batch)
+
+    def send_buffered_logs(self):
+        """
+        Send the buffered logs without waiting for their batch to be full,
+        while waiting for the watched files
+        """
+        for batch in self.logs.flush():
+            self.send_logs(batch)
+
+    def finish_launch(self, end_time, status):
+        """
+        Finish the Reportportal launch and release the service
+        :param end_time: Launch end time
+        :param status: Launch status
+        """
+        try:
+            # send whatever is left before the launch is closed
+            for batch in self.logs.flush():
+                self.send_logs(batch)
+        finally:
+            self.service.finish_launch(end_time=end_time, status=status)
+            self.service.terminate()
+            self.remove_spool()
+
+    def suspend(self):
+        """
+        Send the buffered logs and release the service, leaving the launch
+        open so the publishing can be resumed using the journal
+        """
+        try:
+            for batch in self.logs.flush():
+                self.send_logs(batch)
+        finally:
+            self.service.terminate()
+            self.remove_spool()
+
+    def remove_spool(self):
+        if self.spool is not None:
+            self.spool.remove()
+
+    def get_memory_stats(self):
+        """
+        Get the peak memory usage of the import
+        :returns: Dict of the peak RSS, and of the memory budget stats when
+                  there is a budget
+        """
+        if self.memory is None:
+            return dict(peak_rss=get_peak_rss())
+        return self.memory.get_stats()
+
+    def reserve_memory(self, case_item):
+        """
+        Wait for a test case to fit in the memory budget before handing it
+        over to the workers
+        :param case_item: Test case item details
+        :returns: Bytes reserved, to be given to release_memory
+        """
+        if self.memory is None:
+            return 0
+        size = get_item_size(case_item)
+        with self.stats.phase('memory_wait'):
+            self.memory.reserve(size)
+        return size
+
+    def release_memory(self, size):
+        if size:
+            self.memory.release(size)
+
+    def start_launch(self):
+        """
+        Start the Reportportal launch, or reattach to the journaled one
+        """
+        if self.journal is not None and self.journal.launch_id:
+            self.service.launch_id = self.journal.launch_id
+            return
+
         self.service.start_launch(
             name=self.launch_name,
             start_time=self.launch_start_time,
@@ -276,83 +953,370 @@ class ReportPortalPublisher:
         )
         if self.service.launch_id is None:
             raise NoLaunchIdException("No launch ID available.")
+        if self.journal is not None:
+            self.journal.launch_started(self.service.launch_id)
 
+    def publish_tests(self):
+        """
+        Publish results of test xml file
+        Returns the overall status (True/False)
+        """
+        # Start Reportportal launch
+        self.start_launch()
+
+        test_paths, tests_passed = self.get_pending_paths()
+        if self.parse_workers > 0:
+            self.start_parsers()
+        if self.threads > 0:
+            self.start_workers()
+        try:
+            tests_passed = self.publish_files(test_paths) and tests_passed
+            if self.watcher is not None:
+                for test_paths in self.watch_paths():
+                    tests_passed = self.publish_files(test_paths) and \
+                        tests_passed
+        finally:
+            if self.parsers:
+                self.stop_parsers()
+            if self.workers:
+                self.stop_workers()
+        return tests_passed
+
+    def publish_files(self, test_paths):
+        """
+        Publish XUnit files
+        :param test_paths: Paths of the XUnit files
+        :returns: True if all the test suites passed
+        """
         tests_passed = True
-        # Iterate over XUnit test paths
-        for test_path in self.expanded_paths:
-            # open the XUnit file and parse to xml object
-            with open(test_path) as fd:
-                data = xmltodict.parse(fd.read())
-
-            # get multiple test suites if present
-            if data.get('testsuites'):
-                # get the test suite object
-                test_suites_object = data.get('testsuites')
-                # get all test suites (1 or more) from the object
-                test_suites = test_suites_object.get('testsuite') \
-                    if isinstance(test_suites_object.get('testsuite'), list) \
-                    else [test_suites_object.get('testsuite')]
-
-                # publish all test suites
-                for test_suite in test_suites:
-                    suite_status = self.publish_test_suite(test_suite)
-                    tests_passed = tests_passed and (suite_status == 'PASSED')
+        for test_path, parsed in self.parse_files(test_paths):
+            if parsed is not None:
+                with self.stats.phase('parse_wait'):
+                    suite_items, parse_time = parsed.get()
+                self.stats.add_cost('file', test_path, parse_time)
             else:
-                # publish single test suite
-                tests_passed = tests_passed and (
-                        self.publish_test_suite(data.get('testsuite')) == 'PASSED')
+                suite_items = self.get_suite_items(test_path)
+            file_passed = self.publish_file(test_path, suite_items)
+            tests_passed = tests_passed and file_passed
         return tests_passed
 
-    def publish_test_suite(self, test_suite):
+    def get_pending_paths(self, test_paths=None):
         """
-        Publish results of test suite xml file
-        :param test_suite: Test suite to publish
-        :returns: suite status (PASSED or FAILED)
+        Get the XUnit files which weren't published yet according to the
+        journal
+        :param test_paths: Paths of the XUnit files, the expanded paths by
+                           default
+        :returns: List of the paths, largest first, and whether the
+                  published files passed
+        """
+        if test_paths is None:
+            test_paths = self.expanded_paths
+        if self.journal is None:
+            return self.schedule_files(test_paths), True
+        test_paths = [test_path for test_path in test_paths
+                      if test_path not in self.journal.files]
+        return (self.schedule_files(test_paths),
+                all(self.journal.files.values()))
+
+    def watch_paths(self):
+        """
+        Wait for the watched XUnit files to be complete, adding them to the
+        expanded paths
+        :returns: iterator of lists of the paths of the files complete since
+                  the previous ones and not published yet, largest first
+        """
+        for entries in self.watcher.watch(on_wait=self.send_buffered_logs):
+            test_paths = [entry.path for entry in entries]
+            self.expanded_paths.extend(test_paths)
+            self.file_sizes.update((entry.path, entry.size)
+                                   for entry in entries)
+            yield self.get_pending_paths(test_paths)[0]
+
+    def schedule_files(self, test_paths):
+        """
+        Order XUnit files by decreasing estimated parsing cost, so the
+        largest ones don't hold the parser processes back at the end
+        :param test_paths: Paths of the XUnit files
+        :returns: List of the paths, largest first
+        """
+        costs = {}
+        for test_path in test_paths:
+            costs[test_path] = self.cost_model.file_cost(
+                self.get_file_size(test_path))
+            self.stats.predict('file', test_path, costs[test_path])
+        return largest_first(test_paths, costs.get)
+
+    def schedule_suites(self, test_path, suite_items):
+        """
+        Order the test suites of a XUnit file parsed as a whole by
+        decreasing estimated publishing cost
+        :param test_path: Path of the XUnit file
+        :param suite_items: List of (suite item, list of case items) tuples
+        :returns: List of (index, (suite item, case items)) tuples, the index
+                  being the position of the suite within the file
+        """
+        costs = []
+        for index, (suite_item, case_items) in enumerate(suite_items):
+            costs.append(self.cost_model.suite_cost(case_items))
+            self.stats.predict('suite', f'{test_path}:{index}', costs[-1])
+        return largest_first(enumerate(suite_items),
+                             lambda suite: costs[suite[0]])
+
+    def get_file_suites(self, test_path, suite_items):
+        """
+        Get the test suites of a XUnit file in the order to publish them
+        :param test_path: Path of the XUnit file
+        :param suite_items: List or iterable of (suite item, case items)
+                            tuples
+        :returns: iterable of (index, (suite item, case items)) tuples
+        """
+        if isinstance(suite_items, list):
+            return self.schedule_suites(test_path, suite_items)
+        # files read lazily are parsed while iterating over their items
+        return enumerate(self.stats.iterate('parse', suite_items,
+                                            ('file', test_path)))
+
+    def parse_files(self, test_paths):
+        """
+        Parse XUnit files ahead of their publishing using the parser
+        processes, if any
+        :param test_paths: Paths of the XUnit files
+        :returns: iterator of (path, parse result) tuples in the order of the
+                  paths, the result being None when the file is left to be
+                  parsed by the caller
+        """
+        if not self.parsers:
+            for test_path in test_paths:
+                yield test_path, None
+            return
+
+        # keep only a few files parsed ahead, and no more than fit in the
+        # memory budget, so the parsed items don't pile up in memory when
+        # publishing is slower than parsing
+        test_paths = collections.deque(test_paths)
+        pending = collections.deque()
+        pending_size = 0
+        while test_paths or pending:
+            while test_paths and len(pending) < self.parse_workers * 2:
+                size = self.get_file_size(test_paths[0])
+                if self.is_oversized(size):
+                    # parsed incrementally by the caller
+                    if pending:
+                        break
+                    yield test_paths.popleft(), None
+                    continue
+                if pending and self.memory is not None and \
+                        pending_size + size > self.memory.limit:
+                    break
+                test_path = test_paths.popleft()
+                pending.append((test_path, size, self.parsers.apply_async(
+                    parse_file_items, (test_path,))))
+                pending_size += size
+            if pending:
+                test_path, size, parsed = pending.popleft()
+                pending_size -= size
+                yield test_path, parsed
+
+    def get_file_size(self, test_path):
+        """
+        Get the size of a XUnit file
+        :param test_path: Path of the XUnit file
+        :returns: Size in bytes, 0 if the file can't be read
         """
-        # get test cases from xml
-        test_cases = test_suite.get("testcase", [])
+        size = self.file_sizes.get(test_path)
+        if size is None:
+            try:
+                size = os.path.getsize(test_path)
+            except OSError:
+                size = 0
+        return size
 
-        # safety incase of single test case which is not a list
-        if not isinstance(test_cases, list):
-            test_cases = [test_cases]
+    def is_oversized(self, size):
+        """
+        Tell whether a XUnit file is too large for the memory budget to be
+        parsed as a whole
+        :param size: Size of the XUnit file in bytes
+        """
+        return self.memory is not None and size > self.memory.limit
 
-        start_time, end_time = get_start_end_time(test_suite)
+    def parse_file(self, test_path):
+        """
+        Parse all the test suites of a XUnit file at once
+        :param test_path: Path of the XUnit file
+        :returns: List of (suite item, list of (index, case item)) tuples
+        """
+        return [(suite_item, list(case_items))
+                for suite_item, case_items in self.get_suite_items(test_path)]
+
+    def publish_file(self, test_path, suite_items):
+        """
+        Publish all the test suites of a XUnit file
+        :param test_path: Path of the XUnit file
+        :param suite_items: Iterable of (suite item, case items) tuples
+        :returns: True if all the test suites passed
+        """
+        statuses = []
+        test_file = PendingItem(functools.partial(
+            self.file_done, test_path, statuses))
+        for index, (suite_item, case_items) in \
+                self.get_file_suites(test_path, suite_items):
+            case_items = self.stats.iterate('parse', case_items,
+                                            ('file', test_path))
+            statuses.append(self.publish_test_suite(
+                suite_item, case_items, f'{test_path}:{index}', test_file))
+        test_file.release()
+        return all(status == Status.PASSED for status in statuses)
+
+    def file_done(self, test_path, statuses):
+        if self.journal is not None:
+            self.journal.file_done(
+                test_path, all(status == Status.PASSED for status in statuses))
+
+    def get_test_suites(self, test_path):
+        """
+        Read the test suites of a XUnit file
+        :param test_path: Path of the XUnit file
+        :returns: iterator of (test suite, test cases) tuples
+        """
+        if test_path.endswith('.subunit'):
+            return iter_subunit_suites(test_path)
+        if self.stream_parse or \
+                self.is_oversized(self.get_file_size(test_path)):
+            return iter_xunit_suites(test_path)
+
+        # open the XUnit file and parse to xml object
+        with open(test_path) as fd:
+            data = xmltodict.parse(fd.read())
+
+        # get multiple test suites if present
+        if data.get('testsuites'):
+            # get the test suite object
+            test_suites_object = data.get('testsuites')
+            # get all test suites (1 or more) from the object
+            test_suites = test_suites_object.get('testsuite') \
+                if isinstance(test_suites_object.get('testsuite'), list) \
+                else [test_suites_object.get('testsuite')]
+        else:
+            # single test suite
+            test_suites = [data.get('testsuite')]
+
+        return ((test_suite, None) for test_suite in test_suites)
+
+    def get_suite_items(self, test_path):
+        """
+        Read the test suites of a XUnit file as Reportportal items
+        :param test_path: Path of the XUnit file
+        :returns: iterator of (suite item, case items) tuples, the case items
+                  being an iterator of (index, case item) tuples
+        """
+        for test_suite, test_cases in self.get_test_suites(test_path):
+            if test_cases is None:
+                test_cases = get_test_cases(test_suite)
+            yield (self.get_test_suite_item(test_suite),
+                   self.get_case_items(test_cases))
+
+    def get_case_items(self, test_cases):
+        """
+        Convert test cases to Reportportal items
+        :param test_cases: Iterable of test cases
+        :returns: iterator of (index, case item) tuples, the index being the
+                  position of the test case within its suite
+        """
+        for index, case in enumerate(test_cases):
+            case_item = self.get_test_case_item(case)
+            if case_item is not None:
+                yield index, case_item
+
+    def get_test_suite_item(self, test_suite):
+        """
+        Get the details of the Reportportal item of a test suite
+        :param test_suite: Test suite to publish
+        :returns: SuiteItem record
+        """
+        start_time, end_time = get_start_end_time(
+            test_suite.get('@time'), test_suite.get('@timestamp'))
 
-        # start test suite
         suite_name = test_suite.get('@name', test_suite.get('@id', 'NULL'))
         if not suite_name:
             suite_name = 'Noname'
-        item_id = self.service.start_test_item(
-            name=suite_name,
-            start_time=start_time,
-            item_type="SUITE")
-
-        # publish all test cases
-        if test_cases:
-            if self.threads > 0:
-                q = queue.Queue()
-                for case in test_cases:
-                    q.put((case, item_id))
-                for _ in range(self.threads):
-                    worker = PublisherThread(q, self)
-                    worker.daemon = True
-                    worker.start()
-                q.join()
-            else:
-                for case in test_cases:
-                    self.publish_test_cases(case, item_id)
 
         # calculate status
         num_of_failures = int(test_suite.get('@failures', 0))
         num_of_errors = int(test_suite.get('@errors', 0))
-        status = 'FAILED' if (num_of_failures > 0 or num_of_errors > 0) \
-            else 'PASSED'
+        status = Status.FAILED if (num_of_failures > 0 or num_of_errors > 0) \
+            else Status.PASSED
 
+        return SuiteItem(suite_name, start_time, end_time, status)
+
+    def publish_test_suite(self, suite_item, case_items, key=None,
+                           test_file=None):
+        """
+        Publish results of test suite xml file
+        :param suite_item: Test suite item details
+        :param case_items: Iterable of (index, case item) tuples
+        :param key: Journal key of the test suite
+        :param test_file: Pending item of the XUnit file of the suite
+        :returns: suite status (PASSED or FAILED)
+        """
+        journaled = self.journal.get_suite(key) if self.journal else None
+        if journaled is not None and journaled['status'] is not None:
+            return journaled['status']
+
+        started = time.perf_counter()
+        # start test suite
+        if journaled is not None:
+            item_id = journaled['id']
+        else:
+            item_id = self.service.start_test_item(
+                name=suite_item.name,
+                start_time=suite_item.start_time,
+                item_type="SUITE")
+            if self.journal is not None:
+                self.journal.suite_started(key, item_id)
+
+        # publish all test cases, the suite is finished by whoever
+        # publishes its last test case, so suites may overlap
+        if test_file is not None:
+            test_file.add()
+        suite = PendingItem(functools.partial(
+            self.finish_test_suite, item_id, suite_item, key, test_file,
+            started))
+        for index, case_item in case_items:
+            case_key = f'{key}:{index}'
+            if self.journal is not None:
+                journaled_case = self.journal.get_case(case_key)
+                if journaled_case and journaled_case['state'] == 'done':
+                    continue
+            if self.workers:
+                size = self.reserve_memory(case_item)
+                suite.add()
+                self.queue.put((case_item, case_key, item_id, suite, size))
+            else:
+                self.publish_test_cases(case_item, item_id, case_key)
+        suite.release()
+
+        return suite_item.status
+
+    def finish_test_suite(self, item_id, suite_item, key, test_file,
+                          started=None):
+        """
+        Finish a test suite once all its test cases are published
+        :param item_id: ID of the test suite
+        :param suite_item: Test suite item details
+        :param key: Journal key of the test suite
+        :param test_file: Pending item of the XUnit file of the suite
+        :param started: perf_counter value the suite was started at
+        """
         self.service.finish_test_item(
             item_id,
-            end_time=end_time,
-            status=status)
-        return status
+            end_time=suite_item.end_time,
+            status=suite_item.status)
+        if started is not None:
+            self.stats.add_cost('suite', key, time.perf_counter() - started)
+        if self.journal is not None:
+            self.journal.suite_done(key, suite_item.status)
+        if test_file is not None:
+            test_file.release()
 
     def get_test_case_name(self, case, limit=255):
         """
@@ -365,49 +1329,40 @@ class ReportPortalPublisher:
                 name = f"{c_name}.{name}"
         return name[:limit]
 
-    def publish_test_cases(self, case, parent_id):
+    def get_test_case_item(self, case):
         """
-        Publish test cases to reportportal
+        Get the details of the Reportportal item of a test case
         :param case: Test case to publish
-        :param parent_id: ID of the test suite
+        :returns: CaseItem record or None if the test case shouldn't be
+                  published
         """
         issue = None
+        logs = []
+        skipped_case = case.get('skipped')
 
-        if case.get('skipped') and self.ignore_skipped_tests:
+        if skipped_case and self.ignore_skipped_tests:
             # ignore skipped tests when flag is true
-            return
-
-        start_time, end_time = get_start_end_time(case)
+            return None
 
-        # start test case
-        item_id = self.service.start_test_item(
-            name=self.get_test_case_name(case, 511),
-            start_time=start_time,
-            item_type=case.get('@item_type', 'STEP'),
-            parent_item_id=parent_id)
+        start_time, end_time = get_start_end_time(case.get('@time'),
+                                                  case.get('@timestamp'))
 
         # Add system_out log.
-        if case.get('system-out'):
-            self.service.log(
-                time=start_time,
-                message=case.get('system-out'),
-                item_id=item_id,
-                level="INFO")
+        system_out = case.get('system-out')
+        if system_out:
+            logs.append(self.get_log(start_time, system_out, "INFO",
+                                     "system-out.txt"))
 
         # Indicate type of test case (skipped, failures, passed)
-        if case.get('skipped'):
+        if skipped_case:
             issue = {"issue_type": "NOT_ISSUE"}
-            status = 'SKIPPED'
-            skipped_case = case.get('skipped')
+            status = Status.SKIPPED
             msg = skipped_case.get('@message', '#text') \
                 if isinstance(skipped_case, dict) else skipped_case
-            self.service.log(
-                time=start_time,
-                message=msg,
-                item_id=item_id,
-                level="DEBUG")
+            logs.append(self.get_log(start_time, msg, "DEBUG",
+                                     "skipped.txt"))
         elif case.get('failure') or case.get('error'):
-            status = 'FAILED'
+            status = Status.FAILED
 
             failures = case.get('failure', case.get('error'))
             failures_txt_list = []
@@ -420,31 +1375,446 @@ class ReportPortalPublisher:
             failures_txt = None if not len(failures_txt_list) else "\n".join(failures_txt_list)
             log_message = failures_txt
             attachment = None
-            if self.log_last_traceback_only:
-                matches = re.findall(
-                    r'^(Traceback[\s\S]*?)(?:^\s*$|\Z)', failures_txt, re.M)
-                if matches:
-                    log_message = matches[-1]
+            if self.log_last_traceback_only and failures_txt:
+                log_message = get_last_traceback(failures_txt) or failures_txt
                 if self.full_log_attachment:
                     if log_message != failures_txt:
-                        attachment = {"name": "Entire_log.txt",
-                                      "data": failures_txt,
-                                      "mime": "text/plain"}
-            self.service.log(
-                time=start_time,
-                message=log_message,
-                item_id=item_id,
-                attachment=attachment,
-                level="ERROR")
+                        attachment = self.spool.add("Entire_log.txt",
+                                                    failures_txt)
+            logs.append(self.get_log(start_time, log_message, "ERROR",
+                                     "Entire_log.txt", attachment))
+        else:
+            status = Status.PASSED
+
+        return CaseItem(self.get_test_case_name(case, 511),
+                        case.get('@item_type', 'STEP'),
+                        start_time, end_time, status, issue, logs)
+
+    def get_log(self, log_time, message, level, name, attachment=None):
+        """
+        Get a log entry of a test case, an oversized message is cut to an
+        excerpt and the whole message attached, unless there is already an
+        attachment
+        :param log_time: Time of the log entry
+        :param message: Log message
+        :param level: Log level
+        :param name: File name of the attachment of an oversized message
+        :param attachment: Attachment of the log entry
+        :returns: Log entry, whose message is spilled to disk when it's
+                  large for the memory budget
+        """
+        if self.log_message_max_size and message and \
+                len(message) > self.log_message_max_size:
+            if attachment is None:
+                attachment = self.spool.add(name, message)
+            message = get_excerpt(message, self.log_message_max_size)
+        if self.memory is not None and isinstance(message, str) and \
+                self.memory.should_spill(len(message)):
+            return dict(time=log_time, message=None, level=level,
+                        attachment=attachment,
+                        spilled=self.spool.spill(message))
+        return dict(time=log_time, message=message, level=level,
+                    attachment=attachment)
+
+    def publish_test_cases(self, case_item, parent_id, key=None):
+        """
+        Publish test cases to reportportal
+        :param case_item: Test case item details
+        :param parent_id: ID of the test suite
+        :param key: Journal key of the test case
+        """
+        journaled = self.journal.get_case(key) if self.journal else None
+
+        # start test case
+        if journaled is not None:
+            item_id = journaled['id']
         else:
-            status = 'PASSED'
+            item_id = self.service.start_test_item(
+                name=case_item.name,
+                start_time=case_item.start_time,
+                item_type=case_item.item_type,
+                parent_item_id=parent_id)
+            if self.journal is not None:
+                self.journal.case_started(key, item_id)
 
         # finish test case
-        self.service.finish_test_item(
+        if journaled is None or journaled['state'] == 'started':
+            self.service.finish_test_item(
+                item_id,
+                end_time=case_item.end_time,
+                status=case_item.status,
+                issue=case_item.issue)
+            if self.journal is not None:
+                self.journal.case_finished(key)
+
+        for entry in self.get_case_logs(case_item, item_id, key):
+            self.add_log(entry)
+
+    def get_case_logs(self, case_item, item_id, key):
+        """
+        Get the log entries of a published test case
+        :param case_item: Test case item details
+        :param item_id: ID of the test case
+        :param key: Journal key of the test case
+        :returns: List of the log entries not sent yet
+        """
+        journaled = self.journal.get_case(key) if self.journal else None
+        sent = journaled.get('logs', ()) if journaled else ()
+        entries = []
+        for index, log in enumerate(case_item.logs):
+            if index in sent:
+                # sent before the import was interrupted
+                continue
+            entry = dict(log, item_id=item_id)
+            if self.journal is not None:
+                entry['on_sent'] = functools.partial(
+                    self.journal.case_log_sent, key, index,
+                    len(case_item.logs))
+            if self.memory is not None and entry.get('spilled'):
+                self.memory.add_spilled(entry['spilled']['size'])
+            entries.append(entry)
+        if self.journal is not None and not entries:
+            self.journal.case_done(key)
+        return entries
+
+
+class SpoolPublisher(ReportPortalPublisher):
+    """Publisher recording the launch to a spool file, see SpoolService
+
+    The spool is written sequentially, so the test cases are published by
+    the calling thread instead of a pool of workers.
+    """
+
+    def start_workers(self):
+        self.workers = []
+
+    def send_logs(self, batch):
+        """
+        Record a batch of log entries to the spool
+        :param batch: List of log entries
+        """
+        self.service.log_batch(batch)
+        logs_sent(batch)
+
+
+class FanoutPublisher(ReportPortalPublisher):
+    """Publisher sending the same launch to several destinations, see
+    FanoutService
+    """
+
+    def send_logs(self, batch):
+        """
+        Send a batch of log entries to every destination
+        :param batch: List of log entries
+        """
+        self.service.log_batch(batch)
+        logs_sent(batch)
+
+
+class AsyncReportPortalPublisher(ReportPortalPublisher):
+    """Publisher driving all the Reportportal API calls from an event loop
+
+    Instead of a thread per in-flight request, up to 'concurrency' test
+    cases are published at once as coroutines of a single thread. A suite
+    is started before any of its test cases and finished only once all of
+    them are finished.
+    """
+
+    memory_budget_class = AsyncMemoryBudget
+
+    def __init__(self, *args, concurrency=200, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.concurrency = concurrency
+        self.loop = asyncio.new_event_loop()
+        self.slots = None
+
+    def publish_tests(self):
+        """
+        Publish results of test xml file
+        Returns the overall status (True/False)
+        """
+        # fork the parsers before the event loop starts any work
+        if self.parse_workers > 0:
+            self.start_parsers()
+        try:
+            return self.loop.run_until_complete(self.publish_tests_async())
+        finally:
+            if self.parsers:
+                self.stop_parsers()
+
+    def finish_launch(self, end_time, status):
+        """
+        Finish the Reportportal launch and release the service
+        :param end_time: Launch end time
+        :param status: Launch status
+        """
+        try:
+            self.loop.run_until_complete(
+                self.finish_launch_async(end_time, status))
+        finally:
+            self.loop.run_until_complete(self.service.close())
+            self.loop.close()
+            self.remove_spool()
+
+    def suspend(self):
+        """
+        Send the buffered logs and release the service, leaving the launch
+        open so the publishing can be resumed using the journal
+        """
+        try:
+            self.loop.run_until_complete(self.flush_logs_async())
+        finally:
+            self.loop.run_until_complete(self.service.close())
+            self.loop.close()
+            self.remove_spool()
+
+    async def finish_launch_async(self, end_time, status):
+        try:
+            # send whatever is left before the launch is closed
+            await self.flush_logs_async()
+        finally:
+            await self.service.finish_launch(end_time=end_time, status=status)
+
+    async def flush_logs_async(self):
+        await asyncio.gather(*(self.send_logs_async(batch)
+                               for batch in self.logs.flush()))
+
+    async def add_log_async(self, entry):
+        """
+        Buffer a log entry, sending the batches which are full
+        :param entry: Log entry (time, message, level, attachment, item_id)
+        """
+        await asyncio.gather(*(self.send_logs_async(batch)
+                               for batch in self.logs.add(entry)))
+
+    async def send_logs_async(self, batch):
+        await self.service.log_batch(batch)
+        logs_sent(batch)
+
+    def send_buffered_logs(self):
+        """
+        Send the buffered logs without waiting for their batch to be full,
+        called from the thread waiting for the watched files
+        """
+        self.loop.call_soon_threadsafe(
+            lambda: self.spawn(self.flush_logs_async()))
+
+    def spawn(self, coro):
+        """
+        Schedule a coroutine, its error is raised once the launch is
+        published
+        """
+        task = self.loop.create_task(coro)
+        task.add_done_callback(self.task_done)
+        return task
+
+    def task_done(self, task):
+        if not task.cancelled() and task.exception() is not None:
+            self.errors.append(task.exception())
+
+    async def publish_tests_async(self):
+        """
+        Publish results of test xml file
+        Returns the overall status (True/False)
+        """
+        await self.service.open()
+        # Start Reportportal launch
+        if self.journal is not None and self.journal.launch_id:
+            self.service.launch_id = self.journal.launch_id
+        else:
+            await self.service.start_launch(
+                name=self.launch_name,
+                start_time=self.launch_start_time,
+                attributes=self.launch_attrs,
+                description=self.launch_description
+            )
+            if self.service.launch_id is None:
+                raise NoLaunchIdException("No launch ID available.")
+            if self.journal is not None:
+                self.journal.launch_started(self.service.launch_id)
+
+        self.slots = asyncio.Semaphore(self.concurrency)
+        test_paths, tests_passed = self.get_pending_paths()
+        try:
+            tests_passed = await self.publish_files_async(test_paths) and \
+                tests_passed
+            if self.watcher is not None:
+                watched = self.watch_paths()
+                while True:
+                    # wait for the files without blocking the event loop
+                    test_paths = await self.loop.run_in_executor(
+                        None, next, watched, None)
+                    if test_paths is None:
+                        break
+                    tests_passed = await self.publish_files_async(
+                        test_paths) and tests_passed
+        finally:
+            # wait for everything in flight, even after an error, suites
+            # are finished by tasks created when their last case is done
+            current = asyncio.current_task()
+            pending = asyncio.all_tasks() - {current}
+            while pending:
+                await asyncio.wait(pending)
+                pending = asyncio.all_tasks() - {current}
+        if self.errors:
+            raise self.errors[0]
+        return tests_passed
+
+    async def publish_files_async(self, test_paths):
+        """
+        Publish XUnit files
+        :param test_paths: Paths of the XUnit files
+        :returns: True if all the test suites passed
+        """
+        tests_passed = True
+        for test_path, parsed in self.parse_files(test_paths):
+            if parsed is not None:
+                with self.stats.phase('parse_wait'):
+                    suite_items, parse_time = \
+                        await self.loop.run_in_executor(None, parsed.get)
+                self.stats.add_cost('file', test_path, parse_time)
+            else:
+                suite_items = self.get_suite_items(test_path)
+            file_passed = await self.publish_file_async(test_path,
+                                                        suite_items)
+            tests_passed = tests_passed and file_passed
+        return tests_passed
+
+    async def publish_file_async(self, test_path, suite_items):
+        """
+        Publish all the test suites of a XUnit file
+        :param test_path: Path of the XUnit file
+        :param suite_items: Iterable of (suite item, case items) tuples
+        :returns: True if all the test suites passed
+        """
+        statuses = []
+        test_file = PendingItem(functools.partial(
+            self.file_done, test_path, statuses))
+        for index, (suite_item, case_items) in \
+                self.get_file_suites(test_path, suite_items):
+            case_items = self.stats.iterate('parse', case_items,
+                                            ('file', test_path))
+            statuses.append(await self.publish_test_suite_async(
+                suite_item, case_items, f'{test_path}:{index}', test_file))
+        test_file.release()
+        return all(status == Status.PASSED for status in statuses)
+
+    async def publish_test_suite_async(self, suite_item, case_items, key,
+                                       test_file):
+        """
+        Start a test suite and schedule the publishing of its test cases
+        :param suite_item: Test suite item details
+        :param case_items: Iterable of (index, case item) tuples
+        :param key: Journal key of the test suite
+        :param test_file: Pending item of the XUnit file of the suite
+        :returns: suite status (PASSED or FAILED)
+        """
+        journaled = self.journal.get_suite(key) if self.journal else None
+        if journaled is not None and journaled['status'] is not None:
+            return journaled['status']
+
+        started = time.perf_counter()
+        if journaled is not None:
+            item_id = journaled['id']
+        else:
+            item_id = await self.service.start_test_item(
+                name=suite_item.name,
+                start_time=suite_item.start_time,
+                item_type="SUITE")
+            if self.journal is not None:
+                self.journal.suite_started(key, item_id)
+
+        test_file.add()
+        suite = PendingItem(lambda: self.spawn(self.finish_test_suite_async(
+            item_id, suite_item, key, test_file, started)))
+        for index, case_item in case_items:
+            case_key = f'{key}:{index}'
+            if self.journal is not None:
+                journaled_case = self.journal.get_case(case_key)
+                if journaled_case and journaled_case['state'] == 'done':
+                    continue
+            # wait for a free slot and for the memory budget, which also
+            # keeps the parser from running ahead of the uploads
+            size = await self.reserve_memory_async(case_item)
+            await self.slots.acquire()
+            suite.add()
+            self.spawn(self.publish_test_case_async(
+                case_item, item_id, case_key, suite, size))
+        suite.release()
+
+        return suite_item.status
+
+    async def reserve_memory_async(self, case_item):
+        """
+        Wait for a test case to fit in the memory budget, see
+        reserve_memory
+        :param case_item: Test case item details
+        :returns: Bytes reserved
+        """
+        if self.memory is None:
+            return 0
+        size = get_item_size(case_item)
+        with self.stats.phase('memory_wait'):
+            await self.memory.reserve(size)
+        return size
+
+    async def finish_test_suite_async(self, item_id, suite_item, key,
+                                      test_file, started):
+        await self.service.finish_test_item(
             item_id,
-            end_time=end_time,
-            status=status,
-            issue=issue)
+            end_time=suite_item.end_time,
+            status=suite_item.status)
+        self.stats.add_cost('suite', key, time.perf_counter() - started)
+        if self.journal is not None:
+            self.journal.suite_done(key, suite_item.status)
+        test_file.release()
+
+    async def publish_test_case_async(self, case_item, parent_id, key, suite,
+                                      size=0):
+        """
+        Publish test cases to reportportal
+        :param case_item: Test case item details
+        :param parent_id: ID of the test suite
+        :param key: Journal key of the test case
+        :param suite: Pending item of the test suite
+        :param size: Bytes of the memory budget reserved for the test case
+        """
+        try:
+            await self.publish_test_case_item_async(case_item, parent_id, key)
+        finally:
+            self.slots.release()
+            if size:
+                await self.memory.release(size)
+        # a suite with a failed test case is left unfinished
+        suite.release()
+
+    async def publish_test_case_item_async(self, case_item, parent_id, key):
+        journaled = self.journal.get_case(key) if self.journal else None
+
+        # start test case
+        if journaled is not None:
+            item_id = journaled['id']
+        else:
+            item_id = await self.service.start_test_item(
+                name=case_item.name,
+                start_time=case_item.start_time,
+                item_type=case_item.item_type,
+                parent_item_id=parent_id)
+            if self.journal is not None:
+                self.journal.case_started(key, item_id)
+
+        # finish test case
+        if journaled is None or journaled['state'] == 'started':
+            await self.service.finish_test_item(
+                item_id,
+                end_time=case_item.end_time,
+                status=case_item.status,
+                issue=case_item.issue)
+            if self.journal is not None:
+                self.journal.case_finished(key)
+
+        for entry in self.get_case_logs(case_item, item_id, key):
+            await self.add_log_async(entry)
 
 
 def main():
@@ -452,29 +1822,91 @@ def main():
     result = {}
 
     module_args = dict(
-        url=dict(type='str', required=True),
-        token=dict(type='str', required=True),
+        url=dict(type='str', required=False),
+        token=dict(type='str', required=False),
         ssl_verify=dict(type='bool', default=True),
         threads=dict(type='int', default=8),
         ignore_skipped_tests=dict(type='bool', default=False),
-        project_name=dict(type='str', required=True),
-        launch_name=dict(type='str', required=True),
+        project_name=dict(type='str', required=False),
+        launch_name=dict(type='str', required=False),
         launch_tags=dict(type='list', required=False),
         launch_description=dict(type='str', default=''),
         launch_start_time=dict(type='str', default=None),
         launch_end_time=dict(type='str', default=None),
-        tests_paths=dict(type='list', required=True),
+        tests_paths=dict(type='list', required=False),
         tests_exclude_paths=dict(type='list', required=False),
         log_last_traceback_only=dict(type='bool', default=False),
         full_log_attachment=dict(type='bool', default=False),
-        class_in_name=dict(type='bool', default=False)
+        class_in_name=dict(type='bool', default=False),
+        stream_parse=dict(type='bool', default=False),
+        engine=dict(type='str', default='thread', choices=['thread', 'async']),
+        concurrency=dict(type='int', default=200),
+        adaptive_concurrency=dict(type='bool', default=False),
+        min_concurrency=dict(type='int', default=2),
+        retries=dict(type='int', default=3),
+        trace_path=dict(type='str', required=False),
+        log_batch_size=dict(type='int', default=20),
+        log_batch_max_size=dict(type='int', default=10 * 1024 * 1024),
+        log_message_max_size=dict(type='int', default=0),
+        journal_path=dict(type='str', required=False),
+        resume=dict(type='bool', default=False),
+        cache_dir=dict(type='str', required=False),
+        cache_skip_files=dict(type='bool', default=False),
+        cache_max_age=dict(type='int', default=30),
+        cache_max_entries=dict(type='int', default=10000),
+        parse_workers=dict(type='int', default=0),
+        memory_budget=dict(type='int', default=0),
+        mode=dict(type='str', default='publish',
+                  choices=['publish', 'spool', 'replay']),
+        spool_path=dict(type='str', required=False),
+        cost_model=dict(type='dict', required=False,
+                        options=dict(parse_rate=dict(type='float'),
+                                     case_time=dict(type='float'),
+                                     log_rate=dict(type='float'),
+                                     suite_time=dict(type='float'))),
+        destinations=dict(
+            type='list', elements='dict', required=False,
+            options=dict(url=dict(type='str'),
+                         token=dict(type='str', no_log=True),
+                         ssl_verify=dict(type='bool'),
+                         project_name=dict(type='str'),
+                         launch_name=dict(type='str'),
+                         launch_tags=dict(type='list'),
+                         launch_description=dict(type='str'))),
+        watch=dict(type='bool', default=False),
+        watch_stable_time=dict(type='float', default=10),
+        watch_interval=dict(type='float', default=2),
+        watch_idle_timeout=dict(type='float', default=900),
+        watch_stop_path=dict(type='str', required=False)
     )
 
     module = AnsibleModule(
         argument_spec=module_args,
+        required_if=[('resume', True, ['journal_path']),
+                     ('mode', 'publish', ['url', 'token', 'project_name',
+                                          'launch_name', 'tests_paths']),
+                     ('mode', 'spool', ['launch_name', 'tests_paths',
+                                        'spool_path']),
+                     ('mode', 'replay', ['url', 'token', 'project_name',
+                                         'spool_path'])],
         supports_check_mode=False)
 
+    mode = module.params.pop('mode')
+    if mode == 'publish' and module.params['engine'] == 'async' and \
+            not HAS_AIOHTTP:
+        module.fail_json(msg=missing_required_lib('aiohttp'))
+
+    stats = PublishStats()
+    trace_path = module.params.pop('trace_path')
+    if mode == 'replay':
+        replay_spool(module, stats, trace_path)
     service = None
+    limiter = None
+    publisher = None
+    watcher = None
+    fanout = False
+    journal = None
+    cache = None
     launch_end_time = None
 
     try:
@@ -483,62 +1915,167 @@ def main():
         launch_start_time = module.params.pop('launch_start_time')
         launch_end_time = module.params.pop('launch_end_time')
 
-        expanded_paths = get_expanded_paths(tests_paths)
-        expanded_exclude_paths = [] if not tests_exclude_paths else \
-            get_expanded_paths(tests_exclude_paths)
-
-        expanded_paths = \
-            list(set(expanded_paths) - set(expanded_exclude_paths))
-
-        if not expanded_paths:
-            raise IOError("There are no paths to fetch data from")
-
-        missing_paths = []
-        for a_path in expanded_paths:
-            if not os.path.exists(a_path):
-                missing_paths.append(a_path)
+        if module.params.pop('watch'):
+            # the files are published as the watcher finds them complete
+            watcher = get_watcher(module.params, tests_paths,
+                                  tests_exclude_paths or [])
+            expanded_files, expanded_exclude_paths, missing_paths = \
+                [], [], []
+            expanded_paths = []
+        else:
+            with stats.phase('scan'):
+                expanded_files, expanded_exclude_paths, missing_paths = \
+                    walk_paths(tests_paths, tests_exclude_paths or [])
+                expanded_paths = [expanded_file.path
+                                  for expanded_file in expanded_files]
+                expanded_paths.extend(missing_paths)
+
+                if not expanded_paths:
+                    raise IOError("There are no paths to fetch data from")
         if missing_paths:
             raise FileNotFoundError(
                 "Paths not exist: {missing_paths}'".format
                 (missing_paths=str(missing_paths)))
 
+        destinations = get_destinations(module.params)
+        fanout = mode == 'publish' and len(destinations) > 1
+
+        publish_paths = expanded_paths
+        cache_dir = module.params.pop('cache_dir')
+        if cache_dir and mode == 'publish' and not fanout and \
+                watcher is None:
+            cache = PublishCache(cache_dir,
+                                 max_age=module.params.pop('cache_max_age'),
+                                 max_entries=module.params.pop(
+                                     'cache_max_entries'))
+            with stats.phase('cache'):
+                cache.evict()
+                cache_keys = dict(
+                    (path, cache.get_key(path,
+                                         destinations[0]['url'],
+                                         destinations[0]['project_name'],
+                                         destinations[0]['launch_name']))
+                    for path in expanded_paths)
+                cached = dict((path, cache.get(key))
+                              for path, key in cache_keys.items())
+            cached_paths = [path for path in expanded_paths if cached[path]]
+            cached_launch_ids = set(entry['launch_id']
+                                    for entry in cached.values() if entry)
+
+            result['expanded_paths'] = expanded_paths
+            result['expanded_exclude_paths'] = expanded_exclude_paths
+            result['cached_paths'] = cached_paths
+            if len(cached_paths) == len(expanded_paths) and \
+                    len(cached_launch_ids) == 1:
+                # everything was already published to the same launch
+                result['launch_id'] = cached_launch_ids.pop()
+                result['memory'] = dict(peak_rss=get_peak_rss())
+                add_stats(result, stats, trace_path)
+                module.exit_json(changed=False, **result)
+
+            if module.params.pop('cache_skip_files'):
+                publish_paths = [path for path in expanded_paths
+                                 if not cached[path]]
+                if not publish_paths:
+                    # published to several launches, none to start again
+                    result['cached_launch_ids'] = sorted(cached_launch_ids)
+                    result['memory'] = dict(peak_rss=get_peak_rss())
+                    add_stats(result, stats, trace_path)
+                    module.exit_json(changed=False, **result)
+            else:
+                result['cached_paths'] = []
+
         # Get the ReportPortal service instance
-        service = ReportPortalService(
-            endpoint=module.params.pop('url'),
-            project=module.params.pop('project_name'),
-            token=module.params.pop('token'),
-            verify_ssl=module.params.pop('ssl_verify')
-        )
+        engine = module.params.pop('engine')
+        concurrency = module.params.pop('concurrency')
+        retries = module.params.pop('retries')
+        max_concurrency = concurrency if engine == 'async' \
+            else max(module.params['threads'], 1)
+        # without adaptive concurrency the limit stays at its maximum
+        min_concurrency = module.params.pop('min_concurrency') \
+            if module.params.pop('adaptive_concurrency') else max_concurrency
+        # launch of every destination, see FanoutService
+        launches = [dict(name=destination['launch_name'],
+                         attributes=get_launch_attrs(
+                             destination['launch_tags']),
+                         description=destination['launch_description'])
+                    for destination in destinations]
+        if mode == 'spool':
+            service = SpoolService(module.params.pop('spool_path'),
+                                   append=module.params['resume'])
+            publisher_class = SpoolPublisher
+        elif engine == 'async':
+            # a limiter per destination, each server has its own load
+            limiters = [AsyncAdaptiveLimiter(min_concurrency, max_concurrency)
+                        for _ in destinations]
+            services = [AsyncReportPortalService(
+                endpoint=destination['url'],
+                project=destination['project_name'],
+                token=destination['token'],
+                verify_ssl=destination['ssl_verify'],
+                concurrency=concurrency,
+                limiter=destination_limiter,
+                retries=retries,
+                stats=stats
+            ) for destination, destination_limiter in zip(destinations,
+                                                          limiters)]
+            limiter = limiters[0]
+            service = AsyncFanoutService(services, launches) \
+                if fanout else services[0]
+            publisher_class = functools.partial(AsyncReportPortalPublisher,
+                                                concurrency=concurrency)
+        else:
+            limiters = [AdaptiveLimiter(min_concurrency, max_concurrency)
+                        for _ in destinations]
+            services = [get_thread_service(
+                destination['url'],
+                destination['project_name'],
+                destination['token'],
+                destination['ssl_verify'],
+                destination_limiter, retries, stats)
+                for destination, destination_limiter in zip(destinations,
+                                                            limiters)]
+            limiter = limiters[0]
+            if fanout:
+                service = FanoutService(services, launches,
+                                        threads=max_concurrency)
+                publisher_class = FanoutPublisher
+            else:
+                service = services[0]
+                publisher_class = ReportPortalPublisher
 
-        launch_tags = module.params.pop('launch_tags')
-        launch_attrs = {}
-        for tag in launch_tags:
-            tag_attr = tag.split(':', 1)
-            if len(tag_attr) == 2:
-                if len(tag_attr[0]) > 127:
-                    key = tag_attr[0][:127]
-                else:
-                    key = tag_attr[0]
-                if not tag_attr[1]:
-                    val = 'N/A'
-                elif len(tag_attr[1]) > 127:
-                    val = tag_attr[1][:127]
-                else:
-                    val = tag_attr[1]
-                launch_attrs[key] = val
-
-        publisher = ReportPortalPublisher(
+        journal_path = module.params.pop('journal_path')
+        if journal_path:
+            journal = PublishJournal(journal_path)
+            journal.open(resume=module.params.pop('resume'))
+
+        publisher = publisher_class(
             service=service,
-            launch_name=module.params.pop('launch_name'),
-            launch_attrs=launch_attrs,
-            launch_description=module.params.pop('launch_description'),
+            launch_name=launches[0]['name'],
+            launch_attrs=launches[0]['attributes'],
+            launch_description=launches[0]['description'],
             ignore_skipped_tests=module.params.pop('ignore_skipped_tests'),
             log_last_traceback_only=module.params.pop(
                 'log_last_traceback_only'),
             full_log_attachment=module.params.pop('full_log_attachment'),
             threads=module.params.pop('threads'),
             class_in_name=module.params.pop('class_in_name'),
-            expanded_paths=expanded_paths
+            stream_parse=module.params.pop('stream_parse'),
+            log_batch_size=module.params.pop('log_batch_size'),
+            log_batch_max_size=module.params.pop('log_batch_max_size'),
+            log_message_max_size=module.params.pop('log_message_max_size'),
+            journal=journal,
+            parse_workers=module.params.pop('parse_workers'),
+            stats=stats,
+            file_sizes=dict((expanded_file.path, expanded_file.size)
+                            for expanded_file in expanded_files),
+            cost_model=CostModel(**dict(
+                (name, value) for name, value in
+                (module.params.pop('cost_model') or {}).items()
+                if value is not None)),
+            watcher=watcher,
+            memory_budget=module.params.pop('memory_budget'),
+            expanded_paths=publish_paths
         )
 
         if launch_start_time is not None:
@@ -547,27 +2084,62 @@ def main():
             fixed_start_time = str(int(launch_start_time) - 1000)
             publisher.launch_start_time = fixed_start_time
 
-        status = 'PASSED' if publisher.publish_tests() else 'FAILED'
+        with stats.phase('publish'):
+            status = 'PASSED' if publisher.publish_tests() else 'FAILED'
+        if watcher is not None:
+            expanded_exclude_paths = watcher.excluded
 
         result['expanded_paths'] = expanded_paths
         result['expanded_exclude_paths'] = expanded_exclude_paths
-        result['launch_id'] = service.launch_id
+        if fanout:
+            add_destinations(result, service, destinations)
+            result['concurrency'] = limiter.get_stats()
+        elif mode == 'publish':
+            result['launch_id'] = service.launch_id
+            result['concurrency'] = limiter.get_stats()
 
         # Set launch ending time
         if launch_end_time is None:
             launch_end_time = str(int(time.time() * 1000))
 
         # Finish launch.
-        service.finish_launch(end_time=launch_end_time, status=status)
-        service.terminate()
-
+        with stats.phase('finish_launch'):
+            publisher.finish_launch(end_time=launch_end_time, status=status)
+        if journal is not None:
+            journal.remove()
+        if cache is not None:
+            for path in publish_paths:
+                cache.add(cache_keys[path], service.launch_id, path)
+
+        result['memory'] = publisher.get_memory_stats()
+        add_stats(result, stats, trace_path)
         module.exit_json(**result)
 
     except Exception as ex:
-        if service is not None and service.launch_id:
-            if launch_end_time is None:
-                launch_end_time = str(int(time.time() * 1000))
-            service.finish_launch(end_time=launch_end_time, status="FAILED")
+        if publisher is not None and service.launch_id:
+            if journal is not None:
+                # keep the launch open for the import to be resumed
+                if fanout:
+                    add_destinations(result, service, destinations)
+                elif mode == 'publish':
+                    result['launch_id'] = service.launch_id
+                publisher.suspend()
+                journal.close()
+            elif mode == 'spool':
+                # a spool without the launch end is never replayed
+                publisher.suspend()
+            else:
+                if launch_end_time is None:
+                    launch_end_time = str(int(time.time() * 1000))
+                publisher.finish_launch(end_time=launch_end_time,
+                                        status="FAILED")
+        elif publisher is not None:
+            publisher.remove_spool()
+        if limiter is not None:
+            result['concurrency'] = limiter.get_stats()
+        result['memory'] = publisher.get_memory_stats() \
+            if publisher is not None else dict(peak_rss=get_peak_rss())
+        add_stats(result, stats, trace_path)
         result['msg'] = ex
         module.fail_json(**result)
 
@@ -19,7 +19,9 @@
 import requests
 
 from ansible.module_utils.basic import AnsibleModule
-from ansible.module_utils.utils import convert_date_to_sec, get_json, save_to_file
+from ansible.module_utils.http_cache import HttpCache
+from ansible.module_utils.utils import (convert_date_to_sec, get_json,
+                                        is_zuul_build_finished, save_to_file)
 
 from lxml import etree
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
@@ -61,6 +63,20 @@ options:
         description: File path to save the generated XML file
         required: True
         type: str
+    cache_dir:
+        description:
+            - Directory of a local cache of the Zuul responses, shared with
+              the other zuul and jenkins modules. The responses are cached
+              only once the build is finished, so importing a finished
+              build again doesn't make any request.
+        required: False
+        type: str
+    cache_max_size:
+        description:
+            - Maximum size in bytes of the cached responses, the least
+              recently used ones are evicted first.
+        default: 1073741824
+        type: int
 
 requirements:
     - "lxml"
@@ -74,6 +90,12 @@ file_path:
     description: Path of the saved XML files
     type: string
     returned: always
+cache:
+    description:
+        The amount of responses read from the cache ('hits') and of the
+        ones requested to Zuul ('misses').
+    type: dict
+    returned: when cache_dir is set
 '''
 
 requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
@@ -81,8 +103,9 @@ requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 ssl_verify = True
 
 
-def create_test_suite(base_url):
-    response = get_json(f'{base_url}', ssl_verify)
+def create_test_suite(base_url, cache=None):
+    response = get_json(f'{base_url}', ssl_verify, cache=cache,
+                        cacheable=is_zuul_build_finished)
 
     suite = etree.Element('testsuite')
     suite.set('name', 'deployment')
@@ -103,7 +126,10 @@ def main():
                        zuul_job_build_id=dict(type='str', required=True),
                        zuul_api_path_template=dict(type='str', required=True),
                        ssl_verify=dict(type='bool', default=True),
-                       output_xml_file=dict(type='str', required=True))
+                       output_xml_file=dict(type='str', required=True),
+                       cache_dir=dict(type='str', required=False),
+                       cache_max_size=dict(type='int',
+                                           default=1024 * 1024 * 1024))
     module = AnsibleModule(argument_spec=module_args,
                            supports_check_mode=False)
     try:
@@ -119,8 +145,15 @@ def main():
                                                  zuul_tenant=zuul_tenant,
                                                  zuul_job_build_id=zuul_job_build_id)
 
-        suite = create_test_suite(base_url)
+        cache_dir = module.params.pop('cache_dir')
+        cache = HttpCache(cache_dir, module.params.pop('cache_max_size')) \
+            if cache_dir else None
+
+        suite = create_test_suite(base_url, cache)
         result['file_path'] = save_to_file(suite, output_xml_file)
+        if cache is not None:
+            cache.evict()
+            result['cache'] = cache.get_stats()
 
         module.exit_json(**result)
     except Exception as ex:
@@ -18,15 +18,19 @@
 
 import gzip
 import json
+import os
 import requests
+import tempfile
 import urllib.request
 import sys
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.http_cache import HttpCache
+from ansible.module_utils.subunit_v2 import convert_subunit_files
 from ansible.module_utils.utils import (create_folders_on,
                                         has_extension,
-                                        replace_extension,
-                                        subunit_to_xml)
+                                        is_zuul_build_finished,
+                                        replace_extension)
 
 from requests.packages.urllib3.exceptions import InsecureRequestWarning
 from urllib.error import HTTPError
@@ -66,40 +70,97 @@ options:
         description: Folder to save artifacts with test results
         required: True
         type: str
+    workers:
+        description:
+            Amount of processes converting the subunit files to XML at
+            once.
+        default: 4
+        type: int
+    cache_dir:
+        description:
+            - Directory of a local cache of the Zuul responses, shared with
+              the other zuul and jenkins modules. The responses are cached
+              only once the build is finished, so importing a finished
+              build again doesn't make any request.
+        required: False
+        type: str
+    cache_max_size:
+        description:
+            - Maximum size in bytes of the cached responses, the least
+              recently used ones are evicted first.
+        default: 1073741824
+        type: int
 
 requirements:
     - "gzip"
     - "json"
-    - "junitxml"
     - "lxml"
     - "os"
     - "requests"
     - "urllib"
-    - "subprocess"
-    - "subunit"
     - "xml"
 '''
 
 RETURN = '''
 file_path:
-    description: Path of the saved XML files
-    type: string
+    description: Paths of the saved XML files
+    type: list
     returned: always
+cache:
+    description:
+        The amount of responses read from the cache ('hits') and of the
+        ones requested to Zuul ('misses').
+    type: dict
+    returned: when cache_dir is set
 '''
 
 requests.packages.urllib3.disable_warnings(InsecureRequestWarning)
 
 
-def get_test_results(zuul_api_url, destination_folder):
+def read_url(url, read, cache=None, cacheable=True):
+    """
+    Read the body of a URL, from the cache when it's there
+    :param url: The URL
+    :param read: Function reading the body of the URL
+    :param cache: HttpCache of the responses, if any
+    :param cacheable: Whether the body is added to the cache, or a function
+                      telling it from the body
+    :returns: The body
+    """
+    content = cache.get(url) if cache is not None else None
+    if content is None:
+        content = read(url)
+        if cache is not None and \
+                (cacheable(content) if callable(cacheable) else cacheable):
+            cache.add(url, content)
+    return content
+
+
+def read_manifest(url):
+    manifest = urllib.request.urlopen(url)
+    if manifest.info().get('Content-Encoding') == 'gzip':
+        return gzip.decompress(manifest.read())
+    return manifest.read()
+
+
+def read_file(url):
+    response = requests.get(url)
+    response.raise_for_status()  # Raise an exception for HTTP errors
+    return response.content
+
+
+def get_test_results(zuul_api_url, destination_folder, workers=1,
+                     cache=None):
     try:
-        base_url = urllib.request.urlopen(zuul_api_url).read()
+        base_url = read_url(
+            zuul_api_url, lambda url: urllib.request.urlopen(url).read(),
+            cache, lambda content: is_zuul_build_finished(json.loads(content)))
         base_json = json.loads(base_url)
+        # the manifest and files of a finished build never change
+        final = is_zuul_build_finished(base_json)
         manifest_url = [x['url'] for x in base_json['artifacts'] if x.get('metadata', {}).get('type') == 'zuul_manifest'][0]
-        manifest = urllib.request.urlopen(manifest_url)
-        if manifest.info().get('Content-Encoding') == 'gzip':
-            manifest_json = json.loads(gzip.decompress(manifest.read()))
-        else:
-            manifest_json = json.loads(manifest.read())
+        manifest_json = json.loads(read_url(manifest_url, read_manifest,
+                                            cache, final))
     except HTTPError as e:
         if e.code == 404:
             print(
@@ -126,37 +187,45 @@ def get_test_results(zuul_api_url, destination_folder):
             file_name_list.append(result)
 
     test_result_files_xml = 0
-    test_result_files_subunit = 0
-    for file_name in file_name_list:
-        file_url = base_json['log_url'] + file_name
-        try:
-            response = requests.get(file_url)
-            response.raise_for_status()  # Raise an exception for HTTP errors
-
-            if has_extension(file_name, ".xml"):  # save as it is in the destination_folder
-                destination_path = destination_folder + file_name
-                create_folders_on(destination_path)
-                with open(destination_path, 'wb') as f:
-                    f.write(response.content)
-                test_result_files_xml += 1
-            else:  # has ".subunit" extension
-                file_tmp_location = "/tmp/" + file_name
-                with open(file_tmp_location, 'wb') as f:
-                    f.write(response.content)
-                #  if needed, convert and save as xml in xml_folder
-                new_filename = replace_extension(file_name, ".subunit", ".xml")
-                destination_folder = destination_folder.rstrip('/') + '/'
-                subunit_to_xml(file_tmp_location, destination_folder + new_filename)
-                test_result_files_subunit += 1
-        except requests.exceptions.RequestException as e:
-            print(f"Error downloading: \n{e} \n{file_url}")
+    saved_paths = []
+    conversions = []
+    with tempfile.TemporaryDirectory() as tmp_folder:
+        for file_name in file_name_list:
+            file_url = base_json['log_url'] + file_name
+            try:
+                content = read_url(file_url, read_file, cache, final)
+
+                if has_extension(file_name, ".xml"):  # save as it is in the destination_folder
+                    destination_path = destination_folder + file_name
+                    create_folders_on(destination_path)
+                    with open(destination_path, 'wb') as f:
+                        f.write(content)
+                    saved_paths.append(destination_path)
+                    test_result_files_xml += 1
+                else:  # has ".subunit" extension
+                    file_tmp_location = os.path.join(tmp_folder, file_name)
+                    create_folders_on(file_tmp_location)
+                    with open(file_tmp_location, 'wb') as f:
+                        f.write(content)
+                    #  convert and save as xml in xml_folder once all are fetched
+                    new_filename = replace_extension(file_name, ".subunit", ".xml")
+                    destination_folder = destination_folder.rstrip('/') + '/'
+                    conversions.append((file_tmp_location,
+                                        destination_folder + new_filename))
+            except requests.exceptions.RequestException as e:
+                print(f"Error downloading: \n{e} \n{file_url}")
+
+        # a subunit file which can't be converted fails the module
+        convert_subunit_files(conversions, workers)
+    saved_paths.extend(xml_path for _, xml_path in conversions)
 
     print("Total test result files feetched: " +
-          str(test_result_files_subunit + test_result_files_xml))
+          str(len(conversions) + test_result_files_xml))
     print("Number of xml test result files feetched: " +
           str(test_result_files_xml))
     print("Number of subunit test result files feetched (and converted to xml): " +
-          str(test_result_files_subunit))
+          str(len(conversions)))
+    return saved_paths
 
 
 def main():
@@ -165,7 +234,11 @@ def main():
                        zuul_tenant=dict(type='str', required=True),
                        zuul_job_build_id=dict(type='str', required=True),
                        zuul_api_path_template=dict(type='str', required=True),
-                       output_xml_folder=dict(type='str', required=True))
+                       output_xml_folder=dict(type='str', required=True),
+                       workers=dict(type='int', default=4),
+                       cache_dir=dict(type='str', required=False),
+                       cache_max_size=dict(type='int',
+                                           default=1024 * 1024 * 1024))
     module = AnsibleModule(argument_spec=module_args,
                            supports_check_mode=False)
     try:
@@ -178,7 +251,15 @@ def main():
         base_url = zuul_api_path_template.format(zuul_domain=zuul_domain,
                                                  zuul_tenant=zuul_tenant,
                                                  zuul_job_build_id=zuul_job_build_id)
-        get_test_results(base_url, output_xml_folder)
+        cache_dir = module.params.pop('cache_dir')
+        cache = HttpCache(cache_dir, module.params.pop('cache_max_size')) \
+            if cache_dir else None
+
+        result['file_path'] = get_test_results(
+            base_url, output_xml_folder, module.params.pop('workers'), cache)
+        if cache is not None:
+            cache.evict()
+            result['cache'] = cache.get_stats()
 
         module.exit_json(**result)
     except Exception as ex:
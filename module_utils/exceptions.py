@@ -24,3 +24,17 @@ class ConnectionError(Exception):
     def __init__(self, response):
         msg = f'HTTP{response.status_code}: {response.text}'
         super().__init__(msg)
+
+
+class ReportPortalError(Exception):
+    def __init__(self, status, text):
+        msg = f'HTTP{status}: {text}'
+        super().__init__(msg)
+
+
+class SpoolError(Exception):
+    pass
+
+
+class SubunitError(Exception):
+    pass
@@ -0,0 +1,225 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, RedHat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+try:
+    from ansible.module_utils.publish_cache import get_file_digest
+except ImportError:
+    from .publish_cache import get_file_digest
+
+# temporary files older than this are left over by interrupted writes
+_TMP_MAX_AGE = 60 * 60
+
+# bodies younger than this may be added by another module, their entry
+# not written yet
+_ADD_TIME = 60
+
+
+class HttpCache:
+    """
+    Local, content addressed cache of HTTP responses which never change,
+    e.g. the API responses and logs of finished builds.
+
+    The body of a response is stored once in 'data', named after the
+    digest of its content, and every URL has a small JSON entry in 'urls',
+    named after the digest of the URL, pointing to the body. It's up to
+    the caller to only add the responses of finished builds. Using an
+    entry refreshes its modification time, and once the bodies take more
+    than 'max_size' bytes the least recently used entries are evicted,
+    along with the bodies no entry points to anymore.
+    """
+
+    def __init__(self, path, max_size=1024 * 1024 * 1024):
+        """
+        Args:
+            path (str): Directory of the cache.
+            max_size (int): Maximum size of the bodies in bytes.
+        """
+        self.path = path
+        self.max_size = max_size
+        self.urls_path = os.path.join(path, 'urls')
+        self.data_path = os.path.join(path, 'data')
+        os.makedirs(self.urls_path, exist_ok=True)
+        os.makedirs(self.data_path, exist_ok=True)
+        self.hits = 0
+        self.misses = 0
+
+    def _entry_path(self, url):
+        key = hashlib.sha256(url.encode()).hexdigest()
+        return os.path.join(self.urls_path, f'{key}.json')
+
+    def get_path(self, url):
+        """
+        Get the path of the cached body of a URL.
+
+        Args:
+            url (str): The URL.
+
+        Returns:
+            str or None: Path of the body or None if the URL isn't cached.
+        """
+        entry_path = self._entry_path(url)
+        try:
+            with open(entry_path) as fd:
+                entry = json.load(fd)
+            data_path = os.path.join(self.data_path, entry['digest'])
+            os.utime(data_path)
+            os.utime(entry_path)
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return data_path
+
+    def get(self, url):
+        """
+        Get the cached body of a URL.
+
+        Args:
+            url (str): The URL.
+
+        Returns:
+            bytes or None: The body or None if the URL isn't cached.
+        """
+        data_path = self.get_path(url)
+        if data_path is None:
+            return None
+        try:
+            with open(data_path, 'rb') as fd:
+                return fd.read()
+        except OSError:
+            # evicted by another module in the meantime
+            return None
+
+    def mkstemp(self):
+        """
+        Create a temporary file of the cache, see add_file.
+
+        Returns:
+            tuple: OS level handle and path of the file.
+        """
+        return tempfile.mkstemp(dir=self.path, suffix='.tmp')
+
+    def add(self, url, content):
+        """
+        Add the body of a URL, replacing the existing one.
+
+        Args:
+            url (str): The URL.
+            content (bytes): The body.
+        """
+        fd, tmp_path = self.mkstemp()
+        with os.fdopen(fd, 'wb') as tmp_file:
+            tmp_file.write(content)
+        self.add_file(url, tmp_path)
+
+    def add_file(self, url, tmp_path):
+        """
+        Add the body of a URL written to a temporary file of the cache,
+        which is moved to the cache.
+
+        Args:
+            url (str): The URL.
+            tmp_path (str): Path of the temporary file, see mkstemp.
+        """
+        digest = get_file_digest(tmp_path)
+        size = os.path.getsize(tmp_path)
+        # renamed files are never seen partially written, even if several
+        # modules share the cache
+        os.replace(tmp_path, os.path.join(self.data_path, digest))
+        fd, tmp_path = self.mkstemp()
+        with os.fdopen(fd, 'w') as tmp_file:
+            json.dump(dict(url=url, digest=digest, size=size,
+                           time=time.time()), tmp_file)
+        os.replace(tmp_path, self._entry_path(url))
+
+    def evict(self):
+        """
+        Remove the least recently used entries until the bodies fit in the
+        maximum size, then the bodies no entry points to and the leftover
+        temporary files.
+
+        Returns:
+            int: Amount of removed entries.
+        """
+        entries = []
+        for entry in os.scandir(self.urls_path):
+            try:
+                mtime = entry.stat().st_mtime
+                with open(entry.path) as fd:
+                    cached = json.load(fd)
+                entries.append((mtime, entry.path, cached['digest'],
+                                cached['size']))
+            except (OSError, ValueError, KeyError):
+                # removed by another module in the meantime
+                continue
+
+        # size of every body and amount of entries pointing to it
+        bodies = {}
+        for _, _, digest, size in entries:
+            bodies[digest] = (size, bodies.get(digest, (size, 0))[1] + 1)
+        total_size = sum(size for size, _ in bodies.values())
+
+        removed = 0
+        entries.sort()
+        for _, entry_path, digest, _ in entries:
+            if total_size <= self.max_size:
+                break
+            try:
+                os.remove(entry_path)
+            except OSError:
+                continue
+            removed += 1
+            size, count = bodies[digest]
+            if count == 1:
+                del bodies[digest]
+                total_size -= size
+            else:
+                bodies[digest] = (size, count - 1)
+
+        now = time.time()
+        for entry in os.scandir(self.data_path):
+            try:
+                if entry.name not in bodies and \
+                        entry.stat().st_mtime < now - _ADD_TIME:
+                    os.remove(entry.path)
+            except OSError:
+                continue
+
+        expiry = now - _TMP_MAX_AGE
+        for entry in os.scandir(self.path):
+            try:
+                if entry.name.endswith('.tmp') and \
+                        entry.stat().st_mtime < expiry:
+                    os.remove(entry.path)
+            except OSError:
+                continue
+        return removed
+
+    def get_stats(self):
+        """
+        Returns:
+            dict: Amount of URLs read from the cache ('hits') and amount of
+                  URLs which weren't cached ('misses').
+        """
+        return dict(hits=self.hits, misses=self.misses)
@@ -0,0 +1,153 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, RedHat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from ansible.module_utils.utils import get_json, iter_text
+except ImportError:
+    from .utils import get_json, iter_text
+
+
+class HttpPool:
+    """
+    Bounded pool of threads fetching URLs concurrently.
+
+    At most 'workers' requests are in flight, and no more than
+    'max_per_host' of them to the same host, so a single server isn't
+    flooded whatever the size of the pool. The connections are kept alive
+    and reused across the requests.
+
+    Callers submit the requests and collect their futures themselves, a
+    request must not wait for another request of the pool, which could
+    leave all the workers waiting.
+
+    With a cache, the cached responses are used instead of making the
+    requests, and the responses are added to it once they are known to
+    never change, i.e. when 'final' is set or when the request says so.
+    """
+
+    def __init__(self, workers=8, max_per_host=4, verify=True, cache=None):
+        """
+        Args:
+            workers (int): Maximum amount of requests in flight.
+            max_per_host (int): Maximum amount of requests in flight to the
+                                same host.
+            verify (bool): Whether the server certificates are validated.
+            cache (HttpCache): Cache of the responses, if any.
+        """
+        workers = max(workers, 1)
+        self.executor = ThreadPoolExecutor(workers)
+        self.max_per_host = max(max_per_host, 1)
+        self.hosts = {}
+        self.lock = threading.Lock()
+        self.verify = verify
+        self.cache = cache
+        self.final = False
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_maxsize=workers)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def get_host_slots(self, url):
+        """
+        Args:
+            url (str): URL of a request.
+
+        Returns:
+            threading.BoundedSemaphore: The requests in flight to the host
+                                        of the URL.
+        """
+        host = urlparse(url).netloc
+        with self.lock:
+            slots = self.hosts.get(host)
+            if slots is None:
+                slots = self.hosts[host] = threading.BoundedSemaphore(
+                    self.max_per_host)
+        return slots
+
+    def get_json(self, url, cacheable=None):
+        """
+        Fetch JSON data, waiting for a free slot of the host.
+
+        Args:
+            url (str): The URL.
+            cacheable (bool or callable): Whether the response is added to
+                                          the cache, see utils.get_json,
+                                          'final' by default.
+
+        Raises:
+            ConnectionError: The HTTP response status code is not 200 (OK).
+
+        Returns:
+            dict: The JSON data of the response.
+        """
+        with self.get_host_slots(url):
+            return get_json(url, self.verify, session=self.session,
+                            cache=self.cache,
+                            cacheable=self.final if cacheable is None
+                            else cacheable)
+
+    def iter_text(self, url):
+        """
+        Fetch a text in chunks, holding a slot of the host until the whole
+        text is read.
+
+        Raises:
+            ConnectionError: The HTTP response status code is not 200 (OK).
+
+        Yields:
+            str: The chunks of the text of the response.
+        """
+        with self.get_host_slots(url):
+            yield from iter_text(url, self.verify, session=self.session,
+                                 cache=self.cache, cacheable=self.final)
+
+    def submit(self, function, *args, **kwargs):
+        """
+        Run a function in the pool.
+
+        Returns:
+            concurrent.futures.Future: The future of its result.
+        """
+        return self.executor.submit(function, *args, **kwargs)
+
+    def fetch_json(self, url):
+        """
+        Fetch JSON data in the pool, see get_json.
+
+        Returns:
+            concurrent.futures.Future: The future of the JSON data.
+        """
+        return self.submit(self.get_json, url)
+
+    def close(self):
+        """Wait for the requests in flight and release the connections."""
+        self.executor.shutdown()
+        self.session.close()
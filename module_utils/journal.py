@@ -0,0 +1,176 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, RedHat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+import json
+import os
+import threading
+
+try:
+    from ansible.module_utils.utils import create_folders_on
+except ImportError:
+    from .utils import create_folders_on
+
+
+class PublishJournal:
+    """
+    Append-only journal of the progress of a launch being published.
+
+    Every record is a JSON line appended (and flushed) as soon as the
+    matching Reportportal call succeeded, so after an interrupted run the
+    journal tells which launch was used and which files, suites and test
+    cases were already published, together with their item IDs.
+
+    Suites and test cases are identified by their position in the XUnit
+    file, e.g. '<path>:<suite index>:<case index>'. A test case goes through
+    three states: 'started' (item created), 'finished' (item finished) and
+    'done' (its logs were sent as well). Every log entry sent is recorded
+    too, by its index among the ones of the test case, so a resumed test
+    case doesn't send its logs again.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path (str): Path of the journal file.
+        """
+        self.path = path
+        self.lock = threading.Lock()
+        self.fd = None
+        self.launch_id = None
+        self.files = {}
+        self.suites = {}
+        self.cases = {}
+
+    def open(self, resume=False):
+        """
+        Open the journal for writing.
+
+        Args:
+            resume (bool): Load the records of the previous run and append
+                           to them, instead of starting a new journal.
+        """
+        create_folders_on(os.path.abspath(self.path))
+        if resume and os.path.exists(self.path):
+            # end of the last complete record
+            offset = 0
+            with open(self.path, 'rb') as fd:
+                for line in fd:
+                    try:
+                        if not line.endswith(b'\n'):
+                            raise ValueError('Incomplete record')
+                        record = json.loads(line)
+                    except ValueError:
+                        # the last record may be cut by the interruption
+                        break
+                    self._apply(record)
+                    offset += len(line)
+            # drop the cut record, the next ones would be glued to it
+            os.truncate(self.path, offset)
+        self.fd = open(self.path, 'a' if resume else 'w')
+
+    def close(self):
+        """Close the journal file."""
+        if self.fd is not None:
+            self.fd.close()
+            self.fd = None
+
+    def remove(self):
+        """Close and delete the journal, once the launch is finished."""
+        self.close()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+    def _apply(self, record):
+        kind = record['type']
+        key = record.get('key')
+        if kind == 'launch':
+            self.launch_id = record['id']
+        elif kind == 'file':
+            self.files[key] = record['passed']
+        elif kind == 'suite':
+            self.suites[key] = dict(id=record['id'], status=None)
+        elif kind == 'suite_done':
+            self.suites[key]['status'] = record['status']
+        elif kind == 'case':
+            self.cases[key] = dict(id=record['id'], state='started')
+        elif kind in ('case_finished', 'case_done'):
+            self.cases[key]['state'] = kind[len('case_'):]
+        elif kind == 'case_log':
+            self.cases[key].setdefault('logs', set()).add(record['index'])
+
+    def _append(self, record):
+        self._apply(record)
+        self.fd.write(json.dumps(record) + '\n')
+        self.fd.flush()
+
+    def _write(self, **record):
+        with self.lock:
+            self._append(record)
+
+    def launch_started(self, launch_id):
+        self._write(type='launch', id=launch_id)
+
+    def file_done(self, path, passed):
+        self._write(type='file', key=path, passed=passed)
+
+    def suite_started(self, key, item_id):
+        self._write(type='suite', key=key, id=item_id)
+
+    def suite_done(self, key, status):
+        self._write(type='suite_done', key=key, status=status)
+
+    def case_started(self, key, item_id):
+        self._write(type='case', key=key, id=item_id)
+
+    def case_finished(self, key):
+        self._write(type='case_finished', key=key)
+
+    def case_done(self, key):
+        self._write(type='case_done', key=key)
+
+    def case_log_sent(self, key, index, count):
+        """
+        Record a log entry of a test case as sent, the test case is done
+        once all its log entries are, whatever the order of their batches.
+
+        Args:
+            key (str): Key of the test case.
+            index (int): Index of the log entry among the ones of the case.
+            count (int): Amount of log entries of the test case.
+        """
+        with self.lock:
+            self._append(dict(type='case_log', key=key, index=index))
+            if len(self.cases[key]['logs']) >= count:
+                self._append(dict(type='case_done', key=key))
+
+    def get_suite(self, key):
+        """
+        Returns:
+            dict or None: Item 'id' and 'status' (None until the suite is
+                          finished) of a journaled suite.
+        """
+        return self.suites.get(key)
+
+    def get_case(self, key):
+        """
+        Returns:
+            dict or None: Item 'id' and 'state' of a journaled test case,
+                          and the indexes of its 'logs' already sent, if
+                          any.
+        """
+        return self.cases.get(key)
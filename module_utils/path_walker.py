@@ -0,0 +1,247 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, RedHat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+import collections
+import os
+import re
+
+# A file found by walk_paths, with the size in bytes and the modification
+# time in seconds of the file
+FileEntry = collections.namedtuple('FileEntry', ['path', 'size', 'mtime'])
+
+_MAGIC = re.compile(r'[*?[]')
+
+# Any amount of directories, except the hidden ones like glob does
+_ANY_DIRS = r'(?:(?!\.)[^/]+/)*'
+
+
+def _translate(component):
+    """
+    Translate a glob pattern of a single path component to a regex.
+
+    Args:
+        component (str): Component of a pattern, e.g. '*.xml'.
+
+    Returns:
+        str: Regex matching the names the component matches, hidden names
+             only if the component itself starts with a dot.
+    """
+    if not _MAGIC.search(component):
+        return re.escape(component)
+    regex = '' if component.startswith('.') else r'(?!\.)'
+    index = 0
+    while index < len(component):
+        char = component[index]
+        index += 1
+        if char == '*':
+            regex += '[^/]*'
+        elif char == '?':
+            regex += '[^/]'
+        elif char == '[':
+            end = component.find(']', index + 1)
+            if end < 0:
+                regex += re.escape(char)
+                continue
+            chars = component[index:end].replace('\\', '\\\\')
+            if chars.startswith('!'):
+                chars = '^' + chars[1:]
+            elif chars.startswith('^'):
+                chars = '\\' + chars
+            regex += f'[{chars}]'
+            index = end + 1
+        else:
+            regex += re.escape(char)
+    return regex
+
+
+class _Pattern:
+    """A glob pattern split into its literal root and its components."""
+
+    def __init__(self, pattern):
+        components = pattern.split('/')
+        # '' for a relative pattern, '/' for an absolute one
+        self.base = '/' if pattern.startswith('/') else ''
+        if self.base:
+            components = components[1:]
+        literal = 0
+        while literal < len(components) - 1 and \
+                not _MAGIC.search(components[literal]):
+            literal += 1
+        self.root = self.base + '/'.join(components[:literal])
+        self.components = components
+
+    def get_regex(self):
+        """Regex of the paths of the files matching the pattern."""
+        regex = re.escape(self.base)
+        last = len(self.components) - 1
+        for index, component in enumerate(self.components):
+            if component == '**':
+                regex += _ANY_DIRS
+                if index == last:
+                    regex += r'(?!\.)[^/]+'
+            elif index == last:
+                regex += _translate(component)
+            else:
+                regex += _translate(component) + '/'
+        return regex
+
+    def get_prefix_regex(self):
+        """
+        Regex of the paths, followed by a slash, of the directories which
+        may hold matching files.
+        """
+        regex = ''
+        components = self.components
+        if components[-1] != '**':
+            components = components[:-1]
+        for component in reversed(components):
+            if component == '**':
+                regex = _ANY_DIRS + regex
+            else:
+                regex = f'(?:{_translate(component)}/{regex})?'
+        return re.escape(self.base) + regex
+
+
+def _compile(regexes):
+    if not regexes:
+        return None
+    return re.compile('|'.join(f'(?:{regex})' for regex in regexes))
+
+
+def _get_walk_roots(patterns):
+    """Roots of the patterns which aren't below the root of another one."""
+    roots = []
+    for root in sorted(set(pattern.root for pattern in patterns), key=len):
+        if not any(root.startswith('/') == other.startswith('/') and
+                   (other in ('', '/') or root == other or
+                    root.startswith(other + '/'))
+                   for other in roots):
+            roots.append(root)
+    return roots
+
+
+def walk_paths(include, exclude=(), on_directory=None):
+    """
+    Find the files matching glob patterns, walking the tree a single time.
+
+    All the include patterns are compiled into a single regex, and so are
+    the exclude ones and the directories which may hold matching files.
+    Every directory below the literal roots of the patterns is listed at
+    most once, and only if it may hold a matching file and isn't excluded,
+    so the excluded directories are skipped with all their content. The
+    patterns follow glob: '*' and '?' don't match a slash nor a leading
+    dot, and a '**' component matches any amount of directories.
+
+    Paths without any glob character are returned as is, whether they exist
+    or not, as long as they aren't excluded.
+
+    Args:
+        include (list): Patterns of the paths to find, environment
+                        variables and '~' are expanded.
+        exclude (list): Patterns of the files and directories to leave out.
+        on_directory (callable): Function called with the path of every
+                                 directory right before it's listed.
+
+    Returns:
+        tuple: FileEntry of every file found, sorted by path, the paths
+               excluded during the walk and the literal include paths
+               which don't exist.
+    """
+    def expand(pattern):
+        return os.path.expanduser(os.path.expandvars(pattern))
+
+    patterns = []
+    literals = []
+    for pattern in map(expand, include):
+        if _MAGIC.search(pattern):
+            patterns.append(_Pattern(pattern))
+        else:
+            literals.append(pattern)
+
+    exclude_regex = _compile([
+        _Pattern(pattern).get_regex() if _MAGIC.search(pattern)
+        else re.escape(pattern) for pattern in map(expand, exclude)])
+    include_regex = _compile([pattern.get_regex() for pattern in patterns])
+    prefix_regex = _compile([pattern.get_prefix_regex()
+                             for pattern in patterns])
+
+    def is_excluded(path):
+        return exclude_regex is not None and \
+            exclude_regex.fullmatch(path) is not None
+
+    entries = {}
+    excluded = []
+    missing = []
+    for path in literals:
+        if is_excluded(path):
+            excluded.append(path)
+        elif path not in entries:
+            try:
+                stat = os.stat(path)
+                entries[path] = FileEntry(path, stat.st_size, stat.st_mtime)
+            except OSError:
+                missing.append(path)
+                entries[path] = None
+
+    visited = set()
+    stack = [root for root in _get_walk_roots(patterns)
+             if not is_excluded(root)]
+    while stack:
+        directory = stack.pop()
+        if on_directory is not None:
+            on_directory(directory or os.curdir)
+        try:
+            scanner = os.scandir(directory or os.curdir)
+        except OSError:
+            # missing or unreadable, like glob
+            continue
+        with scanner:
+            for entry in scanner:
+                path = entry.name if not directory else \
+                    os.path.join(directory, entry.name)
+                try:
+                    is_dir = entry.is_dir()
+                except OSError:
+                    continue
+                if is_dir:
+                    if prefix_regex.fullmatch(path + '/') is None:
+                        continue
+                    if is_excluded(path):
+                        excluded.append(path)
+                        continue
+                    if entry.is_symlink():
+                        # don't loop over links to a parent directory
+                        stat = entry.stat()
+                        if (stat.st_dev, stat.st_ino) in visited:
+                            continue
+                        visited.add((stat.st_dev, stat.st_ino))
+                    stack.append(path)
+                elif include_regex.fullmatch(path) is not None:
+                    if is_excluded(path):
+                        excluded.append(path)
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries[path] = FileEntry(path, stat.st_size,
+                                              stat.st_mtime)
+
+    files = sorted((entry for entry in entries.values() if entry),
+                   key=lambda entry: entry.path)
+    return files, excluded, missing
@@ -0,0 +1,271 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, RedHat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+import errno
+import os
+import select
+import time
+
+try:
+    from ansible.module_utils.path_walker import walk_paths
+except ImportError:
+    from .path_walker import walk_paths
+
+try:
+    import ctypes
+    import ctypes.util
+    _libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+    _libc.inotify_init1.argtypes = [ctypes.c_int]
+    _libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p,
+                                        ctypes.c_uint32]
+    HAS_INOTIFY = True
+except (ImportError, OSError, AttributeError):
+    HAS_INOTIFY = False
+
+# inotify(7) flags
+_IN_MODIFY = 0x2
+_IN_ATTRIB = 0x4
+_IN_CLOSE_WRITE = 0x8
+_IN_MOVED_FROM = 0x40
+_IN_MOVED_TO = 0x80
+_IN_CREATE = 0x100
+_IN_DELETE = 0x200
+_IN_ONLYDIR = 0x1000000
+_IN_NONBLOCK = os.O_NONBLOCK
+_IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = _IN_MODIFY | _IN_ATTRIB | _IN_CLOSE_WRITE | _IN_MOVED_FROM | \
+    _IN_MOVED_TO | _IN_CREATE | _IN_DELETE | _IN_ONLYDIR
+
+
+class _Inotify:
+    """Inotify instance reporting whether the watched directories changed"""
+
+    def __init__(self):
+        self.fd = _libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error))
+
+    def add_watch(self, path):
+        """
+        Watch the changes of the entries of a directory, watching it again
+        has no effect.
+
+        Raises:
+            OSError: When the directory can't be watched.
+        """
+        if _libc.inotify_add_watch(self.fd, os.fsencode(path),
+                                   _WATCH_MASK) < 0:
+            error = ctypes.get_errno()
+            raise OSError(error, os.strerror(error), path)
+
+    def wait(self, timeout):
+        """
+        Wait for changes, discarding their events.
+
+        Returns:
+            bool: Whether anything changed before the timeout.
+        """
+        if not select.select([self.fd], [], [], max(timeout, 0))[0]:
+            return False
+        try:
+            while os.read(self.fd, 64 * 1024):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+    def close(self):
+        os.close(self.fd)
+
+
+class PathWatcher:
+    """
+    Follow the files matching glob patterns until they are complete.
+
+    A file is complete once its size and modification time didn't change
+    for 'stable_time' seconds, and it's reported a single time, whatever
+    happens to it later on. The patterns are walked again, see walk_paths,
+    whenever inotify reports a change in the walked directories or a file
+    may have become stable. Without inotify, or once the inotify watches
+    run out, they are walked every 'interval' seconds.
+    """
+
+    def __init__(self, include, exclude=(), stable_time=10, interval=2,
+                 idle_timeout=None, stop=None, use_inotify=True):
+        """
+        Args:
+            include (list): Patterns of the paths to follow.
+            exclude (list): Patterns of the files and directories to leave
+                            out.
+            stable_time (float): Seconds a file must stay unchanged.
+            interval (float): Minimum amount of seconds between two walks,
+                              and between two checks of 'stop'.
+            idle_timeout (float): Seconds without any file added or changed
+                                  after which the watch ends, None to wait
+                                  for 'stop'.
+            stop (callable): Function returning True once the watch should
+                             end, e.g. when the test run is over.
+            use_inotify (bool): Whether to use inotify when available.
+        """
+        self.include = include
+        self.exclude = exclude
+        self.stable_time = stable_time
+        self.interval = interval
+        self.idle_timeout = idle_timeout
+        self.stop = stop
+        self.inotify = None
+        if use_inotify and HAS_INOTIFY:
+            try:
+                self.inotify = _Inotify()
+            except OSError:
+                pass
+        # path: (FileEntry, monotonic time it was last seen changing)
+        self.pending = {}
+        self.done = set()
+        self.excluded = []
+        self.scanned = 0
+        self.watched = False
+
+    def watch_directory(self, path):
+        if self.inotify is None:
+            return
+        try:
+            self.inotify.add_watch(path)
+        except OSError as ex:
+            if ex.errno == errno.ENOSPC:
+                # out of watches, fall back to polling
+                self.inotify.close()
+                self.inotify = None
+            else:
+                # e.g. a root which doesn't exist yet, its creation can't
+                # be noticed
+                self.watched = False
+
+    def scan(self):
+        """
+        Walk the patterns, updating the pending files.
+
+        Returns:
+            tuple: FileEntry of the files which became stable, sorted by
+                   path, and whether any file was added or changed.
+        """
+        self.watched = True
+        files, self.excluded, _ = walk_paths(
+            self.include, self.exclude, on_directory=self.watch_directory)
+        self.scanned = time.monotonic()
+        stable = []
+        changed = False
+        seen = set()
+        for entry in files:
+            if entry.path in self.done:
+                continue
+            seen.add(entry.path)
+            known = self.pending.get(entry.path)
+            if known is None and \
+                    time.time() - entry.mtime >= self.stable_time:
+                # already there and untouched for long enough
+                stable.append(entry)
+            elif known is None or known[0][1:] != entry[1:]:
+                self.pending[entry.path] = (entry, self.scanned)
+                changed = True
+            elif self.scanned - known[1] >= self.stable_time:
+                stable.append(entry)
+        for path in set(self.pending) - seen:
+            # removed before it was complete
+            del self.pending[path]
+        return self.take(stable), changed
+
+    def take(self, entries):
+        for entry in entries:
+            self.pending.pop(entry.path, None)
+            self.done.add(entry.path)
+        return entries
+
+    def wait(self):
+        """
+        Wait for the next time the patterns should be walked, or for the
+        next check of 'stop'.
+
+        Returns:
+            bool: Whether the patterns should be walked.
+        """
+        if self.inotify is None or not self.watched:
+            time.sleep(self.interval)
+            return True
+        now = time.monotonic()
+        timeout = self.interval
+        if self.pending:
+            stable_at = min(since for _, since in self.pending.values()) + \
+                self.stable_time
+            timeout = min(timeout, stable_at - now)
+            if timeout <= 0:
+                return True
+        if not self.inotify.wait(timeout):
+            return bool(self.pending) and timeout < self.interval
+        # coalesce the bursts of changes of the files being written
+        delay = self.scanned + self.interval - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        return True
+
+    def watch(self, on_wait=None):
+        """
+        Follow the files until 'stop' returns True or the idle timeout.
+
+        Once the watch ends, all the pending files are considered complete.
+
+        Args:
+            on_wait (callable): Function called before every wait, e.g. to
+                                flush what was buffered so far.
+
+        Yields:
+            list: FileEntry of the files complete since the previous ones,
+                  sorted by path.
+        """
+        activity = time.monotonic()
+        due = True
+        try:
+            while True:
+                if due:
+                    stable, changed = self.scan()
+                    if stable or changed:
+                        activity = time.monotonic()
+                    if stable:
+                        yield stable
+                if (self.stop is not None and self.stop()) or \
+                        (self.idle_timeout is not None and
+                         time.monotonic() - activity >= self.idle_timeout):
+                    break
+                if on_wait is not None:
+                    on_wait()
+                due = self.wait()
+            stable, _ = self.scan()
+            rest = sorted(stable + [entry for entry, _ in
+                                    self.pending.values()],
+                          key=lambda entry: entry.path)
+            if rest:
+                yield self.take(rest)
+        finally:
+            self.close()
+
+    def close(self):
+        if self.inotify is not None:
+            self.inotify.close()
+            self.inotify = None
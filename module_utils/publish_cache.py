@@ -0,0 +1,158 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, RedHat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+
+def get_file_digest(path, chunk_size=1024 * 1024):
+    """
+    Calculate the SHA256 digest of a file content, reading it in chunks.
+
+    Args:
+        path (str): Path of the file.
+        chunk_size (int): Amount of bytes read at once.
+
+    Returns:
+        str: Hexadecimal digest of the file content.
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as fd:
+        for chunk in iter(lambda: fd.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class PublishCache:
+    """
+    Local cache of the result files which were already published.
+
+    Every entry is a small JSON file named after the digest of the file
+    content combined with the Reportportal destination (URL, project and
+    launch name), holding the ID of the launch the file was published to.
+    Entries are evicted once they are older than 'max_age' days, or the
+    least recently used ones once there are more than 'max_entries'.
+    Using an entry refreshes its modification time.
+    """
+
+    def __init__(self, path, max_age=30, max_entries=10000):
+        """
+        Args:
+            path (str): Directory of the cache.
+            max_age (int): Maximum age of an entry in days.
+            max_entries (int): Maximum amount of entries.
+        """
+        self.path = path
+        self.max_age = max_age
+        self.max_entries = max_entries
+        os.makedirs(self.path, exist_ok=True)
+
+    def get_key(self, file_path, *destination):
+        """
+        Get the cache key of a file published to a given destination.
+
+        Args:
+            file_path (str): Path of the result file.
+            destination (str): Values identifying where the file is
+                               published, e.g. URL, project and launch name.
+
+        Returns:
+            str: The cache key.
+        """
+        key = hashlib.sha256(get_file_digest(file_path).encode())
+        for value in destination:
+            key.update(b'\0' + str(value).encode())
+        return key.hexdigest()
+
+    def _entry_path(self, key):
+        return os.path.join(self.path, f'{key}.json')
+
+    def get(self, key):
+        """
+        Get a cache entry.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            dict or None: The entry ('launch_id', 'path' and 'time') or None
+                          if the file wasn't published yet.
+        """
+        entry_path = self._entry_path(key)
+        try:
+            with open(entry_path) as fd:
+                entry = json.load(fd)
+            os.utime(entry_path)
+        except (OSError, ValueError):
+            return None
+        return entry
+
+    def add(self, key, launch_id, file_path):
+        """
+        Add a cache entry, replacing the existing one.
+
+        Args:
+            key (str): The cache key.
+            launch_id (str): ID of the launch the file was published to.
+            file_path (str): Path of the published file.
+        """
+        entry = dict(launch_id=launch_id, path=file_path, time=time.time())
+        # write to a temporary file first so readers never see a partial
+        # entry, even if several imports share the cache
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, suffix='.tmp')
+        with os.fdopen(fd, 'w') as tmp_file:
+            json.dump(entry, tmp_file)
+        os.replace(tmp_path, self._entry_path(key))
+
+    def evict(self):
+        """
+        Remove the expired entries and the least recently used ones above
+        the maximum amount of entries.
+
+        Returns:
+            int: Amount of removed entries.
+        """
+        expiry = time.time() - self.max_age * 24 * 60 * 60
+        entries = []
+        removed = 0
+        for entry in os.scandir(self.path):
+            if not entry.is_file():
+                continue
+            try:
+                mtime = entry.stat().st_mtime
+                if mtime < expiry:
+                    os.remove(entry.path)
+                    removed += 1
+                elif entry.name.endswith('.json'):
+                    entries.append((mtime, entry.path))
+            except OSError:
+                # removed by another import in the meantime
+                continue
+
+        if len(entries) > self.max_entries:
+            entries.sort()
+            for _, entry_path in entries[:len(entries) - self.max_entries]:
+                try:
+                    os.remove(entry_path)
+                    removed += 1
+                except OSError:
+                    continue
+        return removed
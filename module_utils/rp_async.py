@@ -0,0 +1,274 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, RedHat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import json
+import time
+
+try:
+    import aiohttp
+    HAS_AIOHTTP = True
+except ImportError:
+    HAS_AIOHTTP = False
+
+try:
+    from ansible.module_utils.exceptions import ReportPortalError
+    from ansible.module_utils.rp_limiter import (OVERLOAD_STATUSES,
+                                                 get_retry_delay,
+                                                 is_retryable)
+    from ansible.module_utils.rp_logs import (get_log_batch_parts,
+                                              open_attachments)
+    from ansible.module_utils.rp_stats import get_endpoint
+except ImportError:
+    from .exceptions import ReportPortalError
+    from .rp_limiter import (OVERLOAD_STATUSES, get_retry_delay,
+                             is_retryable)
+    from .rp_logs import get_log_batch_parts, open_attachments
+    from .rp_stats import get_endpoint
+
+from reportportal_client.helpers import verify_value_length
+from reportportal_client.service import uri_join
+
+
+def _dict_to_payload(dictionary):
+    """
+    Convert a dictionary of attributes to the Reportportal payload format.
+
+    Args:
+        dictionary (dict): Attributes as key/value pairs.
+
+    Returns:
+        list: List of {'key': ..., 'value': ...} dictionaries.
+    """
+    return [{'key': key, 'value': str(value)}
+            for key, value in dictionary.items()]
+
+
+class AsyncReportPortalService:
+    """
+    Asyncio counterpart of reportportal_client.ReportPortalService.
+
+    Only the calls needed to publish XUnit results are implemented. They
+    use the same v2 API endpoints as the synchronous client, but any number
+    of them can be awaited concurrently on a single thread.
+    """
+
+    def __init__(self, endpoint, project, token, verify_ssl=True,
+                 concurrency=100, http_timeout=(10, 10), limiter=None,
+                 retries=3, backoff=0.5, stats=None):
+        """
+        Args:
+            endpoint (str): Endpoint of the Reportportal server.
+            project (str): Project to publish the launch to.
+            token (str): Reportportal API token.
+            verify_ssl (bool): Whether the certificates are validated.
+            concurrency (int): Maximum amount of open connections.
+            http_timeout (tuple): Connect and read timeouts in seconds.
+            limiter (AsyncAdaptiveLimiter): Limiter of the requests in
+                                            flight, if any.
+            retries (int): Maximum amount of retries of the requests
+                           rejected by an overloaded server.
+            backoff (float): Base delay of the retries in seconds.
+            stats (PublishStats): Where every request is recorded, if any.
+        """
+        self.endpoint = endpoint
+        self.project = project
+        self.token = token
+        self.verify_ssl = verify_ssl
+        self.concurrency = concurrency
+        self.http_timeout = http_timeout
+        self.limiter = limiter
+        self.retries = retries
+        self.backoff = backoff
+        self.stats = stats
+        self.base_url_v2 = uri_join(self.endpoint, "api/v2", self.project)
+        self.launch_id = None
+        self.session = None
+
+    async def open(self):
+        """Create the HTTP session, must be called from the event loop."""
+        connector = aiohttp.TCPConnector(
+            limit=self.concurrency,
+            ssl=None if self.verify_ssl else False)
+        timeout = aiohttp.ClientTimeout(sock_connect=self.http_timeout[0],
+                                        sock_read=self.http_timeout[1])
+        self.session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            headers={"Authorization": f"Bearer {self.token}"})
+
+    async def close(self):
+        """Close the HTTP session."""
+        if self.session is not None:
+            await self.session.close()
+            self.session = None
+
+    async def _request(self, method, url, data=None, json_data=None,
+                       size=0, **kwargs):
+        """
+        Send a request and return its decoded JSON response.
+
+        Requests rejected by an overloaded server are retried after a
+        backoff, 'data' may be a callable building a new body per attempt.
+
+        Args:
+            method (str): HTTP method.
+            url (str): URL of the request.
+            data: Body of the request, or a callable returning it.
+            json_data: Object sent as a JSON body instead of 'data'.
+            size (int): Size of 'data' in bytes, for the stats.
+
+        Raises:
+            ReportPortalError: If the server responded with an error.
+        """
+        if json_data is not None:
+            data = json.dumps(json_data).encode()
+            size = len(data)
+            kwargs['headers'] = {'Content-Type': 'application/json'}
+        attempt = 0
+        while True:
+            start = await self.limiter.acquire() if self.limiter \
+                else time.monotonic()
+            status = None
+            try:
+                async with self.session.request(
+                        method, url,
+                        data=data() if callable(data) else data,
+                        **kwargs) as response:
+                    status = response.status
+                    text = await response.text()
+                    retry_after = response.headers.get('Retry-After')
+            finally:
+                if self.limiter:
+                    await self.limiter.release(
+                        start, status is None or status in OVERLOAD_STATUSES,
+                        get_endpoint(method, url))
+                if self.stats is not None:
+                    self.stats.record(method, url, time.monotonic() - start,
+                                      size, status is None or status >= 400)
+            if not is_retryable(method, status) or attempt >= self.retries:
+                break
+            await asyncio.sleep(get_retry_delay(attempt, retry_after,
+                                                self.backoff))
+            attempt += 1
+            if self.limiter:
+                self.limiter.retries += 1
+
+        if status >= 300:
+            raise ReportPortalError(status, text)
+        return json.loads(text) if text else {}
+
+    async def start_launch(self, name, start_time, description=None,
+                           attributes=None, mode=None):
+        """Start a new launch with the given parameters."""
+        if attributes and isinstance(attributes, dict):
+            attributes = _dict_to_payload(attributes)
+        data = {
+            "name": name,
+            "description": description,
+            "attributes": verify_value_length(attributes),
+            "startTime": start_time,
+            "mode": mode,
+            "rerun": False
+        }
+        response = await self._request(
+            'POST', uri_join(self.base_url_v2, "launch"), json_data=data)
+        self.launch_id = response.get('id')
+        return self.launch_id
+
+    async def finish_launch(self, end_time, status=None):
+        """Finish the launch with the given parameters."""
+        data = {
+            "endTime": end_time,
+            "status": status
+        }
+        url = uri_join(self.base_url_v2, "launch", self.launch_id, "finish")
+        return await self._request('PUT', url, json_data=data)
+
+    async def start_test_item(self, name, start_time, item_type,
+                              parent_item_id=None):
+        """Start a test item and return its ID."""
+        data = {
+            "name": name,
+            "startTime": start_time,
+            "launchUuid": self.launch_id,
+            "type": item_type,
+            "hasStats": True,
+            "retry": False
+        }
+        if parent_item_id:
+            url = uri_join(self.base_url_v2, "item", parent_item_id)
+        else:
+            url = uri_join(self.base_url_v2, "item")
+        response = await self._request('POST', url, json_data=data)
+        return response.get('id')
+
+    async def finish_test_item(self, item_id, end_time, status, issue=None):
+        """Finish the test item with the given parameters."""
+        data = {
+            "endTime": end_time,
+            "status": status,
+            "issue": issue,
+            "launchUuid": self.launch_id
+        }
+        url = uri_join(self.base_url_v2, "item", item_id)
+        return await self._request('PUT', url, json_data=data)
+
+    async def log(self, time, message, level=None, attachment=None,
+                  item_id=None):
+        """Create a log entry, optionally with a file attached."""
+        if attachment:
+            return await self.log_batch([dict(time=time,
+                                              message=message,
+                                              level=level,
+                                              attachment=attachment,
+                                              item_id=item_id)])
+        data = {
+            "launchUuid": self.launch_id,
+            "time": time,
+            "message": message,
+            "level": level,
+        }
+        if item_id:
+            data["itemUuid"] = item_id
+        return await self._request('POST', uri_join(self.base_url_v2, "log"),
+                                   json_data=data)
+
+    async def log_batch(self, entries):
+        """Create several log entries with a single multipart request."""
+        request_part, attachments = get_log_batch_parts(self.launch_id,
+                                                        entries)
+        with open_attachments(attachments) as files:
+            def get_form():
+                # a form can't be sent twice, it's built again on retries
+                form = aiohttp.FormData()
+                form.add_field("json_request_part", request_part,
+                               content_type="application/json")
+                for name, data, mime in files:
+                    if hasattr(data, 'seek'):
+                        data.seek(0)
+                    form.add_field("file", data, filename=name,
+                                   content_type=mime)
+                return form
+
+            size = len(request_part) + sum(
+                attachment.get('size') or len(attachment['data'])
+                for attachment in attachments)
+            return await self._request('POST',
+                                       uri_join(self.base_url_v2, "log"),
+                                       data=get_form, size=size)
@@ -0,0 +1,225 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, RedHat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, wait
+
+try:
+    from ansible.module_utils.rp_logs import send_log_batch
+except ImportError:
+    from .rp_logs import send_log_batch
+
+
+def _get_launch(launch, override):
+    """Launch parameters of a destination, overriding the common ones."""
+    return dict(launch, **dict((key, value) for key, value in override.items()
+                               if value is not None))
+
+
+def _get_entries(entries, index):
+    """Log entries of a batch with the item IDs of a destination."""
+    return [dict(entry, item_id=entry['item_id'][index])
+            if entry.get('item_id') else entry for entry in entries]
+
+
+class FanoutService:
+    """
+    Stand-in of ReportPortalService publishing the same launch to several
+    Reportportal destinations.
+
+    Every call is made to all the destinations concurrently, and the IDs of
+    the launch and of the items are lists of the IDs of every destination,
+    in the order of the services.
+    """
+
+    def __init__(self, services, launches=None, threads=8):
+        """
+        Args:
+            services (list): ReportPortalService of every destination.
+            launches (list): Dict of the launch name, attributes and
+                             description of every destination, overriding
+                             the ones given to start_launch when not None.
+            threads (int): Amount of threads making calls to the service.
+        """
+        self.services = services
+        self.launches = launches or [{} for _ in services]
+        # every call of every caller may wait for all the destinations
+        self.executor = ThreadPoolExecutor(
+            (max(threads, 1) + 1) * len(services))
+
+    @property
+    def launch_id(self):
+        launch_ids = self.launch_ids
+        return None if None in launch_ids else launch_ids
+
+    @launch_id.setter
+    def launch_id(self, launch_id):
+        for service, service_launch_id in zip(self.services,
+                                              launch_id or [None] * len(
+                                                  self.services)):
+            service.launch_id = service_launch_id
+
+    @property
+    def launch_ids(self):
+        """List of the launch ID of every destination, None if not started"""
+        return [service.launch_id for service in self.services]
+
+    def _call(self, call):
+        """Call a function with the index of every destination at once."""
+        futures = [self.executor.submit(call, index)
+                   for index in range(len(self.services))]
+        wait(futures)
+        return [future.result() for future in futures]
+
+    def start_launch(self, name, start_time, description=None,
+                     attributes=None, **kwargs):
+        """
+        Start the launch on every destination. When it can't be started on
+        all of them, the launches started are finished as FAILED.
+        """
+        launch = dict(name=name, description=description,
+                      attributes=attributes)
+
+        def start(index):
+            return self.services[index].start_launch(
+                start_time=start_time,
+                **_get_launch(launch, self.launches[index]), **kwargs)
+
+        try:
+            return self._call(start)
+        except Exception:
+            self.finish_launch(end_time=start_time, status='FAILED')
+            raise
+
+    def finish_launch(self, end_time, status=None, **kwargs):
+        """Finish the launch on the destinations it was started on."""
+        def finish(index):
+            if self.services[index].launch_id is not None:
+                self.services[index].finish_launch(end_time=end_time,
+                                                   status=status, **kwargs)
+
+        self._call(finish)
+
+    def start_test_item(self, name, start_time, item_type,
+                        parent_item_id=None, **kwargs):
+        """Start a test item on every destination and return its IDs."""
+        return self._call(lambda index: self.services[index].start_test_item(
+            name=name, start_time=start_time, item_type=item_type,
+            parent_item_id=parent_item_id[index] if parent_item_id else None,
+            **kwargs))
+
+    def finish_test_item(self, item_id, end_time, status, issue=None,
+                         **kwargs):
+        """Finish a test item on every destination."""
+        return self._call(lambda index: self.services[index].finish_test_item(
+            item_id[index], end_time=end_time, status=status, issue=issue,
+            **kwargs))
+
+    def log_batch(self, entries):
+        """Send a batch of log entries to every destination."""
+        self._call(lambda index: send_log_batch(
+            self.services[index], _get_entries(entries, index)))
+
+    def terminate(self):
+        for service in self.services:
+            service.terminate()
+        self.executor.shutdown()
+
+
+class AsyncFanoutService:
+    """
+    Stand-in of AsyncReportPortalService publishing the same launch to
+    several Reportportal destinations, see FanoutService.
+    """
+
+    def __init__(self, services, launches=None):
+        """
+        Args:
+            services (list): AsyncReportPortalService of every destination.
+            launches (list): Dict of the launch name, attributes and
+                             description of every destination, overriding
+                             the ones given to start_launch when not None.
+        """
+        self.services = services
+        self.launches = launches or [{} for _ in services]
+
+    launch_id = FanoutService.launch_id
+    launch_ids = FanoutService.launch_ids
+
+    async def _call(self, call):
+        """Await a coroutine for every destination at once."""
+        results = await asyncio.gather(
+            *(call(index) for index in range(len(self.services))),
+            return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return results
+
+    async def open(self):
+        for service in self.services:
+            await service.open()
+
+    async def close(self):
+        for service in self.services:
+            await service.close()
+
+    async def start_launch(self, name, start_time, description=None,
+                           attributes=None, mode=None):
+        """
+        Start the launch on every destination. When it can't be started on
+        all of them, the launches started are finished as FAILED.
+        """
+        launch = dict(name=name, description=description,
+                      attributes=attributes)
+        try:
+            return await self._call(
+                lambda index: self.services[index].start_launch(
+                    start_time=start_time, mode=mode,
+                    **_get_launch(launch, self.launches[index])))
+        except Exception:
+            await self.finish_launch(end_time=start_time, status='FAILED')
+            raise
+
+    async def finish_launch(self, end_time, status=None):
+        """Finish the launch on the destinations it was started on."""
+        async def finish(index):
+            if self.services[index].launch_id is not None:
+                await self.services[index].finish_launch(end_time=end_time,
+                                                         status=status)
+
+        await self._call(finish)
+
+    async def start_test_item(self, name, start_time, item_type,
+                              parent_item_id=None):
+        """Start a test item on every destination and return its IDs."""
+        return await self._call(
+            lambda index: self.services[index].start_test_item(
+                name, start_time, item_type,
+                parent_item_id[index] if parent_item_id else None))
+
+    async def finish_test_item(self, item_id, end_time, status, issue=None):
+        """Finish a test item on every destination."""
+        return await self._call(
+            lambda index: self.services[index].finish_test_item(
+                item_id[index], end_time, status, issue))
+
+    async def log_batch(self, entries):
+        """Send a batch of log entries to every destination."""
+        await self._call(lambda index: self.services[index].log_batch(
+            _get_entries(entries, index)))
@@ -0,0 +1,140 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, RedHat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+import datetime
+import enum
+import functools
+import time
+
+from dateutil import parser
+
+
+class Status(str, enum.Enum):
+    """
+    Status of a Reportportal item.
+
+    Members are strings as well, so they are sent and journaled as their
+    plain value and compare equal to it.
+    """
+
+    PASSED = 'PASSED'
+    FAILED = 'FAILED'
+    SKIPPED = 'SKIPPED'
+
+    def __str__(self):
+        return self.value
+
+
+class SuiteItem:
+    """
+    Normalized test suite, as published to Reportportal.
+
+    Times are integer timestamps in milliseconds.
+    """
+
+    __slots__ = ('name', 'start_time', 'end_time', 'status')
+
+    def __init__(self, name, start_time, end_time, status):
+        self.name = name
+        self.start_time = start_time
+        self.end_time = end_time
+        self.status = status
+
+
+class CaseItem:
+    """
+    Normalized test case, as published to Reportportal.
+
+    Times are integer timestamps in milliseconds and 'logs' is a list of
+    log entries (dicts of time, message, level and optional attachment).
+    """
+
+    __slots__ = ('name', 'item_type', 'start_time', 'end_time', 'status',
+                 'issue', 'logs')
+
+    def __init__(self, name, item_type, start_time, end_time, status,
+                 issue=None, logs=None):
+        self.name = name
+        self.item_type = item_type
+        self.start_time = start_time
+        self.end_time = end_time
+        self.status = status
+        self.issue = issue
+        self.logs = logs if logs is not None else []
+
+
+@functools.lru_cache(maxsize=4096)
+def _parse_time(str_time):
+    try:
+        # much faster than dateutil for the usual ISO 8601 timestamps
+        parsed = datetime.datetime.fromisoformat(str_time)
+    except ValueError:
+        parsed = parser.parse(str_time)
+    return int(parsed.timestamp() * 1000)
+
+
+def format_timestamp(timestamp):
+    """
+    Translate different formatted time objects into milliseconds timestamp.
+
+    Time objects can be strings with ISO formatted time or float/integer
+    timestamps in seconds or milliseconds. The suites and test cases of a
+    report usually share a handful of timestamps, so parsed strings are
+    memoized.
+
+    Args:
+        timestamp (str or int or float): Time object in one of the
+                                         supported formats.
+
+    Returns:
+        int or None: Timestamp in milliseconds.
+    """
+    if not timestamp:
+        return None
+    str_time = str(timestamp)
+    if str_time.isdigit():
+        if int(str_time) > 9999999999:
+            return int(str_time)
+        return int(str_time) * 1000
+    return _parse_time(str_time)
+
+
+def get_start_end_time(duration, timestamp):
+    """
+    Calculate test case or test suite start and end time.
+
+    There is mandatory 'time' and optional 'timestamp' attributes available
+    in XML report for each testing objects such as testsuite or test case.
+    Time represents the test duration and timestamp stands for the beginning
+    of the test execution. If there is no timestamp available, the end time
+    is the current time and the start time is calculated based on the test
+    duration.
+
+    Args:
+        duration (str): The 'time' attribute, duration in seconds.
+        timestamp (str): The 'timestamp' attribute.
+
+    Returns:
+        tuple: Start time and end time as milliseconds timestamps.
+    """
+    duration = int(float(duration) * 1000) if duration else 0
+    start_time = format_timestamp(timestamp)
+    if not start_time:
+        end_time = int(time.time() * 1000)
+        return end_time - duration, end_time
+    return start_time, start_time + duration
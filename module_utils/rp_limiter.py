@@ -0,0 +1,350 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, RedHat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+try:
+    from ansible.module_utils.rp_stats import get_endpoint
+except ImportError:
+    from .rp_stats import get_endpoint
+
+# Responses of a throttling or overloaded server, which cut the limit
+OVERLOAD_STATUSES = (429, 502, 503, 504)
+
+# Responses rejecting a request before it's processed, safe to retry
+# whatever the call. A gateway error (502, 504) only means the server
+# didn't answer in time, the item or log may have been created anyway, and
+# so may a plain 500.
+REJECTED_STATUSES = (429, 503)
+
+# Methods which can be sent twice with the same outcome, e.g. the PUT
+# finishing an item, retried after a gateway error as well
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'OPTIONS', 'PUT', 'DELETE')
+
+
+def is_retryable(method, status):
+    """
+    Tell whether a request answered with an overload status can be sent
+    again without duplicating what it created.
+
+    Args:
+        method (str): HTTP method of the request.
+        status (int): HTTP status of the response.
+
+    Returns:
+        bool: True for a rejected request, or for a gateway error of an
+              idempotent request.
+    """
+    return status in REJECTED_STATUSES or \
+        (status in OVERLOAD_STATUSES and method.upper() in IDEMPOTENT_METHODS)
+
+
+def get_retry_delay(attempt, retry_after=None, backoff=0.5, max_delay=30):
+    """
+    Get the time to wait before retrying a throttled request.
+
+    Args:
+        attempt (int): Number of the failed attempt, starting from 0.
+        retry_after (str): Value of the Retry-After header, if any.
+        backoff (float): Base delay in seconds.
+        max_delay (float): Maximum delay in seconds.
+
+    Returns:
+        float: Delay in seconds, the one requested by the server or an
+               exponential backoff with full jitter.
+    """
+    if retry_after:
+        try:
+            return min(float(retry_after), max_delay)
+        except ValueError:
+            # HTTP dates aren't worth parsing here
+            pass
+    return random.uniform(0, min(max_delay, backoff * 2 ** attempt))
+
+
+class LatencyBaseline:
+    """
+    Smoothed latency of the requests of an endpoint and its baseline.
+
+    The smoothed latency is a moving average over about the last
+    1 / 'smoothing' requests, so a single slow request hardly moves it.
+    The baseline is the lowest smoothed latency, slowly drifting up to
+    follow a server getting slower.
+    """
+
+    def __init__(self, smoothing=0.2, drift=0.01):
+        """
+        Args:
+            smoothing (float): Weight of a request in the smoothed latency.
+            drift (float): Weight of the smoothed latency in the baseline,
+                           when it's above it.
+        """
+        self.smoothing = smoothing
+        self.drift = drift
+        self.latency = None
+        self.baseline = None
+        self.count = 0
+
+    def add(self, latency):
+        """
+        Args:
+            latency (float): Latency of a request in seconds.
+        """
+        self.count += 1
+        if self.latency is None:
+            self.latency = self.baseline = latency
+            return
+        self.latency += (latency - self.latency) * self.smoothing
+        if self.latency < self.baseline:
+            self.baseline = self.latency
+        else:
+            self.baseline += (self.latency - self.baseline) * self.drift
+
+
+class AdaptiveLimit:
+    """
+    AIMD limit of the amount of requests in flight.
+
+    Every request completed in time grows the limit by one over the current
+    limit, i.e. by about one per round of requests, while a throttled or
+    failed request, or a sustained rise of the latency, cuts it by
+    'decrease'. The limit is cut at most once for the requests started
+    before the previous cut, so a burst of errors caused by a single
+    overload counts once.
+
+    The latency is compared per endpoint, since e.g. a log batch is slower
+    than starting an item whatever the load: an endpoint is overloaded once
+    its smoothed latency is above 'tolerance' times its baseline plus
+    'slack', see LatencyBaseline.
+
+    With equal bounds the limit is fixed.
+    """
+
+    # requests of an endpoint before its latency is trusted
+    WARMUP = 8
+
+    def __init__(self, min_limit, max_limit, tolerance=2.0, decrease=0.7,
+                 slack=0.005):
+        """
+        Args:
+            min_limit (int): Lower bound of the limit.
+            max_limit (int): Upper bound of the limit, the initial limit.
+            tolerance (float): Latency increase, relative to the baseline,
+                               taken as a sign of overload.
+            decrease (float): Factor applied to the limit on overload.
+            slack (float): Seconds of latency increase always tolerated,
+                           for the endpoints whose baseline is tiny.
+        """
+        self.min_limit = max(1, min(min_limit, max_limit))
+        self.max_limit = max(1, max_limit)
+        self.tolerance = tolerance
+        self.decrease = decrease
+        self.slack = slack
+        self.limit = float(self.max_limit)
+        self.lowest = self.limit
+        # endpoint: LatencyBaseline
+        self.latencies = {}
+        self.last_decrease = 0
+        self.inflight = 0
+        self.throttled = 0
+        self.retries = 0
+
+    def _can_start(self):
+        return self.inflight < int(self.limit)
+
+    def _is_slow(self, endpoint, latency):
+        """
+        Add the latency of a request, and tell whether the latency of its
+        endpoint rose well above its baseline.
+        """
+        baseline = self.latencies.get(endpoint)
+        if baseline is None:
+            baseline = self.latencies[endpoint] = LatencyBaseline()
+        baseline.add(latency)
+        return baseline.count > self.WARMUP and \
+            baseline.latency > baseline.baseline * self.tolerance + self.slack
+
+    def _update(self, start, throttled, endpoint=None):
+        """
+        Adjust the limit with the outcome of a request.
+
+        Args:
+            start (float): Monotonic time the request was started at.
+            throttled (bool): Whether the request was throttled or failed.
+            endpoint (str): Name of the API call, see get_endpoint.
+        """
+        latency = time.monotonic() - start
+        self.inflight -= 1
+        if throttled:
+            self.throttled += 1
+            overloaded = True
+        else:
+            overloaded = self._is_slow(endpoint, latency)
+        if overloaded:
+            if start > self.last_decrease:
+                self.limit = max(self.min_limit, self.limit * self.decrease)
+                self.lowest = min(self.lowest, self.limit)
+                self.last_decrease = time.monotonic()
+        else:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+    def get_stats(self):
+        """
+        Returns:
+            dict: The limit the requests settled on, the lowest one, the
+                  bounds and the amount of throttled and retried requests.
+        """
+        return dict(limit=int(self.limit), lowest=int(self.lowest),
+                    min=self.min_limit, max=self.max_limit,
+                    throttled=self.throttled, retries=self.retries)
+
+
+class AdaptiveLimiter(AdaptiveLimit):
+    """Thread safe AdaptiveLimit, blocking the threads over the limit."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.condition = threading.Condition()
+
+    def acquire(self):
+        """
+        Wait until a request can be sent.
+
+        Returns:
+            float: Start time of the request, to be given to release.
+        """
+        with self.condition:
+            self.condition.wait_for(self._can_start)
+            self.inflight += 1
+        return time.monotonic()
+
+    def release(self, start, throttled=False, endpoint=None):
+        """
+        Record the outcome of a request.
+
+        Args:
+            start (float): Value returned by acquire.
+            throttled (bool): Whether the request was throttled or failed.
+            endpoint (str): Name of the API call, see get_endpoint.
+        """
+        with self.condition:
+            self._update(start, throttled, endpoint)
+            self.condition.notify_all()
+
+
+class AsyncAdaptiveLimiter(AdaptiveLimit):
+    """AdaptiveLimit for the coroutines of a single event loop."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.condition = None
+
+    async def acquire(self):
+        """
+        Wait until a request can be sent.
+
+        Returns:
+            float: Start time of the request, to be given to release.
+        """
+        if self.condition is None:
+            # bound to the running loop
+            self.condition = asyncio.Condition()
+        async with self.condition:
+            await self.condition.wait_for(self._can_start)
+            self.inflight += 1
+        return time.monotonic()
+
+    async def release(self, start, throttled=False, endpoint=None):
+        """
+        Record the outcome of a request.
+
+        Args:
+            start (float): Value returned by acquire.
+            throttled (bool): Whether the request was throttled or failed.
+            endpoint (str): Name of the API call, see get_endpoint.
+        """
+        async with self.condition:
+            self._update(start, throttled, endpoint)
+            self.condition.notify_all()
+
+
+def _rewind(files):
+    """Rewind the file objects of a multipart request before a retry."""
+    for _, value in files or ():
+        if isinstance(value, tuple) and hasattr(value[1], 'seek'):
+            value[1].seek(0)
+
+
+class ThrottledSession(requests.Session):
+    """
+    Requests session sending through an AdaptiveLimiter, retrying the
+    requests rejected by an overloaded server with a backoff.
+    """
+
+    def __init__(self, limiter, retries=3, backoff=0.5, pool_size=10,
+                 stats=None):
+        """
+        Args:
+            limiter (AdaptiveLimiter): Limiter of the requests in flight.
+            retries (int): Maximum amount of retries of a request.
+            backoff (float): Base delay of the retries in seconds.
+            pool_size (int): Amount of kept connections per host.
+            stats (PublishStats): Where every request is recorded, if any.
+        """
+        super().__init__()
+        self.limiter = limiter
+        self.stats = stats
+        self.retries = retries
+        self.backoff = backoff
+        adapter = HTTPAdapter(pool_maxsize=pool_size)
+        self.mount('https://', adapter)
+        self.mount('http://', adapter)
+
+    def request(self, method, url, **kwargs):
+        attempt = 0
+        while True:
+            start = self.limiter.acquire()
+            throttled = True
+            response = None
+            try:
+                response = super().request(method, url, **kwargs)
+                throttled = response.status_code in OVERLOAD_STATUSES
+            finally:
+                self.limiter.release(start, throttled,
+                                     get_endpoint(method, url))
+                if self.stats is not None:
+                    self.stats.record(
+                        method, url, time.monotonic() - start,
+                        len(response.request.body or b'') if response else 0,
+                        response is None or response.status_code >= 400)
+            if not is_retryable(method, response.status_code) or \
+                    attempt >= self.retries:
+                return response
+            time.sleep(get_retry_delay(attempt,
+                                       response.headers.get('Retry-After'),
+                                       self.backoff))
+            attempt += 1
+            with self.limiter.condition:
+                self.limiter.retries += 1
+            _rewind(kwargs.get('files'))
@@ -0,0 +1,328 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, RedHat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+import contextlib
+import json
+import os
+import shutil
+import tempfile
+import threading
+import uuid
+
+try:
+    from ansible.module_utils.exceptions import ConnectionError
+except ImportError:
+    from .exceptions import ConnectionError
+
+from reportportal_client.service import uri_join
+
+
+def get_log_size(entry):
+    """
+    Estimate the amount of bytes a log entry adds to a batch request.
+
+    Args:
+        entry (dict): Log entry with 'message' and optional 'attachment'.
+
+    Returns:
+        int: Approximate size of the entry in bytes.
+    """
+    spilled = entry.get('spilled')
+    size = spilled['size'] if spilled else len(entry.get('message') or '')
+    attachment = entry.get('attachment')
+    if attachment:
+        size += attachment['size'] if 'size' in attachment \
+            else len(attachment['data'])
+    return size
+
+
+def get_log_message(entry):
+    """
+    Get the message of a log entry, reading it back if it was spilled to
+    disk, see LogSpool.spill.
+
+    Args:
+        entry (dict): Log entry with either 'message' or 'spilled'.
+
+    Returns:
+        str: The message.
+    """
+    spilled = entry.get('spilled')
+    if not spilled:
+        return entry['message']
+    with open(spilled['path'], encoding='utf-8') as spill_file:
+        return spill_file.read()
+
+
+def get_excerpt(message, max_size):
+    """
+    Cut a message to its beginning and its end.
+
+    Args:
+        message (str): The message to cut.
+        max_size (int): Maximum amount of characters kept from the message.
+
+    Returns:
+        str: The message itself if it's short enough, otherwise its head and
+             tail separated by a note telling how much was cut.
+    """
+    if len(message) <= max_size:
+        return message
+    head = max_size // 2
+    tail = max_size - head
+    return (f'{message[:head]}\n\n[... {len(message) - max_size} '
+            f'characters cut, see the attachment ...]\n\n'
+            f'{message[-tail:]}')
+
+
+def get_unique_name(name, names):
+    """
+    Get a file name which isn't used yet, numbering the repeated names.
+
+    Args:
+        name (str): File name, e.g. Entire_log.txt.
+        names (set): File names already used, the returned one is added.
+
+    Returns:
+        str: The name, or e.g. Entire_log-2.txt when it's already used.
+    """
+    stem, extension = os.path.splitext(name)
+    unique_name = name
+    number = 1
+    while unique_name in names:
+        number += 1
+        unique_name = f'{stem}-{number}{extension}'
+    names.add(unique_name)
+    return unique_name
+
+
+def get_log_batch_parts(launch_id, entries):
+    """
+    Split a batch of log entries into the parts of a multipart log request.
+
+    Reportportal accepts several log entries in a single request, as a JSON
+    list in the 'json_request_part' part, followed by a 'file' part for
+    every attachment, matched to the entries by file name. The repeated
+    names of a batch, e.g. the Entire_log.txt of several test cases, are
+    numbered so every attachment goes to its own entry.
+
+    Args:
+        launch_id (str): UUID of the launch the logs belong to.
+        entries (list): Log entries, dicts of time, message (or the spilled
+                        message), level, item_id and optional attachment
+                        (dict of name, mime and either data or the path of
+                        a spooled file).
+
+    Returns:
+        tuple: The JSON request part and the list of the attachments, see
+               open_attachments.
+    """
+    request_part = []
+    attachments = []
+    names = set()
+    for entry in entries:
+        data = {
+            "launchUuid": launch_id,
+            "time": entry['time'],
+            "message": get_log_message(entry),
+            "level": entry.get('level'),
+        }
+        if entry.get('item_id'):
+            data["itemUuid"] = entry['item_id']
+        attachment = entry.get('attachment')
+        if attachment:
+            name = get_unique_name(
+                attachment.get('name', str(uuid.uuid4())), names)
+            data["file"] = {"name": name}
+            attachments.append(dict(attachment, name=name))
+        request_part.append(data)
+    return json.dumps(request_part), attachments
+
+
+@contextlib.contextmanager
+def open_attachments(attachments):
+    """
+    Open the spooled files of attachments for the time of a request.
+
+    Args:
+        attachments (list): Attachments, as returned by get_log_batch_parts.
+
+    Yields:
+        list: (name, data, mime) tuples, data being a file object, read
+              while the request is sent, for spooled attachments.
+    """
+    with contextlib.ExitStack() as stack:
+        yield [(attachment['name'],
+                stack.enter_context(open(attachment['path'], 'rb'))
+                if 'path' in attachment else attachment['data'],
+                attachment.get('mime', 'application/octet-stream'))
+               for attachment in attachments]
+
+
+def send_log_batch(service, entries):
+    """
+    Send a batch of log entries in a single multipart request.
+
+    Args:
+        service (ReportPortalService): Service of the launch, whose session
+                                       sends the request.
+        entries (list): Log entries, see get_log_batch_parts.
+
+    Raises:
+        ConnectionError: The request was rejected.
+    """
+    request_part, attachments = get_log_batch_parts(service.launch_id,
+                                                    entries)
+    with open_attachments(attachments) as attachment_files:
+        files = [("json_request_part",
+                  (None, request_part, "application/json"))]
+        files.extend(("file", attachment)
+                     for attachment in attachment_files)
+        response = service.session.post(
+            uri_join(service.base_url_v2, "log"),
+            files=files,
+            verify=service.verify_ssl,
+            timeout=service.http_timeout)
+    if not response.ok:
+        raise ConnectionError(response)
+
+
+class LogSpool:
+    """
+    Temporary directory holding the log bodies sent as attachments.
+
+    Large texts are written to a file once and read back only while the
+    request is sent, instead of being carried in memory (and pickled
+    between the parser processes) with the log entries.
+    """
+
+    def __init__(self, chunk_size=1024 * 1024):
+        """
+        Args:
+            chunk_size (int): Amount of characters encoded and written at
+                              once.
+        """
+        self.path = tempfile.mkdtemp(prefix='reportportal-logs-')
+        self.chunk_size = chunk_size
+
+    def write(self, text):
+        """
+        Write a text to a spooled file.
+
+        Args:
+            text (str): The text.
+
+        Returns:
+            tuple: Path and size in bytes of the file.
+        """
+        fd, path = tempfile.mkstemp(dir=self.path, suffix='.txt')
+        with os.fdopen(fd, 'w', encoding='utf-8') as spool_file:
+            for start in range(0, len(text), self.chunk_size):
+                spool_file.write(text[start:start + self.chunk_size])
+        return path, os.path.getsize(path)
+
+    def spill(self, text):
+        """
+        Spill a log message to disk, to be read back only while its batch
+        is sent.
+
+        Args:
+            text (str): The message.
+
+        Returns:
+            dict: The spilled message (path and size) of a log entry, whose
+                  message is None.
+        """
+        path, size = self.write(text)
+        return dict(path=path, size=size)
+
+    def add(self, name, text, mime='text/plain'):
+        """
+        Spool a text to be sent as an attachment.
+
+        Args:
+            name (str): File name of the attachment.
+            text (str): Content of the attachment.
+            mime (str): MIME type of the attachment.
+
+        Returns:
+            dict: The attachment (name, path, size and mime) of a log entry.
+        """
+        path, size = self.write(text)
+        return dict(name=name, path=path, size=size, mime=mime)
+
+    def remove(self):
+        """Delete the spooled files."""
+        shutil.rmtree(self.path, ignore_errors=True)
+
+
+class LogBatcher:
+    """
+    Thread safe buffer of log entries, sent to Reportportal in batches.
+
+    Entries of all test cases are accumulated and handed back to the caller
+    once the batch reaches either the maximum amount of entries or the
+    maximum payload size.
+    """
+
+    def __init__(self, max_count=20, max_size=10 * 1024 * 1024):
+        """
+        Args:
+            max_count (int): Maximum amount of entries in a batch.
+            max_size (int): Maximum payload size of a batch in bytes.
+        """
+        self.max_count = max(max_count, 1)
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        self._reset()
+
+    def _reset(self):
+        batch = getattr(self, 'entries', [])
+        self.entries = []
+        self.size = 0
+        return batch
+
+    def add(self, entry):
+        """
+        Add a log entry to the current batch.
+
+        Args:
+            entry (dict): Log entry to add.
+
+        Returns:
+            list: Batches which are ready to be sent, possibly empty.
+        """
+        batches = []
+        with self.lock:
+            self.entries.append(entry)
+            self.size += get_log_size(entry)
+            if len(self.entries) >= self.max_count or \
+                    self.size >= self.max_size:
+                batches.append(self._reset())
+        return batches
+
+    def flush(self):
+        """
+        Take all the buffered entries.
+
+        Returns:
+            list: Batches which are ready to be sent, possibly empty.
+        """
+        with self.lock:
+            batch = self._reset()
+        return [batch] if batch else []
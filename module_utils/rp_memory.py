@@ -0,0 +1,188 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, RedHat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+import asyncio
+import resource
+import threading
+
+# Log messages larger than this fraction of the memory budget are spilled
+# to disk
+SPILL_FRACTION = 16
+
+# Estimated bytes of a test case item besides its logs
+_ITEM_OVERHEAD = 1024
+
+
+def get_item_size(case_item):
+    """
+    Estimate the memory held by a test case item until it's published.
+
+    Spilled messages and spooled attachments are on disk, only their path
+    is counted as part of the overhead.
+
+    Args:
+        case_item (CaseItem): The test case item.
+
+    Returns:
+        int: Approximate size of the item in bytes.
+    """
+    size = _ITEM_OVERHEAD + len(case_item.name)
+    for log in case_item.logs:
+        size += len(log.get('message') or '')
+        attachment = log.get('attachment')
+        if attachment and 'path' not in attachment:
+            size += len(attachment['data'])
+    return size
+
+
+def get_peak_rss():
+    """
+    Returns:
+        int: Peak resident set size in bytes of the process, added to the
+             largest one of its terminated children, e.g. the parsers.
+    """
+    # ru_maxrss is in kilobytes on Linux
+    return (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss +
+            resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss) * 1024
+
+
+class MemoryBudget:
+    """
+    Bytes of the parsed items held in memory until they are published.
+
+    The producer reserves the size of every item before handing it over to
+    the workers, and the item releases it once published, so the parsing
+    waits while the items in flight fill the budget. A single item larger
+    than the budget is let through alone rather than blocking forever.
+    """
+
+    def __init__(self, limit):
+        """
+        Args:
+            limit (int): The budget in bytes.
+        """
+        self.limit = max(limit, 1)
+        self.spill_size = self.limit // SPILL_FRACTION
+        self.used = 0
+        self.peak = 0
+        self.waits = 0
+        self.spilled = 0
+        self.spilled_bytes = 0
+
+    def _can_reserve(self, size):
+        return self.used == 0 or self.used + size <= self.limit
+
+    def _reserve(self, size):
+        self.used += size
+        self.peak = max(self.peak, self.used)
+
+    def should_spill(self, size):
+        """
+        Args:
+            size (int): Length of a text.
+
+        Returns:
+            bool: Whether the text is to be written to disk instead of being
+                  held in memory.
+        """
+        return size > self.spill_size
+
+    def add_spilled(self, size):
+        """
+        Count a spilled text.
+
+        Args:
+            size (int): Size of the spilled text in bytes.
+        """
+        self.spilled += 1
+        self.spilled_bytes += size
+
+    def get_stats(self):
+        """
+        Returns:
+            dict: The budget, the peak of the bytes reserved, the amount of
+                  times the producer waited for the budget, the amount and
+                  size of the spilled texts and the peak RSS.
+        """
+        return dict(budget=self.limit, peak=self.peak, waits=self.waits,
+                    spilled=self.spilled, spilled_bytes=self.spilled_bytes,
+                    peak_rss=get_peak_rss())
+
+
+class ThreadMemoryBudget(MemoryBudget):
+    """Thread safe MemoryBudget, blocking the producer over the budget."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.condition = threading.Condition()
+
+    def reserve(self, size):
+        """
+        Wait until an item fits in the budget.
+
+        Args:
+            size (int): Size of the item, to be given to release.
+        """
+        with self.condition:
+            if not self._can_reserve(size):
+                self.waits += 1
+                self.condition.wait_for(lambda: self._can_reserve(size))
+            self._reserve(size)
+
+    def release(self, size):
+        """
+        Args:
+            size (int): Value given to reserve.
+        """
+        with self.condition:
+            self.used -= size
+            self.condition.notify_all()
+
+
+class AsyncMemoryBudget(MemoryBudget):
+    """MemoryBudget for the coroutines of a single event loop."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.condition = None
+
+    async def reserve(self, size):
+        """
+        Wait until an item fits in the budget.
+
+        Args:
+            size (int): Size of the item, to be given to release.
+        """
+        if self.condition is None:
+            # bound to the running loop
+            self.condition = asyncio.Condition()
+        async with self.condition:
+            if not self._can_reserve(size):
+                self.waits += 1
+                await self.condition.wait_for(
+                    lambda: self._can_reserve(size))
+            self._reserve(size)
+
+    async def release(self, size):
+        """
+        Args:
+            size (int): Value given to reserve.
+        """
+        async with self.condition:
+            self.used -= size
+            self.condition.notify_all()
@@ -0,0 +1,92 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, RedHat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+try:
+    from ansible.module_utils.rp_logs import get_log_size
+except ImportError:
+    from .rp_logs import get_log_size
+
+
+class CostModel:
+    """
+    Linear estimate of the cost in seconds of the items of an import.
+
+    A XUnit file costs the time to parse it, proportional to its size. A
+    test suite costs the time to publish it, from the start of the suite
+    to its end, proportional to its amount of test cases and to the size
+    of their logs. The actual costs are reported in the 'costs' of the
+    stats, their ratio to the predicted ones is the factor to scale the
+    rates with.
+    """
+
+    def __init__(self, parse_rate=40e6, case_time=0.002, log_rate=10e6,
+                 suite_time=0.01):
+        """
+        Args:
+            parse_rate (float): Bytes of XUnit parsed per second.
+            case_time (float): Seconds to publish a test case.
+            log_rate (float): Bytes of log messages and attachments sent
+                              per second.
+            suite_time (float): Seconds to start and finish a suite.
+        """
+        self.parse_rate = parse_rate
+        self.case_time = case_time
+        self.log_rate = log_rate
+        self.suite_time = suite_time
+
+    def file_cost(self, size):
+        """
+        Args:
+            size (int): Size of the XUnit file in bytes.
+
+        Returns:
+            float: Estimated parsing time in seconds.
+        """
+        return size / self.parse_rate
+
+    def suite_cost(self, case_items):
+        """
+        Args:
+            case_items (list): (index, CaseItem) tuples of the suite.
+
+        Returns:
+            float: Estimated publishing time in seconds.
+        """
+        log_size = sum(get_log_size(log) for _, case_item in case_items
+                       for log in case_item.logs)
+        return self.suite_time + len(case_items) * self.case_time + \
+            log_size / self.log_rate
+
+
+def largest_first(items, cost):
+    """
+    Order items for a longest processing time first (LPT) schedule.
+
+    Handing the costliest items first to whichever worker is free keeps a
+    large item from being left alone at the end, while all the other
+    workers are idle.
+
+    Args:
+        items (iterable): Items to schedule.
+        cost (callable): Function returning the estimated cost of an item.
+
+    Returns:
+        list: The items by decreasing cost, in their original order for
+              equal costs.
+    """
+    return sorted(items, key=cost, reverse=True)
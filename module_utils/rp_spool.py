@@ -0,0 +1,364 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, RedHat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+import gzip
+import json
+import os
+import shutil
+import threading
+import uuid
+from concurrent.futures import Future, ThreadPoolExecutor
+
+try:
+    from ansible.module_utils.exceptions import SpoolError
+    from ansible.module_utils.rp_logs import get_log_message, send_log_batch
+except ImportError:
+    from .exceptions import SpoolError
+    from .rp_logs import get_log_message, send_log_batch
+
+# Version of the spool format, bumped on incompatible changes
+SPOOL_VERSION = 1
+
+
+class SpoolService:
+    """
+    Stand-in of ReportPortalService recording the launch to a spool file.
+
+    The API calls are appended to a gzip compressed stream, one JSON record
+    per line, in the order they are made. IDs are generated locally and
+    mapped to the ones of the server when the spool is replayed. The
+    content of an attachment follows the record of its log batch as raw
+    bytes, so it's never held in memory.
+
+    A spool opened again for appending gets a new gzip member, which is
+    read as the continuation of the previous ones.
+    """
+
+    def __init__(self, path, append=False, compresslevel=6):
+        """
+        Args:
+            path (str): Path of the spool file.
+            append (bool): Whether to continue an existing spool, e.g. of
+                           a resumed import.
+            compresslevel (int): gzip compression level, from 1 to 9.
+        """
+        self.path = path
+        append = append and os.path.exists(path) and \
+            os.path.getsize(path) > 0
+        self.file = gzip.open(path, 'ab' if append else 'wb', compresslevel)
+        self.lock = threading.Lock()
+        self.launch_id = None
+        if not append:
+            self._write(dict(op='spool', version=SPOOL_VERSION))
+
+    def _write(self, record, attachments=()):
+        line = json.dumps(record, separators=(',', ':')).encode() + b'\n'
+        with self.lock:
+            self.file.write(line)
+            for attachment in attachments:
+                if 'path' in attachment:
+                    with open(attachment['path'], 'rb') as attachment_file:
+                        shutil.copyfileobj(attachment_file, self.file)
+                else:
+                    self.file.write(attachment['data'])
+
+    def start_launch(self, name, start_time, description=None,
+                     attributes=None, mode=None, **kwargs):
+        """Record the start of the launch and return its local ID."""
+        self.launch_id = str(uuid.uuid4())
+        self._write(dict(op='start_launch', id=self.launch_id, name=name,
+                         start_time=start_time, description=description,
+                         attributes=attributes, mode=mode))
+        return self.launch_id
+
+    def finish_launch(self, end_time, status=None, **kwargs):
+        """Record the end of the launch."""
+        self._write(dict(op='finish_launch', end_time=end_time,
+                         status=status))
+
+    def start_test_item(self, name, start_time, item_type,
+                        parent_item_id=None, **kwargs):
+        """Record the start of a test item and return its local ID."""
+        item_id = str(uuid.uuid4())
+        self._write(dict(op='start_item', id=item_id, parent=parent_item_id,
+                         name=name, start_time=start_time, type=item_type))
+        return item_id
+
+    def finish_test_item(self, item_id, end_time, status, issue=None,
+                         **kwargs):
+        """Record the end of a test item."""
+        self._write(dict(op='finish_item', id=item_id, end_time=end_time,
+                         status=status, issue=issue))
+
+    def log_batch(self, entries):
+        """Record a batch of log entries with their attachments."""
+        records = []
+        attachments = []
+        for entry in entries:
+            record = dict(time=entry['time'],
+                          message=get_log_message(entry),
+                          level=entry.get('level'),
+                          item_id=entry.get('item_id'))
+            attachment = entry.get('attachment')
+            if attachment:
+                if 'path' not in attachment and \
+                        isinstance(attachment['data'], str):
+                    attachment = dict(attachment,
+                                      data=attachment['data'].encode())
+                size = os.path.getsize(attachment['path']) \
+                    if 'path' in attachment else len(attachment['data'])
+                record['attachment'] = dict(
+                    name=attachment.get('name', str(uuid.uuid4())),
+                    mime=attachment.get('mime', 'application/octet-stream'),
+                    size=size)
+                attachments.append(attachment)
+            records.append(record)
+        self._write(dict(op='log', entries=records), attachments)
+
+    def terminate(self):
+        """Close the spool file."""
+        with self.lock:
+            self.file.close()
+
+
+def read_spool(path):
+    """
+    Read the records of a spool file.
+
+    Args:
+        path (str): Path of the spool file.
+
+    Yields:
+        dict: Records in the order they were written, the attachments of
+              the log entries holding their content as 'data'.
+
+    Raises:
+        SpoolError: The file isn't a spool of a supported version.
+    """
+    with gzip.open(path, 'rb') as spool_file:
+        try:
+            header = json.loads(spool_file.readline() or b'null')
+        except (OSError, ValueError):
+            header = None
+        if not isinstance(header, dict) or header.get('op') != 'spool':
+            raise SpoolError(f'{path} is not a spool file')
+        if header.get('version') != SPOOL_VERSION:
+            raise SpoolError(f'Unsupported spool version '
+                             f'{header.get("version")} of {path}')
+        while True:
+            line = spool_file.readline()
+            if not line:
+                return
+            record = json.loads(line)
+            if record['op'] == 'log':
+                for entry in record['entries']:
+                    attachment = entry.get('attachment')
+                    if attachment:
+                        attachment['data'] = spool_file.read(
+                            attachment.pop('size'))
+            yield record
+
+
+class SpoolReplayer:
+    """
+    Publish a spooled launch to Reportportal.
+
+    The recorded calls are sent by a pool of threads, each one as soon as
+    the calls it depends on are done: the start of its parent item, the
+    start of the items its log entries belong to and, to finish an item,
+    the end of all its children. A call is handed to the threads only
+    then, by the callback of the last of these calls, so the threads never
+    wait for one another. The amount of calls read ahead of the ones sent
+    is bounded, so the memory use doesn't depend on the size of the spool.
+    """
+
+    def __init__(self, service, threads=8, read_ahead=None):
+        """
+        Args:
+            service (ReportPortalService): Service of the Reportportal
+                                           server the launch is sent to.
+            threads (int): Amount of calls sent at once.
+            read_ahead (int): Maximum amount of calls read but not done,
+                              4 times the threads by default.
+        """
+        self.service = service
+        self.threads = max(threads, 1)
+        self.read_ahead = read_ahead or self.threads * 4
+        self.window = threading.Semaphore(self.read_ahead)
+        self.ids = {}
+        self.parents = {}
+        self.children = {}
+        self.error = None
+        self.finished = False
+        self.counts = dict(items=0, logs=0)
+
+    def _run(self, future, call, depends):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            # all done, the results are there
+            result = call(*[depend.result() for depend in depends])
+        except BaseException as ex:
+            if self.error is None:
+                self.error = ex
+            future.set_exception(ex)
+        else:
+            future.set_result(result)
+
+    def _submit(self, executor, call, *depends):
+        """
+        Send a call once the calls it depends on are done, with their
+        results as arguments.
+
+        Returns:
+            Future: The result of the call.
+        """
+        self.window.acquire()
+        if self.error is not None:
+            self.window.release()
+            raise self.error
+        future = Future()
+        future.add_done_callback(lambda _: self.window.release())
+        pending = [len(depends)]
+        lock = threading.Lock()
+
+        def start(_=None):
+            with lock:
+                pending[0] -= 1
+                if pending[0] > 0:
+                    return
+            try:
+                executor.submit(self._run, future, call, depends)
+            except RuntimeError as ex:
+                # the replay was aborted, the executor is shut down
+                future.set_exception(ex)
+
+        pending[0] += 1
+        for depend in depends:
+            depend.add_done_callback(start)
+        start()
+        return future
+
+    def _wait(self):
+        # all calls are done once the whole window is free again
+        for _ in range(self.read_ahead):
+            self.window.acquire()
+        for _ in range(self.read_ahead):
+            self.window.release()
+        if self.error is not None:
+            raise self.error
+
+    def start_item(self, executor, record):
+        parent = self.ids.get(record['parent']) if record['parent'] \
+            else None
+
+        def start(parent_id=None):
+            item_id = self.service.start_test_item(
+                name=record['name'],
+                start_time=record['start_time'],
+                item_type=record['type'],
+                parent_item_id=parent_id)
+            if item_id is None:
+                raise SpoolError(f"No ID returned for item {record['name']}")
+            return item_id
+
+        self.ids[record['id']] = self._submit(
+            executor, start, *([parent] if parent else []))
+        self.parents[record['id']] = record['parent']
+        self.counts['items'] += 1
+
+    def finish_item(self, executor, record):
+        def finish(item_id, *children):
+            self.service.finish_test_item(item_id,
+                                          end_time=record['end_time'],
+                                          status=record['status'],
+                                          issue=record['issue'])
+
+        children = self.children.pop(record['id'], [])
+        future = self._submit(executor, finish, self.ids[record['id']],
+                              *children)
+        parent = self.parents.pop(record['id'])
+        if parent:
+            self.children.setdefault(parent, []).append(future)
+
+    def send_logs(self, executor, record):
+        entries = record['entries']
+        item_ids = list(dict.fromkeys(entry['item_id'] for entry in entries
+                                      if entry['item_id']))
+
+        def send(*server_ids):
+            server_id = dict(zip(item_ids, server_ids))
+            send_log_batch(self.service, [
+                dict(entry, item_id=server_id.get(entry['item_id']))
+                for entry in entries])
+
+        self._submit(executor, send,
+                     *[self.ids[item_id] for item_id in item_ids])
+        self.counts['logs'] += len(entries)
+
+    def replay(self, path):
+        """
+        Publish the launch of a spool file.
+
+        Args:
+            path (str): Path of the spool file.
+
+        Returns:
+            dict: Amount of items and log entries published.
+
+        Raises:
+            SpoolError: The spool is invalid or its launch was never
+                        finished.
+        """
+        with ThreadPoolExecutor(self.threads) as executor:
+            try:
+                for record in read_spool(path):
+                    op = record['op']
+                    if op == 'start_launch':
+                        self.service.start_launch(
+                            name=record['name'],
+                            start_time=record['start_time'],
+                            description=record['description'],
+                            attributes=record['attributes'],
+                            mode=record['mode'])
+                        if self.service.launch_id is None:
+                            raise SpoolError("No launch ID available.")
+                    elif self.service.launch_id is None:
+                        raise SpoolError(f'{path} has no launch start')
+                    elif op == 'start_item':
+                        self.start_item(executor, record)
+                    elif op == 'finish_item':
+                        self.finish_item(executor, record)
+                    elif op == 'log':
+                        self.send_logs(executor, record)
+                    elif op == 'finish_launch':
+                        self._wait()
+                        self.service.finish_launch(
+                            end_time=record['end_time'],
+                            status=record['status'])
+                        self.finished = True
+                    else:
+                        raise SpoolError(f'Unknown spool operation {op}')
+            except BaseException:
+                # drop the calls not sent yet, the ones in flight go on
+                self.error = self.error or SpoolError('Replay aborted')
+                executor.shutdown(cancel_futures=True)
+                raise
+        if not self.finished:
+            raise SpoolError(f'The launch of {path} was never finished')
+        return dict(self.counts)
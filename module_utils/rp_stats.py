@@ -0,0 +1,292 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, RedHat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+import contextlib
+import json
+import math
+import os
+import threading
+import time
+from urllib.parse import urlparse
+
+# Names of the Reportportal API calls, by method and resource
+ENDPOINTS = {
+    ('POST', 'launch'): 'start_launch',
+    ('PUT', 'launch'): 'finish_launch',
+    ('POST', 'item'): 'start_test_item',
+    ('PUT', 'item'): 'finish_test_item',
+    ('POST', 'log'): 'log',
+}
+
+# Amount of the costliest items listed for each kind of cost
+_LARGEST_COSTS = 5
+
+# Ratio between the bounds of consecutive histogram buckets, the
+# percentiles are accurate within 5%
+_BUCKET_RATIO = 1.1
+
+
+def get_endpoint(method, url):
+    """
+    Get the name of the Reportportal API call of a request.
+
+    Args:
+        method (str): HTTP method of the request.
+        url (str): URL of the request, below the project base URL.
+
+    Returns:
+        str: Name of the call, e.g. 'start_test_item'.
+    """
+    # .../api/<version>/<project>/<resource>/...
+    parts = urlparse(url).path.strip('/').split('/')
+    index = parts.index('api') + 3 if 'api' in parts else len(parts) - 1
+    resource = parts[min(index, len(parts) - 1)]
+    return ENDPOINTS.get((method.upper(), resource),
+                         f'{method.upper()} {resource}')
+
+
+class LatencyHistogram:
+    """
+    Latencies of the requests of an endpoint, in logarithmic buckets.
+
+    Only the bucket counts are kept, so the memory usage doesn't depend on
+    the amount of requests.
+    """
+
+    def __init__(self):
+        self.buckets = {}
+        self.count = 0
+        self.errors = 0
+        self.bytes = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def add(self, latency, size=0, error=False):
+        """
+        Args:
+            latency (float): Latency of the request in seconds.
+            size (int): Bytes sent.
+            error (bool): Whether the request failed.
+        """
+        milliseconds = max(latency * 1000, 0.001)
+        bucket = math.ceil(math.log(milliseconds, _BUCKET_RATIO))
+        self.buckets[bucket] = self.buckets.get(bucket, 0) + 1
+        self.count += 1
+        self.errors += int(error)
+        self.bytes += size
+        self.total += latency
+        self.max = max(self.max, latency)
+
+    def percentile(self, percent):
+        """
+        Args:
+            percent (float): The percentile, between 0 and 100.
+
+        Returns:
+            float: Upper bound in milliseconds of the bucket holding the
+                   percentile.
+        """
+        rank = math.ceil(self.count * percent / 100)
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return min(_BUCKET_RATIO ** bucket, self.max * 1000)
+        return self.max * 1000
+
+    def as_dict(self):
+        return dict(count=self.count, errors=self.errors, bytes=self.bytes,
+                    mean=round(self.total * 1000 / max(self.count, 1), 3),
+                    p50=round(self.percentile(50), 3),
+                    p95=round(self.percentile(95), 3),
+                    p99=round(self.percentile(99), 3),
+                    max=round(self.max * 1000, 3))
+
+
+class PublishStats:
+    """
+    Thread safe instrumentation of an import.
+
+    Records the wall time of the phases of the import, either as spans
+    (see phase) or as time accumulated over many short calls (see
+    iterate), a latency histogram of every Reportportal API call, and the
+    predicted and actual cost of the scheduled files and suites (see
+    predict). Latencies are in milliseconds, phase times and costs in
+    seconds.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.origin = time.perf_counter()
+        self.phases = {}
+        self.spans = []
+        self.endpoints = {}
+        self.costs = {}
+
+    def add_time(self, name, duration, start=None):
+        """
+        Args:
+            name (str): Name of the phase.
+            duration (float): Time spent in the phase in seconds.
+            start (float): perf_counter value the phase started at, to be
+                           traced as a span.
+        """
+        with self.lock:
+            phase = self.phases.setdefault(name, dict(time=0.0, count=0))
+            phase['time'] += duration
+            phase['count'] += 1
+            if start is not None:
+                self.spans.append((name, start - self.origin, duration,
+                                   threading.get_ident()))
+
+    @contextlib.contextmanager
+    def phase(self, name):
+        """Context manager timing a phase."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - start, start)
+
+    def iterate(self, name, iterable, cost=None):
+        """
+        Iterate while accumulating the time spent producing the items to a
+        phase, e.g. parsing a file read lazily, and to the actual cost of
+        an item when 'cost' is a (kind, name) tuple.
+        """
+        iterator = iter(iterable)
+        duration = 0.0
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+                finally:
+                    duration += time.perf_counter() - start
+                yield item
+        finally:
+            self.add_time(name, duration)
+            if cost is not None:
+                self.add_cost(*cost, duration)
+
+    def predict(self, kind, name, cost):
+        """
+        Record the estimated cost of a scheduled item.
+
+        Args:
+            kind (str): Kind of item, e.g. 'file' or 'suite'.
+            name (str): Name of the item.
+            cost (float): Estimated cost in seconds.
+        """
+        with self.lock:
+            costs = self.costs.setdefault(kind, {})
+            costs[name] = [cost, costs.get(name, [0.0, 0.0])[1]]
+
+    def add_cost(self, kind, name, duration):
+        """
+        Add time actually spent on a scheduled item.
+
+        Args:
+            kind (str): Kind of item, e.g. 'file' or 'suite'.
+            name (str): Name of the item, as given to predict.
+            duration (float): Time spent in seconds.
+        """
+        with self.lock:
+            cost = self.costs.get(kind, {}).get(name)
+            if cost is not None:
+                cost[1] += duration
+
+    def get_costs(self, kind):
+        """
+        Args:
+            kind (str): Kind of item, e.g. 'file' or 'suite'.
+
+        Returns:
+            dict: Amount of items, total predicted and actual costs, their
+                  ratio (to scale the estimates with), the mean relative
+                  error of the estimates and the costliest items.
+        """
+        costs = self.costs[kind]
+        predicted = sum(cost[0] for cost in costs.values())
+        actual = sum(cost[1] for cost in costs.values())
+        error = sum(abs(cost[1] - cost[0]) / max(cost[1], 1e-6)
+                    for cost in costs.values()) / max(len(costs), 1)
+        largest = sorted(costs.items(), key=lambda item: item[1][1],
+                         reverse=True)[:_LARGEST_COSTS]
+        return dict(count=len(costs), predicted=round(predicted, 3),
+                    actual=round(actual, 3),
+                    ratio=round(actual / predicted, 3) if predicted else None,
+                    error=round(error, 3),
+                    largest=[dict(name=name, predicted=round(cost[0], 3),
+                                  actual=round(cost[1], 3))
+                             for name, cost in largest])
+
+    def record(self, method, url, latency, size=0, error=False):
+        """
+        Record a Reportportal API request.
+
+        Args:
+            method (str): HTTP method.
+            url (str): URL of the request.
+            latency (float): Latency in seconds.
+            size (int): Bytes sent.
+            error (bool): Whether the request failed.
+        """
+        endpoint = get_endpoint(method, url)
+        with self.lock:
+            histogram = self.endpoints.get(endpoint)
+            if histogram is None:
+                histogram = self.endpoints[endpoint] = LatencyHistogram()
+            histogram.add(latency, size, error)
+
+    def as_dict(self):
+        """
+        Returns:
+            dict: Time and count of every phase, the request count, error
+                  count, bytes sent and latency percentiles of every
+                  endpoint, and the predicted and actual costs of every
+                  kind of scheduled item.
+        """
+        with self.lock:
+            return dict(
+                time=round(time.perf_counter() - self.origin, 3),
+                phases=dict((name, dict(time=round(phase['time'], 3),
+                                        count=phase['count']))
+                            for name, phase in self.phases.items()),
+                endpoints=dict((name, histogram.as_dict())
+                               for name, histogram in self.endpoints.items()),
+                costs=dict((kind, self.get_costs(kind))
+                           for kind in self.costs))
+
+    def write_trace(self, path):
+        """
+        Write the stats and the phase spans as a JSON trace, in the trace
+        event format understood by chrome://tracing and Perfetto.
+
+        Args:
+            path (str): Path of the trace file.
+        """
+        stats = self.as_dict()
+        with self.lock:
+            events = [dict(name=name, ph='X', pid=os.getpid(), tid=tid,
+                           ts=round(start * 1e6), dur=round(duration * 1e6))
+                      for name, start, duration, tid in self.spans]
+        with open(path, 'w') as fd:
+            json.dump(dict(traceEvents=events, stats=stats), fd, indent=2)
@@ -0,0 +1,419 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, RedHat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+import collections
+import datetime
+import multiprocessing
+import os
+import re
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from ansible.module_utils.exceptions import SubunitError
+    from ansible.module_utils.utils import create_folders_on
+except ImportError:
+    from .exceptions import SubunitError
+    from .utils import create_folders_on
+
+from lxml import etree
+
+# A subunit v2 packet, see
+# https://github.com/testing-cabal/subunit/blob/master/README.rst
+Packet = collections.namedtuple('Packet', [
+    'status', 'test_id', 'route_code', 'timestamp', 'tags', 'mime_type',
+    'file_name', 'file_bytes', 'eof', 'runnable'])
+
+# A test of a subunit stream, with its final status, start and end times
+# in seconds since the epoch (None if unknown), tags and attachments by
+# name
+SubunitTest = collections.namedtuple('SubunitTest', [
+    'test_id', 'status', 'start_time', 'end_time', 'tags', 'details'])
+
+_SIGNATURE = 0xb3
+_VERSION = 2
+_FLAG_TEST_ID = 0x0800
+_FLAG_ROUTE_CODE = 0x0400
+_FLAG_TIMESTAMP = 0x0200
+_FLAG_RUNNABLE = 0x0100
+_FLAG_TAGS = 0x0080
+_FLAG_FILE_CONTENT = 0x0040
+_FLAG_MIME_TYPE = 0x0020
+_FLAG_EOF = 0x0010
+
+_STATUSES = (None, 'exists', 'inprogress', 'success', 'uxsuccess', 'skip',
+             'fail', 'xfail')
+_FINAL_STATUSES = ('success', 'uxsuccess', 'skip', 'fail', 'xfail')
+
+# characters which aren't allowed in XML 1.0, e.g. terminal escapes
+_INVALID_XML = re.compile('[^\t\n\r\x20-\ud7ff\ue000-\ufffd\U00010000-\U0010ffff]')
+
+# attachments reported as the failure or skip message instead of the output
+_TRACEBACK = 'traceback'
+_REASON = 'reason'
+
+
+def _read_varint(data, pos):
+    """
+    Read a subunit number, the 2 high bits of its first byte being the
+    amount of bytes which follow.
+    """
+    size = data[pos] >> 6
+    value = data[pos] & 0x3f
+    for byte in data[pos + 1:pos + 1 + size]:
+        value = value << 8 | byte
+    return value, pos + 1 + size
+
+
+def _read_utf8(data, pos):
+    length, pos = _read_varint(data, pos)
+    return data[pos:pos + length].decode('utf-8'), pos + length
+
+
+def _parse_packet(flags, body):
+    """
+    Parse the fields of a packet.
+
+    Args:
+        flags (int): Flags of the packet.
+        body (bytes): Packet content after its length and before its CRC.
+
+    Returns:
+        Packet: The parsed packet.
+    """
+    pos = 0
+    timestamp = test_id = route_code = mime_type = None
+    file_name = file_bytes = None
+    tags = ()
+    if flags & _FLAG_TIMESTAMP:
+        seconds = int.from_bytes(body[pos:pos + 4], 'big')
+        nanoseconds, pos = _read_varint(body, pos + 4)
+        timestamp = seconds + nanoseconds / 1e9
+    if flags & _FLAG_TEST_ID:
+        test_id, pos = _read_utf8(body, pos)
+    if flags & _FLAG_TAGS:
+        count, pos = _read_varint(body, pos)
+        tags = []
+        for _ in range(count):
+            tag, pos = _read_utf8(body, pos)
+            tags.append(tag)
+    if flags & _FLAG_MIME_TYPE:
+        mime_type, pos = _read_utf8(body, pos)
+    if flags & _FLAG_FILE_CONTENT:
+        file_name, pos = _read_utf8(body, pos)
+        length, pos = _read_varint(body, pos)
+        file_bytes = body[pos:pos + length]
+        pos += length
+    if flags & _FLAG_ROUTE_CODE:
+        route_code, pos = _read_utf8(body, pos)
+    if pos != len(body):
+        raise SubunitError('Malformed subunit packet')
+    return Packet(_STATUSES[flags & 0x7], test_id, route_code, timestamp,
+                  tags, mime_type, file_name, file_bytes,
+                  bool(flags & _FLAG_EOF), bool(flags & _FLAG_RUNNABLE))
+
+
+def iter_packets(stream):
+    """
+    Read the packets of a subunit v2 stream.
+
+    Bytes outside of packets, e.g. the output of the test runner mixed
+    with the stream, are skipped.
+
+    Args:
+        stream (file): Binary file object of the stream.
+
+    Yields:
+        Packet: Every packet of the stream.
+
+    Raises:
+        SubunitError: When a packet is truncated or corrupted, or when
+                      the stream holds no packet at all.
+    """
+    found = False
+    skipped = 0
+    offset = 0
+    while True:
+        head = stream.read(1)
+        if not head:
+            break
+        if head[0] != _SIGNATURE:
+            skipped += 1
+            offset += 1
+            continue
+        header = stream.read(3)
+        if len(header) < 3:
+            raise SubunitError(f'Truncated subunit packet at byte {offset}')
+        flags = int.from_bytes(header[:2], 'big')
+        if flags >> 12 != _VERSION:
+            raise SubunitError(f'Unsupported subunit version {flags >> 12} '
+                               f'at byte {offset}')
+        header += stream.read(header[2] >> 6)
+        length, start = _read_varint(header, 2)
+        packet = head + header
+        packet += stream.read(length - len(packet))
+        if len(packet) < length:
+            raise SubunitError(f'Truncated subunit packet at byte {offset}')
+        if zlib.crc32(packet[:-4]) != int.from_bytes(packet[-4:], 'big'):
+            raise SubunitError(f'Bad CRC of the subunit packet at byte '
+                               f'{offset}')
+        try:
+            parsed = _parse_packet(flags, packet[1 + start:-4])
+        except (IndexError, UnicodeDecodeError) as ex:
+            raise SubunitError(f'Malformed subunit packet at byte {offset}: '
+                               f'{ex}')
+        yield parsed
+        found = True
+        offset += length
+    if skipped and not found:
+        raise SubunitError('Not a subunit v2 stream')
+
+
+def read_subunit(stream):
+    """
+    Read the tests of a subunit v2 stream.
+
+    The packets of a test are gathered by test ID and route code (the
+    worker running it), the start time being the one of its 'inprogress'
+    packet and the end time the one of its final status. Tests which never
+    got a final status are reported last with the 'inprogress' status.
+
+    Args:
+        stream (file): Binary file object of the stream.
+
+    Yields:
+        SubunitTest: Every test, once it has its final status.
+    """
+    running = collections.OrderedDict()
+    for packet in iter_packets(stream):
+        if packet.test_id is None:
+            # attachments of the whole run, e.g. the runner output
+            continue
+        key = (packet.route_code, packet.test_id)
+        test = running.get(key)
+        if test is None:
+            if packet.status == 'exists':
+                # enumerated, not run
+                continue
+            test = running[key] = dict(start_time=None, tags=set(),
+                                       details=collections.OrderedDict())
+        test['tags'].update(packet.tags)
+        if packet.file_name is not None:
+            test['details'][packet.file_name] = \
+                test['details'].get(packet.file_name, b'') + packet.file_bytes
+        if packet.status == 'inprogress':
+            test['start_time'] = packet.timestamp
+        elif packet.status in _FINAL_STATUSES:
+            del running[key]
+            yield SubunitTest(packet.test_id, packet.status,
+                              test['start_time'], packet.timestamp,
+                              sorted(test['tags']), test['details'])
+    for (_, test_id), test in running.items():
+        yield SubunitTest(test_id, 'inprogress', test['start_time'], None,
+                          sorted(test['tags']), test['details'])
+
+
+def split_test_id(test_id):
+    """
+    Split a test ID into its class name and test name, the parameters of
+    the test (e.g. 'test_a[id-1,smoke]' or 'test_a(scenario)') being part
+    of the test name.
+
+    Returns:
+        tuple: Class name, empty without any dot, and test name.
+    """
+    end = len(test_id)
+    for char in '[(':
+        index = test_id.find(char)
+        if index >= 0:
+            end = min(end, index)
+    dot = test_id.rfind('.', 0, end)
+    if dot < 0:
+        return '', test_id
+    return test_id[:dot], test_id[dot + 1:]
+
+
+def _get_isotime(timestamp):
+    return datetime.datetime.fromtimestamp(
+        timestamp, datetime.timezone.utc).isoformat()
+
+
+def _get_text(details, names):
+    return _INVALID_XML.sub('', '\n'.join(
+        details[name].decode('utf-8', 'replace')
+        for name in names if details.get(name))).strip()
+
+
+def get_test_case(test):
+    """
+    Get a test as a XUnit test case, in the structure produced by xmltodict.
+
+    Args:
+        test (SubunitTest): Test of a subunit stream.
+
+    Returns:
+        dict: Attributes of the test case and its failure, error, skipped
+              and system-out elements.
+    """
+    class_name, name = split_test_id(test.test_id)
+    case = {'@classname': class_name, '@name': name}
+    duration = 0
+    if test.start_time is not None and test.end_time is not None:
+        duration = max(test.end_time - test.start_time, 0)
+    case['@time'] = f'{duration:.3f}'
+    if test.start_time is not None:
+        case['@timestamp'] = _get_isotime(test.start_time)
+
+    details = test.details
+    output = [name for name in details if name not in (_TRACEBACK, _REASON)]
+    if test.status == 'fail':
+        case['failure'] = {'@type': 'Failure', '#text': _get_text(
+            details, [_TRACEBACK, _REASON] + output)}
+    elif test.status == 'uxsuccess':
+        case['failure'] = {'@type': 'UnexpectedSuccess',
+                           '#text': 'Unexpected success'}
+    elif test.status == 'inprogress':
+        case['error'] = {'@type': 'Incomplete', '#text': _get_text(
+            details, [_TRACEBACK] + output) or 'The test never completed'}
+    elif test.status == 'skip':
+        case['skipped'] = _get_text(details, [_REASON]) or 'Skipped'
+    if test.status != 'fail':
+        # the failure message already holds the whole output
+        system_out = '\n'.join(
+            f'{name}: {{{{{{\n{_get_text(details, [name])}\n}}}}}}'
+            for name in output if details[name])
+        if system_out:
+            case['system-out'] = system_out
+    return case
+
+
+def get_subunit_suite(path):
+    """
+    Read a subunit v2 file as a single XUnit test suite.
+
+    Args:
+        path (str): Path of the subunit file.
+
+    Returns:
+        tuple: Attributes of the test suite, named after the file, in the
+               structure produced by xmltodict and the list of its test
+               cases.
+
+    Raises:
+        SubunitError: When the file isn't a valid subunit v2 stream.
+    """
+    with open(path, 'rb') as stream:
+        tests = list(read_subunit(stream))
+    starts = [test.start_time for test in tests
+              if test.start_time is not None]
+    ends = [test.end_time for test in tests if test.end_time is not None]
+    suite = {'@name': os.path.splitext(os.path.basename(path))[0],
+             '@tests': str(len(tests)),
+             '@failures': str(sum(test.status in ('fail', 'uxsuccess')
+                                  for test in tests)),
+             '@errors': str(sum(test.status == 'inprogress'
+                                for test in tests)),
+             '@skipped': str(sum(test.status == 'skip' for test in tests)),
+             '@time': f'{max(ends) - min(starts) if starts and ends else 0:.3f}'}
+    if starts:
+        suite['@timestamp'] = _get_isotime(min(starts))
+    return suite, [get_test_case(test) for test in tests]
+
+
+def iter_subunit_suites(path):
+    """
+    Read a subunit v2 file like iter_xunit_suites reads a XUnit file.
+
+    Args:
+        path (str): Path of the subunit file.
+
+    Yields:
+        tuple: The test suite attributes as an xmltodict compatible dict
+               and an iterator over its test cases.
+    """
+    suite, test_cases = get_subunit_suite(path)
+    yield suite, iter(test_cases)
+
+
+def _to_element(tag, value):
+    """Build an XML element from the structure produced by xmltodict."""
+    element = etree.Element(tag)
+    if not isinstance(value, dict):
+        element.text = value
+        return element
+    for key, child in value.items():
+        if key == '#text':
+            element.text = child
+        elif key.startswith('@'):
+            element.set(key[1:], child)
+        else:
+            element.append(_to_element(key, child))
+    return element
+
+
+def subunit_to_xml(subunit_file_path, xml_file_path):
+    """
+    Convert a subunit v2 file to a XUnit file.
+
+    Args:
+        subunit_file_path (str): Path of the subunit file.
+        xml_file_path (str): Path of the XUnit file to write.
+
+    Returns:
+        int: Amount of tests converted.
+
+    Raises:
+        SubunitError: When the subunit file isn't a valid subunit v2
+                      stream.
+    """
+    try:
+        suite, test_cases = get_subunit_suite(subunit_file_path)
+    except SubunitError as ex:
+        raise SubunitError(f'{subunit_file_path}: {ex}')
+    element = _to_element('testsuite', suite)
+    for test_case in test_cases:
+        element.append(_to_element('testcase', test_case))
+    create_folders_on(xml_file_path)
+    etree.ElementTree(element).write(xml_file_path, pretty_print=True,
+                                     xml_declaration=True, encoding='utf-8')
+    return len(test_cases)
+
+
+def convert_subunit_files(conversions, workers=1):
+    """
+    Convert subunit v2 files to XUnit files, in parallel processes.
+
+    Args:
+        conversions (list): (subunit file path, XUnit file path) tuples.
+        workers (int): Amount of processes converting the files, the files
+                       are converted by the calling process with 1.
+
+    Returns:
+        list: Amount of tests converted of every file.
+
+    Raises:
+        SubunitError: When a subunit file isn't a valid subunit v2 stream.
+    """
+    if workers <= 1 or len(conversions) <= 1:
+        return [subunit_to_xml(*conversion) for conversion in conversions]
+    with ProcessPoolExecutor(
+            min(workers, len(conversions)),
+            mp_context=multiprocessing.get_context('fork')) as executor:
+        futures = [executor.submit(subunit_to_xml, *conversion)
+                   for conversion in conversions]
+    return [future.result() for future in futures]
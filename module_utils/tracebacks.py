@@ -0,0 +1,124 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, RedHat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+import re
+
+TRACEBACK = 'Traceback'
+
+# Lines Python prints between the tracebacks of chained exceptions
+CHAIN_MARKERS = (
+    'During handling of the above exception, another exception occurred:',
+    'The above exception was the direct cause of the following exception:',
+)
+
+_BLANK_LINE = re.compile(r'^\s*$', re.M)
+
+
+def _lines_before(text, pos):
+    """
+    Iterate backward over the lines preceding a line start.
+
+    Args:
+        text (str): The whole text.
+        pos (int): Start of a line.
+
+    Yields:
+        tuple: Start position and content of every preceding line, starting
+               with the closest one.
+    """
+    while pos > 0:
+        start = text.rfind('\n', 0, pos - 1) + 1
+        yield start, text[start:pos - 1]
+        pos = start
+
+
+def _last_traceback_line(text, end):
+    """
+    Find the last line starting with 'Traceback' before a position.
+
+    Returns:
+        int or None: Start of the line or None if there is none.
+    """
+    pos = text.rfind('\n' + TRACEBACK, 0, end) + 1
+    if pos == 0 and not text.startswith(TRACEBACK):
+        return None
+    return pos
+
+
+def _block_start(text, pos):
+    """
+    Find the start of the traceback block holding a 'Traceback' line.
+
+    A block runs from a 'Traceback' line to the next blank line, so any
+    'Traceback' line between the previous blank line and 'pos' belongs to
+    the same block, and the first of them starts it.
+    """
+    start = pos
+    for line_start, line in _lines_before(text, pos):
+        if not line.strip():
+            break
+        if line.startswith(TRACEBACK):
+            start = line_start
+    return start
+
+
+def get_last_traceback(text, chained=True):
+    """
+    Extract the last traceback of a log.
+
+    Equivalent to keeping the last match of
+    "^(Traceback[\\s\\S]*?)(?:^\\s*$|\\Z)" in multiline mode, but the text is
+    scanned backward from its end and only the lines of the last traceback
+    are visited, no matter how large the log is.
+
+    When the last traceback is the consequence of chained exceptions, the
+    tracebacks of the exceptions it was raised from (with the lines
+    separating them) are included too.
+
+    Args:
+        text (str): The log to search.
+        chained (bool): Include the tracebacks of the chained exceptions.
+
+    Returns:
+        str or None: The last traceback, None if the log doesn't have any.
+    """
+    if not text:
+        return None
+    pos = _last_traceback_line(text, len(text))
+    if pos is None:
+        return None
+
+    start = _block_start(text, pos)
+    blank_line = _BLANK_LINE.search(text, start)
+    end = blank_line.start() if blank_line else len(text)
+
+    while chained:
+        # the closest non blank line must be a chained exception marker
+        for line_start, line in _lines_before(text, start):
+            if line.strip():
+                break
+        else:
+            break
+        if line.strip() not in CHAIN_MARKERS:
+            break
+        pos = _last_traceback_line(text, line_start)
+        if pos is None:
+            break
+        start = _block_start(text, pos)
+
+    return text[start:end]
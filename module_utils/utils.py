@@ -16,9 +16,9 @@
 # You should have received a copy of the GNU General Public License
 # along with this software.  If not, see <http://www.gnu.org/licenses/>.
 
+import json
 import os
 import requests
-import subprocess
 
 try:
     from ansible.module_utils.exceptions import ConnectionError
@@ -29,13 +29,21 @@ from datetime import datetime
 from lxml import etree
 
 
-def get_json(url, is_verified):
+def get_json(url, is_verified, session=None, cache=None, cacheable=True):
     """
     Fetches JSON data from a specified URL.
 
     Args:
         url (str): The URL to fetch JSON data from.
         is_verified (bool): Indicates whether certificate is validated
+        session (requests.Session): Session reusing the connections, a new
+                                    connection is made without it.
+        cache (HttpCache): Cache the response is read from when it's
+                           there, and added to when it's cacheable.
+        cacheable (bool or callable): Whether the response never changes,
+                                      or a function telling it from the
+                                      JSON data, e.g. whether the build is
+                                      finished.
 
     Raises:
         ConnectionError: ConnectionError if the HTTP response status code is not 200 (OK).
@@ -43,10 +51,89 @@ def get_json(url, is_verified):
     Returns:
         dict: A dictionary containing the JSON data from the response.
     """
-    response = requests.get(url, verify=is_verified)
+    if cache is not None:
+        content = cache.get(url)
+        if content is not None:
+            return json.loads(content)
+    response = (session or requests).get(url, verify=is_verified)
     if response.status_code != 200:
         raise ConnectionError(response)
-    return response.json()
+    data = response.json()
+    if cache is not None and \
+            (cacheable(data) if callable(cacheable) else cacheable):
+        cache.add(url, response.content)
+    return data
+
+
+def iter_text(url, is_verified, session=None, chunk_size=64 * 1024,
+              cache=None, cacheable=True):
+    """
+    Fetches the text of a specified URL in chunks, without holding the
+    whole response in memory.
+
+    Args:
+        url (str): The URL to fetch the text from.
+        is_verified (bool): Indicates whether certificate is validated
+        session (requests.Session): Session reusing the connections, a new
+                                    connection is made without it.
+        chunk_size (int): Amount of bytes read at once.
+        cache (HttpCache): Cache the text is read from when it's there,
+                           and added to, UTF-8 encoded, when it's
+                           cacheable.
+        cacheable (bool): Whether the response never changes.
+
+    Raises:
+        ConnectionError: ConnectionError if the HTTP response status code is not 200 (OK).
+
+    Yields:
+        str: The chunks of the text of the response.
+    """
+    cached_path = cache.get_path(url) if cache is not None else None
+    if cached_path is not None:
+        with open(cached_path, encoding='utf-8') as cached_file:
+            yield from iter(lambda: cached_file.read(chunk_size), '')
+        return
+
+    tmp_file = None
+    if cache is not None and cacheable:
+        fd, tmp_path = cache.mkstemp()
+        tmp_file = os.fdopen(fd, 'w', encoding='utf-8')
+    try:
+        with (session or requests).get(url, verify=is_verified,
+                                       stream=True) as response:
+            if response.status_code != 200:
+                raise ConnectionError(response)
+            if response.encoding is None:
+                response.encoding = 'utf-8'
+            for chunk in response.iter_content(chunk_size,
+                                               decode_unicode=True):
+                if tmp_file is not None:
+                    tmp_file.write(chunk)
+                yield chunk
+        if tmp_file is not None:
+            tmp_file.close()
+            cache.add_file(url, tmp_path)
+            tmp_file = None
+    finally:
+        # the text wasn't read to its end
+        if tmp_file is not None:
+            tmp_file.close()
+            os.remove(tmp_path)
+
+
+def is_zuul_build_finished(build):
+    """
+    Check whether a Zuul build is finished, its responses never change
+    then.
+
+    Args:
+        build (dict): The build, as returned by the Zuul API.
+
+    Returns:
+        bool: True if the build has a result and an end time.
+    """
+    return build.get('result') is not None and \
+        build.get('end_time') is not None
 
 
 def convert_date_to_sec(date_string, date_format):
@@ -92,11 +179,11 @@ def create_folders_on(file_path):
     directory = os.path.dirname(file_path)
 
     # Create the directory path if it doesn't exist
-    if not os.path.exists(directory):
+    if directory and not os.path.exists(directory):
         os.makedirs(directory)
 
 
-def save_to_file(xml_doc, xml_path):
+def save_to_file(xml_doc, xml_path, atomic=False):
     """
     Save XML document in a form of ElementTree object to a file.
 
@@ -106,6 +193,9 @@ def save_to_file(xml_doc, xml_path):
     Args:
         xml_doc (ElementTree): An XML doc to be saved to the file.
         xml_path (str): The path to the XML file where the suite should be saved.
+        atomic (bool): Whether the file is written to a hidden temporary
+                       file first and renamed, so a reader never sees it
+                       partially written.
 
     Returns:
         str: The path to the saved XML file.
@@ -113,9 +203,14 @@ def save_to_file(xml_doc, xml_path):
     # Ensure the directory structure exists for the XML file
     create_folders_on(xml_path)
 
+    directory, name = os.path.split(xml_path)
+    write_path = os.path.join(directory, f'.{name}.tmp') if atomic else xml_path
+
     # Write the XML suite to the specified file path
-    with open(xml_path, 'wb') as xml_file:
+    with open(write_path, 'wb') as xml_file:
         xml_file.write(etree.tostring(xml_doc, pretty_print=True))
+    if atomic:
+        os.replace(write_path, xml_path)
 
     # Return the path to the saved XML file
     return xml_path
@@ -157,26 +252,6 @@ def replace_extension(filename, old_extension, new_extension):
     return None
 
 
-def subunit_to_xml(subunit_file_path, xml_file_path):
-    """
-    Converts a subunit file to XML format using subunit2junitxml tool.
-
-    Args:
-        subunit_file_path (str): subunit_file_path Path to the input subunit file.
-        xml_file_path (str): Path to the output XML file.
-    """
-    create_folders_on(xml_file_path)
-
-    command = f'subunit2junitxml < {subunit_file_path} > {xml_file_path}'
-
-    completed_process = subprocess.run(command, shell=True, text=True, capture_output=True)
-
-    if completed_process.returncode == 0:
-        print("Conversion successful\n" + completed_process.stdout)
-    else:
-        print("Error: Conversion failed\n" + completed_process.stderr)
-
-
 def find_existing_path(path_pattern):
     """
     Splits the input path pattern by "/" and iterates through the parts,
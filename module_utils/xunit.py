@@ -0,0 +1,129 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, RedHat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+from lxml import etree
+
+
+def element_to_dict(element):
+    """
+    Convert an XML element into the structure produced by xmltodict.
+
+    Attributes are stored under '@'-prefixed keys, child elements under
+    their tag name (a list when the tag repeats) and the element text
+    under '#text'. Elements without attributes and children collapse to
+    their text, or None when they are empty.
+
+    Args:
+        element (lxml.etree._Element): The element to convert.
+
+    Returns:
+        dict or str or None: The xmltodict compatible representation.
+    """
+    node = {f'@{key}': value for key, value in element.attrib.items()}
+
+    for child in element:
+        # Skip comments and processing instructions
+        if not isinstance(child.tag, str):
+            continue
+        value = element_to_dict(child)
+        if child.tag not in node:
+            node[child.tag] = value
+        elif isinstance(node[child.tag], list):
+            node[child.tag].append(value)
+        else:
+            node[child.tag] = [node[child.tag], value]
+
+    text = (element.text or '').strip()
+    if not node:
+        return text or None
+    if text:
+        node['#text'] = text
+    return node
+
+
+def _release(element):
+    """
+    Free an already processed element and its preceding siblings.
+
+    Args:
+        element (lxml.etree._Element): The element to release.
+    """
+    element.clear()
+    parent = element.getparent()
+    if parent is not None:
+        while element.getprevious() is not None:
+            del parent[0]
+
+
+def _iter_suite_cases(events, suite):
+    """
+    Yield the test cases of a suite until the end of the suite is reached.
+
+    Args:
+        events (iterator): Shared iterparse events iterator.
+        suite (lxml.etree._Element): The test suite element being read.
+
+    Yields:
+        dict: xmltodict compatible test case.
+    """
+    for event, element in events:
+        if event != 'end':
+            continue
+        if element is suite:
+            _release(suite)
+            return
+        if element.tag == 'testcase' and element.getparent() is suite:
+            case = element_to_dict(element)
+            _release(element)
+            yield case if isinstance(case, dict) else {}
+        elif element.getparent() is suite:
+            # Suite level properties, system-out, etc. aren't published
+            _release(element)
+
+
+def iter_xunit_suites(path):
+    """
+    Incrementally parse an XUnit file, one test suite at a time.
+
+    Unlike xmltodict, which keeps the entire document in memory, this
+    reads the file with iterparse and drops every test case once it was
+    handed over, so the memory usage is bounded by the largest single
+    test case. Both a single 'testsuite' root and a 'testsuites' root
+    with multiple suites are supported.
+
+    The test cases iterator of a suite must be consumed before moving
+    on to the next suite, as both read the same underlying stream.
+
+    Args:
+        path (str): Path to the XUnit file.
+
+    Yields:
+        tuple: The test suite attributes as an xmltodict compatible dict
+               and an iterator over its test cases.
+    """
+    events = iter(etree.iterparse(path, events=('start', 'end'),
+                                  huge_tree=True))
+    for event, element in events:
+        if event == 'start' and element.tag == 'testsuite':
+            suite = {f'@{key}': value
+                     for key, value in element.attrib.items()}
+            test_cases = _iter_suite_cases(events, element)
+            yield suite, test_cases
+            # Skip whatever left unconsumed by the caller
+            for _ in test_cases:
+                pass
@@ -0,0 +1,67 @@
+#!/usr/bin/python
+# -*- coding: utf-8 -*-
+
+# Copyright: (c) 2023, RedHat
+#
+# This module is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This software is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this software.  If not, see <http://www.gnu.org/licenses/>.
+
+from module_utils.journal import PublishJournal
+
+
+def test_resume_after_cut_record(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = PublishJournal(path)
+    journal.open()
+    journal.launch_started('launch')
+    journal.case_started('f:0:0', 'item0')
+    journal.case_finished('f:0:0')
+    journal.close()
+    # interrupted while writing the next record
+    with open(path, 'a') as fd:
+        fd.write('{"type": "case", "key": "f:0:1", "i')
+
+    journal = PublishJournal(path)
+    journal.open(resume=True)
+    assert set(journal.cases) == {'f:0:0'}
+    journal.case_started('f:0:1', 'item1')
+    journal.case_started('f:0:2', 'item2')
+    journal.case_done('f:0:2')
+    journal.close()
+
+    journal = PublishJournal(path)
+    journal.open(resume=True)
+    journal.close()
+    assert journal.launch_id == 'launch'
+    assert journal.cases == {'f:0:0': dict(id='item0', state='finished'),
+                             'f:0:1': dict(id='item1', state='started'),
+                             'f:0:2': dict(id='item2', state='done')}
+
+
+def test_resume_case_with_logs_sent(tmp_path):
+    path = str(tmp_path / 'journal.jsonl')
+    journal = PublishJournal(path)
+    journal.open()
+    journal.case_started('f:0:0', 'item0')
+    journal.case_finished('f:0:0')
+    # the batches of the log entries are sent in any order
+    journal.case_log_sent('f:0:0', 1, 2)
+    journal.close()
+
+    journal = PublishJournal(path)
+    journal.open(resume=True)
+    assert journal.get_case('f:0:0') == dict(id='item0', state='finished',
+                                             logs={1})
+    journal.case_log_sent('f:0:0', 0, 2)
+    assert journal.get_case('f:0:0')['state'] == 'done'
+    journal.close()